@@ -0,0 +1,129 @@
+"""Input core cost per frame on the direct and the relay path, by stage.
+
+Replays --frames controller snapshots (the left stick moving, so every frame
+changes the pad) through the same steps the apps take, on fake pads:
+
+  direct json   api/app.py: message text parsed, "data" handed to the core
+  direct bin1   api/app.py: the binary frame handed to the core
+  relay json    api/remote_app.py: a batch of --batch input messages parsed,
+                each "frame.data" handed to the core
+  relay bin1    api/remote_app.py: a batch of tagged frames split, each frame
+                handed to the core
+
+Reported: wall time per frame for the whole path and the core's own
+decode/validate/map/apply times from its timing hook.
+
+    python -m benchmarks.bench_input_core --frames 50000 --batch 4
+"""
+import argparse
+import json
+import time
+
+from benchmarks.fakepad import FakeGamepad
+from src.core.input_core import STAGES, InputCore, StageTimes
+from src.utils.frames import ControllerFrame, device_tag, split_tagged_frames
+
+BUTTON_IDS = ("A", "B", "X", "Y", "LB", "RB", "LT", "RT", "Start", "Select", "LS", "RS")
+
+
+def snapshot(step: int) -> dict:
+    # Layout of the phone's ControllerState.toJson()
+    return {
+        "buttonStates": {
+            f"layout1_{button}": {"id": button, "isPressed": button == "A" and step % 10 == 0, "value": 0.0}
+            for button in BUTTON_IDS
+        },
+        "leftJoystickState": {"dx": round((step % 50) / 50, 3), "dy": -0.5, "isPressed": True,
+                              "intensity": 0.5, "angle": 1.1},
+        "rightJoystickState": {"dx": 0.0, "dy": 0.0, "isPressed": False, "intensity": 0.0, "angle": 0.0},
+        "dpadState": {"upPressed": False, "rightPressed": False, "downPressed": False, "leftPressed": False},
+        "timestamp": "2024-01-01T00:00:00.000"
+    }
+
+
+def devices(batch: int):
+    return [f"phone-{index}" for index in range(batch)]
+
+
+def direct_json(core: InputCore, args):
+    messages = [json.dumps({"type": "controller_input", "data": snapshot(step)}) for step in range(100)]
+    for step in range(args.frames):
+        data = json.loads(messages[step % 100])
+        if data.get("type") == "controller_input":
+            core.process("phone-0", data.get("data", {}))
+    return args.frames
+
+
+def direct_bin1(core: InputCore, args):
+    frames = [ControllerFrame.from_state(snapshot(step), step).encode() for step in range(100)]
+    for step in range(args.frames):
+        core.process("phone-0", frames[step % 100])
+    return args.frames
+
+
+def relay_json(core: InputCore, args):
+    phones = devices(args.batch)
+    batches = [
+        json.dumps([
+            {"type": "controller_input", "device_id": device_id, "frame": {"type": "controller_input",
+                                                                          "data": snapshot(step)}}
+            for device_id in phones
+        ])
+        for step in range(100)
+    ]
+    count = 0
+    for step in range(args.frames // args.batch):
+        for item in json.loads(batches[step % 100]):
+            core.process(item["device_id"], item["frame"].get("data", {}))
+            count += 1
+    return count
+
+
+def relay_bin1(core: InputCore, args):
+    phones = devices(args.batch)
+    batches = [
+        b"".join(device_tag(device_id) + ControllerFrame.from_state(snapshot(step), step).encode()
+                 for device_id in phones)
+        for step in range(100)
+    ]
+    count = 0
+    for step in range(args.frames // args.batch):
+        for device_id, payload in split_tagged_frames(batches[step % 100]):
+            core.process(device_id, payload)
+            count += 1
+    return count
+
+
+PATHS = (
+    ("direct json", direct_json),
+    ("direct bin1", direct_bin1),
+    ("relay json", relay_json),
+    ("relay bin1", relay_bin1),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=50000)
+    parser.add_argument("--batch", type=int, default=4, help="phones per relay batch")
+    args = parser.parse_args()
+
+    print(f"{'path':>12} {'us/frame':>9} {'timed':>7}  " + " ".join(f"{stage:>9}" for stage in STAGES))
+    for name, run in PATHS:
+        # Untimed first (the hook costs a few clock reads), then with the hook
+        results = []
+        for hook in (None, StageTimes()):
+            core = InputCore()
+            for device_id in devices(args.batch):
+                core.add(device_id, FakeGamepad())
+            core.on_stage = hook
+            started = time.perf_counter()
+            count = run(core, args)
+            results.append((time.perf_counter() - started) / count * 1e6)
+        summary = hook.summary()
+        print(f"{name:>12} {results[0]:>9.2f} {results[1]:>7.2f}  "
+              + " ".join(f"{summary[stage]['avg_us']:>9.2f}" for stage in STAGES))
+
+
+if __name__ == "__main__":
+    main()
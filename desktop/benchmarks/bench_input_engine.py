@@ -0,0 +1,111 @@
+"""Per-frame cost of applying controller snapshots to a virtual pad.
+
+Compares the previous handle_input routine (every button, d-pad direction
+and stick written plus update() on every frame, button table rebuilt per
+button) with the input core, which only writes what changed. The pad is a fake
+that counts calls; --update-us adds a busy wait to every update() to stand
+in for the driver round trip of a real ViGEm pad.
+
+Workloads: "idle" repeats one snapshot (phone held still, still streaming),
+"stick" moves the left stick every frame, "buttons" toggles A every frame.
+
+    python -m benchmarks.bench_input_engine --frames 100000 --update-us 20
+
+vgamepad only installs on Windows; elsewhere benchmarks/fakepad.py stands
+in for it.
+"""
+import argparse
+import time
+
+from benchmarks.fakepad import FakeGamepad, vg
+from src.core.input_core import InputCore
+
+BUTTON_IDS = ("A", "B", "X", "Y", "LB", "RB", "LT", "RT", "Start", "Select", "LS", "RS")
+
+
+def legacy_apply(gamepad, data: dict):
+    # handle_input as it was before the input core
+    for button_id, state in data.get("buttonStates", {}).items():
+        actual_button_id = button_id.split('_')[-1]
+        button_mapping = {
+            'A': vg.XUSB_BUTTON.XUSB_GAMEPAD_A,
+            'B': vg.XUSB_BUTTON.XUSB_GAMEPAD_B,
+            'X': vg.XUSB_BUTTON.XUSB_GAMEPAD_X,
+            'Y': vg.XUSB_BUTTON.XUSB_GAMEPAD_Y,
+            'LB': vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_SHOULDER,
+            'RB': vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_SHOULDER,
+            'Start': vg.XUSB_BUTTON.XUSB_GAMEPAD_START,
+            'Select': vg.XUSB_BUTTON.XUSB_GAMEPAD_BACK,
+            'LS': vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_THUMB,
+            'RS': vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_THUMB,
+        }
+        if actual_button_id in button_mapping:
+            if state.get("isPressed"):
+                gamepad.press_button(button=button_mapping[actual_button_id])
+            else:
+                gamepad.release_button(button=button_mapping[actual_button_id])
+        elif actual_button_id == 'LT':
+            gamepad.left_trigger_float(value_float=state.get("value", 0.0))
+        elif actual_button_id == 'RT':
+            gamepad.right_trigger_float(value_float=state.get("value", 0.0))
+    left_joy = data.get("leftJoystickState", {"dx": 0.0, "dy": 0.0})
+    right_joy = data.get("rightJoystickState", {"dx": 0.0, "dy": 0.0})
+    gamepad.left_joystick_float(x_value_float=left_joy.get("dx", 0.0), y_value_float=-left_joy.get("dy", 0.0))
+    gamepad.right_joystick_float(x_value_float=right_joy.get("dx", 0.0), y_value_float=-right_joy.get("dy", 0.0))
+    dpad = data.get("dpadState", {})
+    for key, button in (('upPressed', vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP),
+                        ('downPressed', vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN),
+                        ('leftPressed', vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT),
+                        ('rightPressed', vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT)):
+        if dpad.get(key):
+            gamepad.press_button(button=button)
+        else:
+            gamepad.release_button(button=button)
+    gamepad.update()
+
+
+def snapshot(step: int, workload: str) -> dict:
+    # Layout of the phone's ControllerState.toJson()
+    pressed = workload == "buttons" and step % 2 == 1
+    dx = round((step % 50) / 50, 3) if workload == "stick" else 0.25
+    return {
+        "buttonStates": {
+            f"layout1_{button}": {"id": button, "isPressed": pressed and button == "A",
+                                  "value": 1.0 if pressed and button == "A" else 0.0}
+            for button in BUTTON_IDS
+        },
+        "leftJoystickState": {"dx": dx, "dy": -0.5, "isPressed": True, "intensity": 0.5, "angle": 1.1},
+        "rightJoystickState": {"dx": 0.0, "dy": 0.0, "isPressed": False, "intensity": 0.0, "angle": 0.0},
+        "dpadState": {"upPressed": False, "rightPressed": False, "downPressed": False, "leftPressed": False},
+    }
+
+
+def measure(mode: str, workload: str, args):
+    # Snapshots are decoded JSON, a new dict every frame as in the app
+    frames = [snapshot(step, workload) for step in range(100)]
+    gamepad = FakeGamepad(args.update_us)
+    core = InputCore()
+    core.add("bench", gamepad)
+    apply = (lambda data: core.process("bench", data)) if mode == "core" else (lambda data: legacy_apply(gamepad, data))
+    started = time.perf_counter()
+    for step in range(args.frames):
+        apply(frames[step % 100])
+    elapsed = time.perf_counter() - started
+    return elapsed / args.frames * 1e6, gamepad.calls / args.frames, gamepad.updates / args.frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=100000)
+    parser.add_argument("--update-us", type=float, default=0.0, help="simulated driver time per update()")
+    args = parser.parse_args()
+
+    print(f"{'workload':>9} {'applier':>8} {'us/frame':>9} {'calls/frame':>12} {'updates/frame':>14}")
+    for workload in ("idle", "stick", "buttons"):
+        for mode in ("legacy", "core"):
+            per_frame, calls, updates = measure(mode, workload, args)
+            print(f"{workload:>9} {mode:>8} {per_frame:>9.2f} {calls:>12.1f} {updates:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
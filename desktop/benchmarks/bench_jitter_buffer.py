@@ -0,0 +1,128 @@
+"""Pacing of relayed input with and without the jitter buffer.
+
+A phone sends bin1 frames at --rate Hz stamped with its own clock (an
+arbitrary offset from ours). Each frame is delayed by --base-ms plus
+jitter: exponential with mean --jitter-ms, and a --spike-ms delay for
+--spike-share of them, so frames bunch up and overtake each other as on a
+relay hop. They are put into src/core/pad_output.py at their arrival time,
+with and without the send time.
+
+Reported: how evenly the pad is written (the gap between updates against
+the send period, p50/p99 of the error), how much later than sent a state
+reaches the pad beyond --base-ms, states that reached the pad out of order,
+and the buffer's own counters (its delay settles by itself, see the delay
+column).
+
+    python -m benchmarks.bench_jitter_buffer --rate 120 --jitter-ms 4 --spike-ms 30
+"""
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.fakepad import FakeGamepad
+from src.core.input_core import InputCore
+from src.core.pad_output import PadOutput
+from src.utils.frames import ControllerFrame
+
+AXIS = 32767
+PHONE_CLOCK = 1_700_000_000.0  # the phone's clock at our perf_counter 0
+
+
+class StepGamepad(FakeGamepad):
+    # The frame number rides in the left stick x
+    def __init__(self):
+        super().__init__()
+        self.step = 0
+        self.writes = []
+
+    def left_joystick_float(self, x_value_float, y_value_float):
+        super().left_joystick_float(x_value_float, y_value_float)
+        self.step = round(x_value_float * AXIS)
+
+    def update(self):
+        super().update()
+        self.writes.append((time.perf_counter(), self.step))
+
+
+def network(args):
+    # (arrival, send time on our clock, step), in arrival order
+    rng = random.Random(args.seed)
+    started = time.perf_counter() + 0.2
+    period = 1.0 / args.rate
+    deliveries = []
+    for step in range(1, int(args.rate * args.duration)):
+        sent = started + step * period
+        delay = args.base_ms / 1000 + rng.expovariate(1000 / args.jitter_ms)
+        if rng.random() < args.spike_share:
+            delay += args.spike_ms / 1000
+        deliveries.append((sent + delay, sent, step))
+    deliveries.sort()
+    return deliveries
+
+
+def measure(buffered: bool, args):
+    core = InputCore()
+    output = PadOutput()
+    output.set_delay(args.min_ms, args.max_ms)
+    gamepad = StepGamepad()
+    core.add("phone", gamepad)
+    output.start()
+    deliveries = network(args)
+    sent_at = {step: sent for _, sent, step in deliveries}
+
+    def sender():
+        for arrival, sent, step in deliveries:
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            frame = ControllerFrame(seq=step, timestamp_us=int((PHONE_CLOCK + sent) * 1_000_000), lx=step)
+            decoded = core.decode_payload(frame.encode())
+            output.put(core, "phone", decoded, decoded.timestamp_us / 1_000_000 if buffered else None)
+
+    thread = threading.Thread(target=sender)
+    thread.start()
+    thread.join()
+    time.sleep(args.max_ms / 1000 + 0.1)
+
+    # Steady state only: the first second is the buffer settling
+    settle = deliveries[0][1] + 1.0
+    writes = [(at, step) for at, step in gamepad.writes if at > settle and step in sent_at]
+    period = 1.0 / args.rate
+    pacing = sorted(abs((b - a) - period) for (a, _), (b, _) in zip(writes, writes[1:]))
+    added = sorted(at - sent_at[step] - args.base_ms / 1000 for at, step in writes)
+    backwards = sum(1 for (_, a), (_, b) in zip(writes, writes[1:]) if b < a)
+    buffer = next(iter(output.buffers.values()), None)
+    return pacing, added, backwards, buffer.stats() if buffer else None
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] * 1000 if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=120.0)
+    parser.add_argument("--duration", type=float, default=6.0)
+    parser.add_argument("--base-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=4.0)
+    parser.add_argument("--spike-ms", type=float, default=30.0)
+    parser.add_argument("--spike-share", type=float, default=0.02)
+    parser.add_argument("--min-ms", type=float, default=0.0)
+    parser.add_argument("--max-ms", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'buffer':>7} {'updates':>8} {'pace p50':>9} {'pace p99':>9} {'added p50':>10} {'added p99':>10} "
+          f"{'backwards':>10} {'delay':>6} {'late':>5} {'reordered':>10} {'skipped':>8}  (ms)")
+    for buffered in (False, True):
+        pacing, added, backwards, stats = measure(buffered, args)
+        stats = stats or {"delay_ms": 0.0, "late": 0, "reordered": 0, "skipped": 0}
+        print(f"{'on' if buffered else 'off':>7} {len(added):>8} {percentile(pacing, 0.5):>9.2f} "
+              f"{percentile(pacing, 0.99):>9.2f} {percentile(added, 0.5):>10.2f} {percentile(added, 0.99):>10.2f} "
+              f"{backwards:>10} {stats['delay_ms']:>6.1f} {stats['late']:>5} {stats['reordered']:>10} "
+              f"{stats['skipped']:>8}")
+
+
+if __name__ == "__main__":
+    main()
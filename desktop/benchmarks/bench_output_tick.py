@@ -0,0 +1,126 @@
+"""Virtual pad reports on arrival versus on a fixed output tick.
+
+--pads phones send at --rate Hz, but the frames come in Wi-Fi style: held
+back and delivered --burst at a time, --spacing-us apart, with a --gap-ms
+hole every second.
+They go through src/core/pad_output.py as the apps put them, once applied
+on arrival and once per --hz tick.
+
+Reported per mode: update() calls per second and pad, the gap between two
+updates of a pad (min/p50/max) and the share of gaps under 1 ms (a burst
+reaching the game as a burst; a tick never reports faster than its
+period, it cannot fill a hole either), frames coalesced
+because a newer one came before the pad was written, tick jitter against
+the deadline, and the worker thread's CPU time per second (a spinning timer
+would show up here as ~1000 ms/s).
+
+    python -m benchmarks.bench_output_tick --pads 2 --rate 250 --burst 4 --spacing-us 300 --hz 250,500,1000
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import Future
+
+from benchmarks.fakepad import FakeGamepad
+from src.core.input_core import InputCore
+from src.core.pad_output import PadOutput
+from src.utils.frames import ControllerFrame
+
+AXIS = 32767
+
+
+class TimedGamepad(FakeGamepad):
+    def __init__(self):
+        super().__init__()
+        self.last = None
+        self.gaps = []
+
+    def update(self):
+        super().update()
+        now = time.perf_counter()
+        if self.last is not None:
+            self.gaps.append(now - self.last)
+        self.last = now
+
+
+def sender(output: PadOutput, core: InputCore, phones, args):
+    frames = [ControllerFrame(seq=step, lx=(step % 50) * AXIS // 50).encode() for step in range(100)]
+    period = 1.0 / args.rate
+    started = time.perf_counter()
+    step = 0
+    held = 0
+    while True:
+        due = started + step * period
+        if due > started + args.duration:
+            return
+        # A hole every second, then the frames due meanwhile come all at once
+        if step and step % int(args.rate) == 0:
+            due += args.gap_ms / 1000
+        held += 1
+        if held >= args.burst:
+            held = 0
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        else:
+            time.sleep(args.spacing_us / 1e6)
+        for device_id in phones:
+            decoded = core.decode_payload(frames[step % 100])
+            output.put(core, device_id, decoded)
+        step += 1
+
+
+def measure(output_hz: int, args):
+    core = InputCore()
+    output = PadOutput()
+    phones = [f"phone-{index}" for index in range(args.pads)]
+    pads = [TimedGamepad() for _ in phones]
+    for device_id, gamepad in zip(phones, pads):
+        core.add(device_id, gamepad)
+    output.set_rate(output_hz)
+    output.start()
+    cpu_started = worker_cpu(output)
+    thread = threading.Thread(target=sender, args=(output, core, phones, args))
+    thread.start()
+    thread.join()
+    time.sleep(0.05)
+    cpu = worker_cpu(output) - cpu_started
+    gaps = sorted(gap for gamepad in pads for gap in gamepad.gaps)
+    updates = sum(gamepad.updates for gamepad in pads) / args.pads / args.duration
+    return updates, gaps, output, cpu * 1000 / args.duration
+
+
+def worker_cpu(output: PadOutput) -> float:
+    # The worker's own CPU clock, read on the worker (call() without a loop)
+    future = Future()
+    output.commands.append((time.thread_time, (), future))
+    output._wakeup.set()
+    return future.result(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pads", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=250.0, help="frames per second and phone")
+    parser.add_argument("--burst", type=int, default=4, help="frames delivered together")
+    parser.add_argument("--spacing-us", type=float, default=300.0, help="between the frames of a burst")
+    parser.add_argument("--gap-ms", type=float, default=40.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--hz", default="250,500,1000", help="output ticks to compare with arrival")
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'updates/s':>10} {'gap min':>8} {'gap p50':>8} {'gap max':>8} {'<1 ms':>6} "
+          f"{'coalesced':>10} {'jitter p50':>11} {'jitter p99':>11} {'missed':>7} {'cpu ms/s':>9}")
+    for output_hz in [0] + [int(hz) for hz in args.hz.split(",")]:
+        updates, gaps, output, cpu_ms = measure(output_hz, args)
+        jitter = output.tick_jitter.summary()
+        mode = f"{output_hz} Hz" if output_hz else "arrival"
+        short = sum(1 for gap in gaps if gap < 0.001) / max(1, len(gaps))
+        print(f"{mode:>8} {updates:>10.1f} {gaps[0] * 1000:>8.3f} {gaps[len(gaps) // 2] * 1000:>8.3f} "
+              f"{gaps[-1] * 1000:>8.3f} {short:>6.0%} {output.coalesced:>10} {jitter['p50_ms']:>11.3f} "
+              f"{jitter['p99_ms']:>11.3f} {output.missed_ticks:>7} {cpu_ms:>9.1f}")
+        output.set_rate(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Event loop lag with the virtual pads written on the loop or on the pad
+output thread.
+
+--pads phones stream bin1 frames at --rate Hz each (the left stick moving,
+so every frame changes the pad) into one asyncio loop, as the apps receive
+them. Each pad's update() blocks for --update-us with the GIL released, the
+way a ViGEm call waits on the driver; every --stall-every'th update takes
+--stall-ms instead (a busy driver, a pad being plugged in).
+
+  inline   handle_input as before: the core decodes, maps and applies on the
+           loop, update() included
+  worker   the loop decodes and hands the state to src/core/pad_output.py
+
+Reported: how late the loop runs a 1 ms timer (what every socket read
+waits on top of its own work), frame to update() latency, and the frames the
+worker coalesced because a newer one arrived first.
+
+    python -m benchmarks.bench_pad_output --pads 4 --rate 250 --update-us 300
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.fakepad import FakeGamepad
+from src.core.input_core import InputCore
+from src.core.pad_output import Latency, LoopLag, PadOutput
+from src.utils.frames import ControllerFrame
+
+AXIS = 32767
+
+
+class StallingGamepad(FakeGamepad):
+    def __init__(self, args):
+        super().__init__(args.update_us, blocking=True)
+        self.stall_every = args.stall_every
+        self.stall_s = args.stall_ms / 1000
+
+    def update(self):
+        if self.stall_every and self.updates % self.stall_every == self.stall_every - 1:
+            self.updates += 1
+            time.sleep(self.stall_s)
+        else:
+            super().update()
+
+
+async def phone(device_id: str, handle, args):
+    frames = [ControllerFrame(seq=step, lx=(step % 50) * AXIS // 50).encode() for step in range(100)]
+    period = 1.0 / args.rate
+    end = time.perf_counter() + args.duration
+    next_send = time.perf_counter()
+    step = 0
+    while next_send < end:
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_send += period
+        handle(device_id, frames[step % 100])
+        step += 1
+
+
+def measure(mode: str, args):
+    core = InputCore()
+    output = PadOutput()
+    latency = Latency(window=1 << 20)
+    phones = [f"phone-{index}" for index in range(args.pads)]
+
+    if mode == "inline":
+        def handle(device_id, payload):
+            started = time.perf_counter()
+            core.process(device_id, payload)
+            latency.observe(time.perf_counter() - started)
+    else:
+        output.apply_latency = latency
+
+        def handle(device_id, payload):
+            decoded = core.decode_payload(payload)
+            if decoded is not None:
+                output.put(core, device_id, decoded)
+
+    async def main():
+        for device_id in phones:
+            gamepad = StallingGamepad(args)
+            if mode == "worker":
+                await output.call(core.add, device_id, gamepad)
+            else:
+                core.add(device_id, gamepad)
+        loop_lag = LoopLag(interval=0.001)
+        loop_lag.lag = Latency(window=1 << 20)
+        loop_lag.start()
+        await asyncio.gather(*(phone(device_id, handle, args) for device_id in phones))
+        loop_lag.stop()
+        await asyncio.sleep(0.1)
+        return loop_lag.lag
+
+    loop_lag = asyncio.run(main())
+    return loop_lag.summary(), latency.summary(), output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pads", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=250.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--update-us", type=float, default=300.0)
+    parser.add_argument("--stall-every", type=int, default=500, help="0 = never")
+    parser.add_argument("--stall-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':>7} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} "
+          f"{'apply p50':>10} {'apply p99':>10} {'apply max':>10} {'applied':>8} {'coalesced':>10}  (ms)")
+    for mode in ("inline", "worker"):
+        lag, apply, output = measure(mode, args)
+        print(f"{mode:>7} {lag['p50_ms']:>8.3f} {lag['p99_ms']:>8.3f} {lag['max_ms']:>8.3f} "
+              f"{apply['p50_ms']:>10.3f} {apply['p99_ms']:>10.3f} {apply['max_ms']:>10.3f} "
+              f"{apply['count']:>8} {output.coalesced if mode == 'worker' else 0:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Stand-ins for the benchmarks: a virtual pad that counts calls, and a
+vgamepad module with the real XUSB button values where vgamepad (Windows
+only) is not installed. Import this before anything from src.core.
+"""
+import enum
+import sys
+import time
+import types
+
+try:
+    import vgamepad as vg
+except ImportError:
+    class XUSB_BUTTON(enum.IntFlag):
+        XUSB_GAMEPAD_DPAD_UP = 0x0001
+        XUSB_GAMEPAD_DPAD_DOWN = 0x0002
+        XUSB_GAMEPAD_DPAD_LEFT = 0x0004
+        XUSB_GAMEPAD_DPAD_RIGHT = 0x0008
+        XUSB_GAMEPAD_START = 0x0010
+        XUSB_GAMEPAD_BACK = 0x0020
+        XUSB_GAMEPAD_LEFT_THUMB = 0x0040
+        XUSB_GAMEPAD_RIGHT_THUMB = 0x0080
+        XUSB_GAMEPAD_LEFT_SHOULDER = 0x0100
+        XUSB_GAMEPAD_RIGHT_SHOULDER = 0x0200
+        XUSB_GAMEPAD_GUIDE = 0x0400
+        XUSB_GAMEPAD_A = 0x1000
+        XUSB_GAMEPAD_B = 0x2000
+        XUSB_GAMEPAD_X = 0x4000
+        XUSB_GAMEPAD_Y = 0x8000
+
+    vg = types.ModuleType("vgamepad")
+    vg.XUSB_BUTTON = XUSB_BUTTON
+    sys.modules["vgamepad"] = vg
+
+
+class FakeGamepad:
+    # blocking=True sleeps in update() instead of spinning: a ViGEm call
+    # waits on the driver with the GIL released
+    def __init__(self, update_us: float = 0.0, blocking: bool = False):
+        self.calls = 0
+        self.updates = 0
+        self.update_s = update_us / 1e6
+        self.blocking = blocking
+
+    def press_button(self, button):
+        self.calls += 1
+
+    def release_button(self, button):
+        self.calls += 1
+
+    def left_trigger_float(self, value_float):
+        self.calls += 1
+
+    def right_trigger_float(self, value_float):
+        self.calls += 1
+
+    def left_joystick_float(self, x_value_float, y_value_float):
+        self.calls += 1
+
+    def right_joystick_float(self, x_value_float, y_value_float):
+        self.calls += 1
+
+    def update(self):
+        # The driver round trip of a real pad
+        self.updates += 1
+        if self.blocking:
+            time.sleep(self.update_s)
+        elif self.update_s:
+            end = time.perf_counter() + self.update_s
+            while time.perf_counter() < end:
+                pass
@@ -3,11 +3,15 @@ from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from src.core.controller_manager import ControllerManager
+from src.core.pad_output import LoopLag, pad_output
 from src.utils.config import settings
+from src.utils.frames import negotiate
 import socket
 import asyncio
+import json
 
 controller_manager = ControllerManager()
+loop_lag = LoopLag()
 DEVICE_ID = str(uuid.uuid4())
 
 @asynccontextmanager
@@ -43,6 +47,10 @@ async def lifespan(app: FastAPI):
 
        is_broadcasting = True
        asyncio.create_task(broadcast_presence())
+       loop_lag.start()
+       pad_output.set_rate(settings.OUTPUT_HZ)
+       pad_output.set_delay(settings.JITTER_MIN_MS, settings.JITTER_MAX_MS)
+       controller_manager.jitter_buffer = settings.JITTER_BUFFER
        yield
 
    except Exception as e:
@@ -50,6 +58,7 @@ async def lifespan(app: FastAPI):
        raise
    finally:
        is_broadcasting = False
+       loop_lag.stop()
        for sock in udp_sockets:
            sock.close()
        udp_sockets.clear()
@@ -84,7 +93,11 @@ app.add_middleware(
 
 @app.get("/")
 async def root():
-   return {"status": "running"}
+   return {
+       "status": "running",
+       "loop_lag": loop_lag.lag.summary(),
+       "output": pad_output.stats()
+   }
 
 # desktop direct connection
 
@@ -98,11 +111,13 @@ async def controller_endpoint(websocket: WebSocket, device_id: str):
        initial_data = await websocket.receive_json()
        if initial_data.get("type") == "connect":
            device_name = initial_data.get("device_name", "Unknown Device")
+           frame_format = negotiate(initial_data.get("formats"))
            
            try:
                client = await controller_manager.add_client(device_id, device_name)
                await websocket.send_json({
-                   "type": "connect_success"
+                   "type": "connect_success",
+                   "format": frame_format
                })
            except Exception as e:
                await websocket.send_json({
@@ -112,7 +127,20 @@ async def controller_endpoint(websocket: WebSocket, device_id: str):
                return
 
        while True:
-           data = await websocket.receive_json()
+           message = await websocket.receive()
+           if message["type"] == "websocket.disconnect":
+               break
+
+           # Binary messages are compact controller frames, decoded by the input core
+           if message.get("bytes") is not None:
+               if client:
+                   try:
+                       await controller_manager.handle_input(device_id, message["bytes"])
+                   except Exception as e:
+                       print(f"Error handling input: {e}")
+               continue
+
+           data = json.loads(message["text"])
            
            if data.get("type") == "ping":
                await websocket.send_json({"type": "pong"})
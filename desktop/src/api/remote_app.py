@@ -1,89 +1,329 @@
 import uuid
+import random
 import asyncio
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from src.core.remote_controller_manager import RemoteControllerManager
+from src.core.input_mailbox import InputMailbox
+from src.core.pad_output import LoopLag, pad_output
 from src.utils.remote_server_events import remote_server_events
 from src.utils.config import settings
+from src.utils.frames import FORMAT_BIN1, FORMAT_JSON, split_room_frames, split_tagged_frames
+from typing import Dict, Optional
 import websockets
 import json
 
 remote_controller_manager = RemoteControllerManager()
+input_mailbox = InputMailbox()
+loop_lag = LoopLag()
 DEVICE_ID = str(uuid.uuid4())
 remote_ws = None
+remote_url = None
+
+# A relay cluster sends us to the node owning our room: HTTP 307 on the
+# handshake (followed by websockets itself) or a "redirect" message
+MAX_REDIRECTS = 5
+
+# A restarting relay sends "reconnect" with a delay_ms (or closes with 1012
+# / refuses with 503 while draining): we come back after that delay, then
+# retry with jittered exponential backoff. The virtual pads stay up meanwhile
+RECONNECT_ATTEMPTS = 6
+RECONNECT_BACKOFF = 0.5
+RESTART_CLOSE_CODES = (1012, 1013)
+
+# Every session this PC hosts shares one uplink (relay /mux): the relay gives
+# each joined room an index and tags its frames with it. A relay without /mux
+# gets the single room socket /ws/{unique_id} as before
+uplink_mux = False
+sessions: Dict[str, Optional[int]] = {}  # unique_id -> room index on the uplink
+session_ids: Dict[int, str] = {}  # room index -> unique_id
+device_sessions: Dict[str, str] = {}  # device_id -> unique_id of its room
 
 def create_app(unique_id: str):
+    async def open_remote(url: str):
+        global remote_ws, remote_url
+        remote_ws = await websockets.connect(url)
+        remote_url = url
+        remote_server_events.emit_remote_log(f"Connected to remote server at {url}")
+        await remote_ws.send(json.dumps({
+            "device_type": "pc",
+            "device_id": DEVICE_ID,
+            "formats": [FORMAT_BIN1, FORMAT_JSON],
+            # Relay may group the inputs of several phones into one frame
+            "batch": True
+        }))
+
+    async def open_uplink():
+        global remote_ws, remote_url, uplink_mux
+        url = f"ws://{settings.REMOTE_SERVER}/mux"
+        try:
+            remote_ws = await websockets.connect(url)
+        except websockets.exceptions.InvalidStatusCode as e:
+            if e.status_code not in (403, 404):
+                raise
+            # Relay without multiplexing, this session only
+            uplink_mux = False
+            await open_remote(f"ws://{settings.REMOTE_SERVER}/ws/{unique_id}")
+            return
+        uplink_mux = True
+        remote_url = url
+        # Indexes are handed out again by the "joined" replies
+        session_ids.clear()
+        for session in sessions:
+            sessions[session] = None
+        remote_server_events.emit_remote_log(f"Connected to remote server at {url} ({len(sessions)} sessions)")
+        await remote_ws.send(json.dumps({
+            "device_type": "pc",
+            "device_id": DEVICE_ID,
+            "formats": [FORMAT_BIN1, FORMAT_JSON],
+            "batch": True,
+            "rooms": list(sessions)
+        }))
+
+    async def send_to_relay(message: dict, room: Optional[int] = None):
+        # Replies go to the room the message came from
+        if uplink_mux and room is not None:
+            message = {"r": room, "m": message}
+        await remote_ws.send(json.dumps(message))
+
+    async def follow_redirect(url: str, redirects: int):
+        if redirects >= MAX_REDIRECTS:
+            raise RuntimeError(f"Too many relay redirects, last to {url}")
+        remote_server_events.emit_remote_log(f"Relay redirected to {url}")
+        await remote_ws.close()
+        await open_remote(url)
+
+    async def reconnect_remote():
+        try:
+            await remote_ws.close()
+        except Exception:
+            pass
+        for attempt in range(RECONNECT_ATTEMPTS):
+            try:
+                if uplink_mux:
+                    await open_uplink()
+                else:
+                    await open_remote(remote_url)
+                return
+            except (OSError, websockets.exceptions.InvalidHandshake) as e:
+                delay = random.uniform(0, RECONNECT_BACKOFF * 2 ** attempt)
+                remote_server_events.emit_remote_log(f"Reconnect failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        raise RuntimeError(f"Relay unreachable after {RECONNECT_ATTEMPTS} attempts")
+
+    def sort_message(data: dict, room: Optional[int] = None):
+        if not isinstance(data, dict):
+            return
+        if data.get("type") == "controller_input":
+            # The relay wraps the phone's original message as "frame"
+            frame = data.get("frame", data)
+            if isinstance(frame, dict):
+                input_mailbox.put_input(data.get("device_id"), frame.get("data", {}))
+            return
+        if room is not None:
+            data["_room"] = room
+        if data.get("type") == "disconnect":
+            input_mailbox.put_control(data, device_id=data.get("device_id"))
+        else:
+            input_mailbox.put_control(data)
+
+    def sort_item(item: dict):
+        # {"r": <room index>, "m": <message>} on the uplink, bare otherwise
+        if not isinstance(item, dict):
+            return
+        if "r" in item:
+            sort_message(item.get("m"), item["r"])
+        else:
+            sort_message(item)
+
+    async def handle_session_message(data: dict):
+        global uplink_mux
+        if data.get("type") == "joined":
+            sessions[data["room"]] = data["index"]
+            session_ids[data["index"]] = data["room"]
+            remote_server_events.emit_remote_log(f"Session {data['room']} joined as room {data['index']}")
+        elif data.get("type") == "left":
+            session_ids.pop(data.get("index"), None)
+            input_mailbox.put_control({"type": "session_closed", "room": data.get("room")})
+        elif data.get("type") == "join_error":
+            room = data.get("room")
+            remote_server_events.emit_remote_log(
+                f"Session {room} rejected by the relay: {data.get('message') or data.get('url')}", level="ERROR"
+            )
+            if room == unique_id and data.get("url") and len(sessions) == 1:
+                # Cluster node that does not own our room: its own socket there
+                await remote_ws.close()
+                uplink_mux = False
+                await open_remote(data["url"])
+            else:
+                sessions.pop(room, None)
+
     async def handle_remote_messages():
-        global remote_ws
+        # Only reads and sorts, applying happens in apply_remote_messages so
+        # a slow apply never backs up the socket with stale snapshots
+        loop = asyncio.get_running_loop()
+        redirects = 0
+        reconnect_at = None
         while remote_ws:
             try:
                 if remote_ws:
-                    message = await remote_ws.recv()
-                    data = json.loads(message)
-                    
-                    if data.get("type") == "connect":
-                        device_id = data.get("device_id")
-                        device_name = data.get("device_name", "Unknown Device")
-                        
-                        try:
-                            await remote_controller_manager.add_client(device_id, device_name)
-                            await remote_ws.send(json.dumps({
-                                "type": "connect_success",
-                                "device_type": "pc",
-                                "device_id": device_id
-                            }))
-                            remote_server_events.emit_remote_log(f"Client connected: {device_name} ({device_id})")
-                        except Exception:
-                            await remote_ws.send(json.dumps({
-                                "type": "connect_error",
-                                "device_id": device_id,
-                                "device_type": "pc",
-                                "message": "Failed to connect"
-                            }))
-                    
-                    elif data.get("type") == "disconnect":
-                        device_id = data.get("device_id")
-                        await remote_controller_manager.remove_client(device_id)
-                        remote_server_events.emit_remote_log(f"Client disconnected: {device_id}")
-                    
-                    elif data.get("type") == "controller_input":
-                        device_id = data.get("device_id")
-                        if device_id in remote_controller_manager.controllers:
-                            try:
-                                await remote_controller_manager.handle_input(
-                                    device_id,
-                                    data.get("data", {})
-                                )
-                            except Exception as e:
-                                remote_server_events.emit_remote_log(
-                                    f"Error handling input from {device_id}: {e}",
-                                    level="ERROR"
-                                )
-                    
-            except websockets.exceptions.ConnectionClosed:
-                break
+                    timeout = None if reconnect_at is None else max(0, reconnect_at - loop.time())
+                    message = await asyncio.wait_for(remote_ws.recv(), timeout)
+
+                    # Binary controller frames tagged with the phone's device_id,
+                    # one or a batch of them
+                    if isinstance(message, bytes):
+                        if uplink_mux:
+                            # Pads are per device, the room index is not needed
+                            for _, device_id, payload in split_room_frames(message):
+                                input_mailbox.put_input(device_id, payload)
+                        else:
+                            for device_id, payload in split_tagged_frames(message):
+                                input_mailbox.put_input(device_id, payload)
+                        continue
+
+                    try:
+                        data = json.loads(message)
+                    except ValueError:
+                        # Not ours to fix, and the next input is a full state
+                        # again: skip it without holding up the socket
+                        continue
+                    if not isinstance(data, (dict, list)):
+                        continue
+
+                    # Batched inputs arrive as an array of input messages
+                    if isinstance(data, list):
+                        for item in data:
+                            sort_item(item)
+                    elif "r" in data:
+                        sort_item(data)
+                    elif data.get("type") in ("joined", "left", "join_error"):
+                        await handle_session_message(data)
+                    elif data.get("type") == "redirect":
+                        redirects += 1
+                        await follow_redirect(data["url"], redirects)
+                    elif data.get("type") == "reconnect":
+                        # Keep reading until our turn, the relay still forwards
+                        remote_server_events.emit_remote_log(f"Relay restarting, reconnecting in {data.get('delay_ms', 0)}ms")
+                        reconnect_at = loop.time() + data.get("delay_ms", 0) / 1000
+                    else:
+                        sort_message(data)
+
+            except asyncio.TimeoutError:
+                reconnect_at = None
+                await reconnect_remote()
+            except websockets.exceptions.ConnectionClosed as e:
+                if reconnect_at is None and (e.rcvd is None or e.rcvd.code not in RESTART_CLOSE_CODES):
+                    break
+                delay = random.uniform(0, RECONNECT_BACKOFF) if reconnect_at is None else reconnect_at - loop.time()
+                reconnect_at = None
+                await asyncio.sleep(max(0, delay))
+                await reconnect_remote()
             except Exception:
                 await asyncio.sleep(1)
                 continue
 
         remote_server_events.emit_remote_log("Remote message handler stopped")
 
+    async def apply_remote_messages():
+        while True:
+            await input_mailbox.wait()
+
+            while True:
+                data = input_mailbox.pop_control()
+                if data is not None:
+                    try:
+                        await apply_control(data)
+                    except Exception as e:
+                        remote_server_events.emit_remote_log(f"Error handling {data.get('type')}: {e}", level="ERROR")
+                    continue
+
+                item = input_mailbox.pop_input()
+                if item is None:
+                    break
+                device_id, state = item
+                if device_id not in remote_controller_manager.controllers:
+                    continue
+                try:
+                    # bin1 frames are decoded by the input core
+                    await remote_controller_manager.handle_input(device_id, state)
+                except Exception as e:
+                    remote_server_events.emit_remote_log(
+                        f"Error handling input from {device_id}: {e}",
+                        level="ERROR"
+                    )
+
+    async def apply_control(data: dict):
+        if data.get("type") == "hello":
+            remote_server_events.emit_remote_log(
+                f"Relay frame format: {data.get('format')}, batching: {data.get('batch', False)}, "
+                f"multiplexed: {data.get('mux', False)}"
+            )
+
+        elif data.get("type") == "connect":
+            device_id = data.get("device_id")
+            device_name = data.get("device_name", "Unknown Device")
+            room = data.get("_room")
+            
+            try:
+                # Already there when the phone comes back after a relay restart
+                if device_id not in remote_controller_manager.controllers:
+                    await remote_controller_manager.add_client(device_id, device_name)
+                device_sessions[device_id] = session_ids.get(room, unique_id)
+                await send_to_relay({
+                    "type": "connect_success",
+                    "device_type": "pc",
+                    "device_id": device_id
+                }, room)
+                remote_server_events.emit_remote_log(f"Client connected: {device_name} ({device_id})")
+            except Exception:
+                await send_to_relay({
+                    "type": "connect_error",
+                    "device_id": device_id,
+                    "device_type": "pc",
+                    "message": "Failed to connect"
+                }, room)
+        
+        elif data.get("type") == "snapshot":
+            # Sent by the relay when we (re)connect: every phone already in the
+            # room with its latest state, so the pads resume right away
+            for device in data.get("devices", []):
+                device_id = device.get("device_id")
+                device_sessions[device_id] = session_ids.get(data.get("_room"), unique_id)
+                if device_id not in remote_controller_manager.controllers:
+                    await remote_controller_manager.add_client(device_id, device.get("device_name", "Unknown Device"))
+                    remote_server_events.emit_remote_log(f"Client restored: {device.get('device_name')} ({device_id})")
+                if device.get("data"):
+                    await remote_controller_manager.handle_input(device_id, device["data"])
+
+        elif data.get("type") == "disconnect":
+            device_id = data.get("device_id")
+            device_sessions.pop(device_id, None)
+            await remote_controller_manager.remove_client(device_id)
+            remote_server_events.emit_remote_log(f"Client disconnected: {device_id}")
+
+        elif data.get("type") == "session_closed":
+            # A session left the uplink, its pads go with it
+            for device_id, session in list(device_sessions.items()):
+                if session == data.get("room"):
+                    device_sessions.pop(device_id)
+                    await remote_controller_manager.remove_client(device_id)
+
     @asynccontextmanager
     async def lifespan(app: FastAPI):
         global remote_ws
         try:
-            remote_url = f"ws://{settings.REMOTE_SERVER}/ws/{unique_id}"
-            remote_ws = await websockets.connect(remote_url)
-            
-            remote_server_events.emit_remote_log(f"Connected to remote server at {remote_url}")
-            
-            await remote_ws.send(json.dumps({
-                "device_type": "pc",
-                "device_id": DEVICE_ID
-            }))
+            sessions[unique_id] = None
+            await open_uplink()
             
             message_handler = asyncio.create_task(handle_remote_messages())
+            input_applier = asyncio.create_task(apply_remote_messages())
+            loop_lag.start()
+            pad_output.set_rate(settings.OUTPUT_HZ)
+            pad_output.set_delay(settings.JITTER_MIN_MS, settings.JITTER_MAX_MS)
+            remote_controller_manager.jitter_buffer = settings.REMOTE_JITTER_BUFFER
             
             # Yang penting: yield harus tetap dieksekusi meski ada error
             yield
@@ -91,6 +331,8 @@ def create_app(unique_id: str):
             # Cancel message handler saat shutdown
             if not message_handler.done():
                 message_handler.cancel()
+            input_applier.cancel()
+            loop_lag.stop()
                 
         except Exception as e:
             remote_server_events.emit_remote_server_error(str(e))
@@ -101,6 +343,10 @@ def create_app(unique_id: str):
             if remote_ws:
                 await remote_ws.close()
             remote_ws = None
+            sessions.clear()
+            session_ids.clear()
+            device_sessions.clear()
+            input_mailbox.clear()
             # Clear manager state juga
             await remote_controller_manager.clear()
             remote_server_events.emit_remote_log("Remote connection closed")
@@ -120,11 +366,35 @@ def create_app(unique_id: str):
         return {
             "status": "running",
             "mode": "remote",
-            "connected_to": f"ws://{settings.REMOTE_SERVER}/ws/{unique_id}",
+            "connected_to": remote_url or f"ws://{settings.REMOTE_SERVER}/ws/{unique_id}",
             "unique_id": unique_id,
-            "connected_clients": len(remote_controller_manager.controllers)
+            "multiplexed": uplink_mux,
+            "sessions": list(sessions),
+            "connected_clients": len(remote_controller_manager.controllers),
+            "received_inputs": input_mailbox.received_inputs,
+            "superseded_inputs": input_mailbox.superseded_inputs,
+            "loop_lag": loop_lag.lag.summary(),
+            "output": pad_output.stats()
         }
 
+    # Extra sessions on the same uplink, e.g. a LAN party split in two rooms
+    @app.post("/sessions")
+    async def add_session():
+        if not uplink_mux or remote_ws is None:
+            return JSONResponse({"error": "Relay does not support multiple sessions"}, status_code=409)
+        session = str(uuid.uuid4())
+        sessions[session] = None
+        await remote_ws.send(json.dumps({"type": "join", "room": session}))
+        return {"unique_id": session}
+
+    @app.delete("/sessions/{session}")
+    async def remove_session(session: str):
+        if session == unique_id or session not in sessions:
+            return JSONResponse({"error": "Unknown session"}, status_code=404)
+        sessions.pop(session)
+        await remote_ws.send(json.dumps({"type": "leave", "room": session}))
+        return {"status": "left", "unique_id": session}
+
     @app.websocket("/ws/status")
     async def status_endpoint(websocket: WebSocket):
         await websocket.accept()
@@ -0,0 +1,347 @@
+import json
+import time
+import vgamepad as vg
+from typing import Callable, Dict, Optional
+
+from src.utils.frames import AXIS_MAX, TRIGGER_MAX, ControllerFrame, decode_frame
+
+# Input path shared by the local server (api/app.py) and the relay client
+# (api/remote_app.py), in four stages:
+#
+#   decode    bin1 frame, JSON text or an already parsed ControllerState
+#   validate  drops anything that is not shaped like a ControllerState
+#   map       to a PadState: XUSB button mask, triggers and sticks clamped
+#             to the pad's range, Y inverted
+#   apply     only the fields that changed reach the virtual pad, an
+#             identical state skips update() as well
+#
+# InputCore.on_stage, when set, is called with (stage, seconds) after every
+# stage; StageTimes is a ready-made hook that keeps count, total and max.
+# The apps run decode/validate on the event loop (decode_payload) and
+# map/apply on the pad output thread (apply_decoded, src/core/pad_output.py).
+
+# Button ids from the phone carry the layout as a prefix ("<layout>_A"), only
+# the part after the last underscore names the button
+BUTTONS = {
+    'A': vg.XUSB_BUTTON.XUSB_GAMEPAD_A,
+    'B': vg.XUSB_BUTTON.XUSB_GAMEPAD_B,
+    'X': vg.XUSB_BUTTON.XUSB_GAMEPAD_X,
+    'Y': vg.XUSB_BUTTON.XUSB_GAMEPAD_Y,
+    'LB': vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_SHOULDER,
+    'RB': vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_SHOULDER,
+    'Start': vg.XUSB_BUTTON.XUSB_GAMEPAD_START,
+    'Select': vg.XUSB_BUTTON.XUSB_GAMEPAD_BACK,
+    'LS': vg.XUSB_BUTTON.XUSB_GAMEPAD_LEFT_THUMB,
+    'RS': vg.XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_THUMB,
+}
+
+DPAD = (
+    ('upPressed', vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP),
+    ('downPressed', vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN),
+    ('leftPressed', vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT),
+    ('rightPressed', vg.XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT),
+)
+
+STAGES = ("decode", "validate", "map", "apply")
+
+# Resolved button ids: an XUSB bit, or one of these for the triggers
+LEFT_TRIGGER = -1
+RIGHT_TRIGGER = -2
+UNKNOWN = 0
+
+_BY_BIT = {int(button): button for button in list(BUTTONS.values()) + [button for _, button in DPAD]}
+_KNOWN_MASK = sum(_BY_BIT)
+_BUTTON_BITS = tuple((name, int(button)) for name, button in BUTTONS.items())
+_DPAD_BITS = tuple((key, int(button)) for key, button in DPAD)
+_DPAD_MASK = sum(bit for _, bit in _DPAD_BITS)
+_STATE_PARTS = ("buttonStates", "leftJoystickState", "rightJoystickState", "dpadState")
+
+# Raw button id -> resolved, filled on first sight. Layouts only have a handful
+# of ids, the cap keeps garbage ids from growing it forever
+_resolved: Dict[str, int] = {}
+_RESOLVED_MAX = 1024
+
+
+def resolve_button(button_id: str) -> int:
+    resolved = _resolved.get(button_id)
+    if resolved is not None:
+        return resolved
+    name = button_id.split('_')[-1]
+    if name == 'LT':
+        resolved = LEFT_TRIGGER
+    elif name == 'RT':
+        resolved = RIGHT_TRIGGER
+    else:
+        resolved = int(BUTTONS[name]) if name in BUTTONS else UNKNOWN
+    if len(_resolved) < _RESOLVED_MAX:
+        _resolved[button_id] = resolved
+    return resolved
+
+
+def _axis(value) -> float:
+    value = float(value)
+    if -1.0 <= value <= 1.0:
+        return value
+    return 0.0 if value != value else max(-1.0, min(1.0, value))  # NaN centres
+
+
+def _trigger(value) -> float:
+    value = float(value)
+    if 0.0 <= value <= 1.0:
+        return value
+    return 0.0 if value != value else max(0.0, min(1.0, value))
+
+
+class PadState:
+    """What a virtual pad is set to. Sticks are (x, y) with y already inverted."""
+
+    __slots__ = ("buttons", "left_trigger", "right_trigger", "left", "right")
+
+    def __init__(self, buttons: int = 0, left_trigger: float = 0.0, right_trigger: float = 0.0,
+                 left: tuple = (0.0, 0.0), right: tuple = (0.0, 0.0)):
+        self.buttons = buttons
+        self.left_trigger = left_trigger
+        self.right_trigger = right_trigger
+        self.left = left
+        self.right = right
+
+    def __eq__(self, other) -> bool:
+        return (
+            self.buttons == other.buttons and self.left_trigger == other.left_trigger
+            and self.right_trigger == other.right_trigger and self.left == other.left and self.right == other.right
+        )
+
+
+def decode(payload):
+    # ControllerFrame, ControllerState dict, or None
+    if isinstance(payload, (bytes, bytearray)):
+        return decode_frame(payload)
+    if isinstance(payload, str):
+        try:
+            return json.loads(payload)
+        except ValueError:
+            return None
+    return payload
+
+
+def validate(decoded) -> bool:
+    if isinstance(decoded, ControllerFrame):
+        return True  # decode_frame checked size and version
+    if not isinstance(decoded, dict):
+        return False
+    for part in _STATE_PARTS:
+        value = decoded.get(part)
+        if value is not None and not isinstance(value, dict):
+            return False
+    return True
+
+
+def map_state(decoded, previous: PadState) -> PadState:
+    # Raises ValueError/TypeError on values that are not numbers
+    if isinstance(decoded, ControllerFrame):
+        return PadState(
+            decoded.buttons & _KNOWN_MASK,
+            decoded.lt / TRIGGER_MAX, decoded.rt / TRIGGER_MAX,
+            (decoded.lx / AXIS_MAX, -(decoded.ly / AXIS_MAX)),
+            (decoded.rx / AXIS_MAX, -(decoded.ry / AXIS_MAX))
+        )
+
+    # Buttons missing from a snapshot keep their state
+    buttons = previous.buttons
+    left_trigger = previous.left_trigger
+    right_trigger = previous.right_trigger
+    for button_id, state in (decoded.get("buttonStates") or {}).items():
+        resolved = _resolved.get(button_id)
+        if resolved is None:
+            resolved = resolve_button(button_id)
+        if resolved > 0:
+            if state.get("isPressed"):
+                buttons |= resolved
+            else:
+                buttons &= ~resolved
+        elif resolved == LEFT_TRIGGER:
+            left_trigger = _trigger(state.get("value", 0.0))
+        elif resolved == RIGHT_TRIGGER:
+            right_trigger = _trigger(state.get("value", 0.0))
+
+    # The d-pad is always sent in full
+    dpad = decoded.get("dpadState") or {}
+    buttons &= ~_DPAD_MASK
+    for key, bit in _DPAD_BITS:
+        if dpad.get(key):
+            buttons |= bit
+
+    left_joy = decoded.get("leftJoystickState") or {}
+    right_joy = decoded.get("rightJoystickState") or {}
+    return PadState(
+        buttons, left_trigger, right_trigger,
+        (_axis(left_joy.get("dx", 0.0)), -_axis(left_joy.get("dy", 0.0))),  # Invert Y axis
+        (_axis(right_joy.get("dx", 0.0)), -_axis(right_joy.get("dy", 0.0)))
+    )
+
+
+class Pad:
+    """A virtual pad and the state last applied to it."""
+
+    __slots__ = ("gamepad", "state", "updates", "skipped")
+
+    def __init__(self, gamepad):
+        self.gamepad = gamepad
+        # Same as a fresh pad: nothing pressed, sticks centred
+        self.state = PadState()
+        self.updates = 0
+        self.skipped = 0
+
+    def apply(self, state: PadState) -> bool:
+        # Returns whether the pad got an update()
+        gamepad = self.gamepad
+        last = self.state
+        dirty = False
+        changed = state.buttons ^ last.buttons
+        if changed:
+            dirty = True
+            buttons = state.buttons
+            while changed:
+                bit = changed & -changed
+                changed ^= bit
+                if buttons & bit:
+                    gamepad.press_button(button=_BY_BIT[bit])
+                else:
+                    gamepad.release_button(button=_BY_BIT[bit])
+        if state.left_trigger != last.left_trigger:
+            dirty = True
+            gamepad.left_trigger_float(value_float=state.left_trigger)
+        if state.right_trigger != last.right_trigger:
+            dirty = True
+            gamepad.right_trigger_float(value_float=state.right_trigger)
+        if state.left != last.left:
+            dirty = True
+            gamepad.left_joystick_float(x_value_float=state.left[0], y_value_float=state.left[1])
+        if state.right != last.right:
+            dirty = True
+            gamepad.right_joystick_float(x_value_float=state.right[0], y_value_float=state.right[1])
+
+        if not dirty:
+            self.skipped += 1
+            return False
+        self.state = state
+        gamepad.update()
+        self.updates += 1
+        return True
+
+
+class StageTimes:
+    """on_stage hook keeping count, total and max seconds per stage."""
+
+    def __init__(self):
+        self.count = dict.fromkeys(STAGES, 0)
+        self.total = dict.fromkeys(STAGES, 0.0)
+        self.max = dict.fromkeys(STAGES, 0.0)
+
+    def __call__(self, stage: str, seconds: float):
+        self.count[stage] += 1
+        self.total[stage] += seconds
+        if seconds > self.max[stage]:
+            self.max[stage] = seconds
+
+    def summary(self) -> dict:
+        return {
+            stage: {
+                "count": self.count[stage],
+                "avg_us": self.total[stage] / self.count[stage] * 1e6 if self.count[stage] else 0.0,
+                "max_us": self.max[stage] * 1e6
+            }
+            for stage in STAGES
+        }
+
+
+class InputCore:
+    def __init__(self):
+        self.pads: Dict[str, Pad] = {}
+        self.invalid = 0
+        self.on_stage: Optional[Callable[[str, float], None]] = None
+        # Called with (device_id, state) after apply_decoded updated a pad
+        self.on_applied: Optional[Callable[[str, PadState], None]] = None
+
+    def add(self, device_id: str, gamepad) -> Pad:
+        pad = self.pads[device_id] = Pad(gamepad)
+        return pad
+
+    def remove(self, device_id: str):
+        self.pads.pop(device_id, None)
+
+    def process(self, device_id: str, payload) -> Optional[PadState]:
+        # The new state when the pad was updated, None when nothing changed
+        # (or the payload was not a controller state)
+        if device_id not in self.pads:
+            return None
+        decoded = self.decode_payload(payload)
+        if decoded is None:
+            return None
+        return self.apply_decoded(device_id, decoded)
+
+    def decode_payload(self, payload):
+        # decode + validate, the part that runs on the event loop. None for
+        # anything that is not a controller state
+        if self.on_stage is None:
+            decoded = decode(payload)
+            if decoded is None or not validate(decoded):
+                self.invalid += 1
+                return None
+            return decoded
+        hook = self.on_stage
+        clock = time.perf_counter
+        started = clock()
+        decoded = decode(payload)
+        decoded_at = clock()
+        hook("decode", decoded_at - started)
+        valid = decoded is not None and validate(decoded)
+        hook("validate", clock() - decoded_at)
+        if not valid:
+            self.invalid += 1
+            return None
+        return decoded
+
+    def apply_decoded(self, device_id: str, decoded) -> Optional[PadState]:
+        # map + apply, the part that touches the pad (see src/core/pad_output.py)
+        pad = self.pads.get(device_id)
+        if pad is None:
+            return None
+        hook = self.on_stage
+        if hook is not None:
+            started = time.perf_counter()
+        try:
+            state = map_state(decoded, pad.state)
+        except (TypeError, ValueError, AttributeError):
+            self.invalid += 1
+            return None
+        if hook is None:
+            applied = pad.apply(state)
+        else:
+            mapped_at = time.perf_counter()
+            hook("map", mapped_at - started)
+            applied = pad.apply(state)
+            hook("apply", time.perf_counter() - mapped_at)
+        if not applied:
+            return None
+        if self.on_applied is not None:
+            self.on_applied(device_id, state)
+        return state
+
+
+def display_state(state: PadState) -> dict:
+    # ControllerState layout for the monitor tabs ("_A" style button keys,
+    # sticks in phone coordinates)
+    buttons = state.buttons
+    button_states = {
+        f"_{name.upper()}": {"isPressed": bool(buttons & bit), "value": 1.0 if buttons & bit else 0.0}
+        for name, bit in _BUTTON_BITS
+    }
+    button_states["_LT"] = {"isPressed": state.left_trigger > 0, "value": state.left_trigger}
+    button_states["_RT"] = {"isPressed": state.right_trigger > 0, "value": state.right_trigger}
+    return {
+        "buttonStates": button_states,
+        "dpadState": {key: bool(buttons & bit) for key, bit in _DPAD_BITS},
+        "leftJoystickState": {"dx": state.left[0], "dy": -state.left[1]},
+        "rightJoystickState": {"dx": state.right[0], "dy": -state.right[1]},
+    }
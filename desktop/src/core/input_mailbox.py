@@ -0,0 +1,50 @@
+import asyncio
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+
+class InputMailbox:
+    """Hand-off between the relay read loop and the input applier.
+
+    Control messages are kept in order. Each controller_input is a full state
+    snapshot, so only the newest one per device is kept while an apply is in
+    flight; the older ones are counted as superseded and dropped.
+    """
+
+    def __init__(self):
+        self.controls = deque()
+        self.inputs: Dict[str, Any] = {}
+        self.received_inputs = 0
+        self.superseded_inputs = 0
+        self._ready = asyncio.Event()
+
+    def put_control(self, message: dict, device_id: Optional[str] = None):
+        # A device that disconnects takes its pending input with it
+        if device_id is not None:
+            self.inputs.pop(device_id, None)
+        self.controls.append(message)
+        self._ready.set()
+
+    def put_input(self, device_id: str, state: Any):
+        self.received_inputs += 1
+        if device_id in self.inputs:
+            self.superseded_inputs += 1
+        self.inputs[device_id] = state
+        self._ready.set()
+
+    async def wait(self):
+        await self._ready.wait()
+        self._ready.clear()
+
+    def pop_control(self) -> Optional[dict]:
+        return self.controls.popleft() if self.controls else None
+
+    def pop_input(self) -> Optional[Tuple[str, Any]]:
+        if not self.inputs:
+            return None
+        device_id = next(iter(self.inputs))
+        return device_id, self.inputs.pop(device_id)
+
+    def clear(self):
+        self.controls.clear()
+        self.inputs.clear()
@@ -0,0 +1,141 @@
+import heapq
+from datetime import datetime
+from typing import Optional
+
+from src.utils.frames import ControllerFrame
+
+# Every controller state carries the phone's send time (bin1 timestamp_us,
+# ControllerState "timestamp"). Relayed inputs arrive with the jitter of the
+# relay hop, a JitterBuffer per device takes it out again before the pad is
+# written (src/core/pad_output.py runs one per device when the manager asks):
+#
+#   offset  arrival minus send time of the fastest recent frame: the phone
+#           clock against ours plus the one-way trip, the two are never
+#           separated. It follows the minimum, and creeps up slowly so that
+#           clock drift and a route that got slower are picked up too
+#   jitter  how much later than that fastest frame frames arrive, averaged
+#           the RFC 3550 way (1/16 per frame)
+#   delay   the target: JITTER_FACTOR x jitter within [min_delay, max_delay],
+#           moved towards the target a little per frame so the release
+#           schedule does not jump
+#
+# A frame is released at send time + offset + delay. Frames are kept in send
+# order, one that arrives after a newer one went out is dropped (late), one
+# that overtook an older one still in the buffer is just sorted in
+# (reordered). When several are due at once only the newest is applied, the
+# others are skipped: each one is a full state. A jump of the sender clock
+# (or a trip MAX_SHIFT longer than before) starts the estimate over.
+
+JITTER_FACTOR = 3.0
+JITTER_GAIN = 1 / 16
+DELAY_GAIN = 1 / 32
+OFFSET_CREEP = 1 / 512
+MAX_SHIFT = 1.0
+MAX_FRAMES = 64
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def sender_time(decoded) -> Optional[float]:
+    # Send time in seconds on the phone's clock, None when there is none
+    if isinstance(decoded, ControllerFrame):
+        return decoded.timestamp_us / 1_000_000 if decoded.timestamp_us else None
+    timestamp = decoded.get("timestamp")
+    if not timestamp or not isinstance(timestamp, str):
+        return None
+    try:
+        sent = datetime.fromisoformat(timestamp)
+    except ValueError:
+        return None
+    if sent.tzinfo is not None:
+        return sent.timestamp()
+    return (sent - _EPOCH).total_seconds()
+
+
+class JitterBuffer:
+    def __init__(self, min_delay: float = 0.0, max_delay: float = 0.06):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.offset: Optional[float] = None
+        self.jitter = 0.0
+        self.delay = min_delay
+        # (send time, arrival order, state, arrival time)
+        self.frames = []
+        self.newest_sent: Optional[float] = None
+        self.released_sent: Optional[float] = None
+        self._order = 0
+        self.received = 0
+        self.released = 0
+        self.late = 0
+        self.reordered = 0
+        self.skipped = 0
+        self.resets = 0
+
+    def reset(self):
+        self.offset = None
+        self.jitter = 0.0
+        self.delay = self.min_delay
+        self.frames.clear()
+        self.newest_sent = None
+        self.released_sent = None
+        self.resets += 1
+
+    def push(self, sent: float, arrival: float, item):
+        self.received += 1
+        transit = arrival - sent
+        if self.offset is not None and abs(transit - self.offset) > MAX_SHIFT:
+            self.reset()
+        if self.offset is None or transit < self.offset:
+            self.offset = transit
+        else:
+            self.offset += (transit - self.offset) * OFFSET_CREEP
+        self.jitter += (transit - self.offset - self.jitter) * JITTER_GAIN
+        target = min(self.max_delay, max(self.min_delay, JITTER_FACTOR * self.jitter))
+        self.delay += (target - self.delay) * DELAY_GAIN
+
+        if self.released_sent is not None and sent <= self.released_sent:
+            self.late += 1
+            return
+        if self.newest_sent is not None and sent < self.newest_sent:
+            self.reordered += 1
+        else:
+            self.newest_sent = sent
+        self._order += 1
+        heapq.heappush(self.frames, (sent, self._order, item, arrival))
+        if len(self.frames) > MAX_FRAMES:
+            heapq.heappop(self.frames)
+            self.skipped += 1
+
+    def due(self) -> Optional[float]:
+        # When the oldest buffered frame goes out, on the arrival clock
+        if not self.frames:
+            return None
+        return self.frames[0][0] + self.offset + self.delay
+
+    def pop(self, now: float):
+        # The newest frame that is due by now as (state, arrival time), or None
+        frames = self.frames
+        release_before = now - self.offset - self.delay
+        released = None
+        while frames and frames[0][0] <= release_before:
+            if released is not None:
+                self.skipped += 1
+            released = heapq.heappop(frames)
+        if released is None:
+            return None
+        self.released += 1
+        self.released_sent = released[0]
+        return released[2], released[3]
+
+    def stats(self) -> dict:
+        return {
+            "delay_ms": round(self.delay * 1000, 2),
+            "jitter_ms": round(self.jitter * 1000, 2),
+            "buffered": len(self.frames),
+            "received": self.received,
+            "released": self.released,
+            "late": self.late,
+            "reordered": self.reordered,
+            "skipped": self.skipped,
+            "resets": self.resets
+        }
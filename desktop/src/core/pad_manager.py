@@ -0,0 +1,100 @@
+import vgamepad as vg
+from typing import Dict, Optional
+
+from src.core.input_core import InputCore
+from src.core.jitter_buffer import sender_time
+from src.core.pad_output import pad_output
+
+# What ControllerManager (LAN) and RemoteControllerManager (relay) share: the
+# client slots, one virtual pad per client on the pad output thread and the
+# input path through InputCore. The subclasses only say which events to emit
+# and how to name their clients in the log.
+
+
+class PadManager:
+    label = "Client"
+
+    def __init__(self):
+        self.controllers: Dict[str, dict] = {}  # {device_id: {gamepad, name}}
+        self.max_clients = 4
+        # States are released on the phone's send times, see src/core/jitter_buffer.py
+        self.jitter_buffer = False
+        self.input_core = InputCore()
+        # Runs on the pad output thread, the monitor only hears about changes
+        self.input_core.on_applied = self.emit_controller_input
+
+    def emit_client_connected(self, device_id: str, device_name: str):
+        pass
+
+    def emit_client_disconnected(self, device_id: str, device_name: str):
+        pass
+
+    def emit_controller_update(self, controller_info: dict):
+        pass
+
+    def emit_controller_input(self, device_id: str, state):
+        pass
+
+    async def add_client(self, device_id: str, device_name: str) -> Optional[dict]:
+        if len(self.controllers) >= self.max_clients:
+            raise Exception("Maximum controllers reached")
+
+        if device_id in self.controllers:
+            raise Exception("Device already connected")
+
+        # Pads are created (and dropped) on the pad output thread
+        gamepad = await pad_output.call(vg.VX360Gamepad)
+        client = {
+            "gamepad": gamepad,
+            "name": device_name
+        }
+
+        controller_info = {
+            "device_name": device_name,
+            "device_id": device_id,
+            "connected": True,
+        }
+        self.controllers[device_id] = client
+        self.input_core.add(device_id, gamepad)
+        print(f"{self.label} connected: {device_name} ({device_id})")
+        self.emit_client_connected(device_id, device_name)
+        self.emit_controller_update(controller_info)
+        return client
+
+    async def remove_client(self, device_id: str):
+        if device_id in self.controllers:
+            client = self.controllers[device_id]
+            print(f"{self.label} disconnected: {client['name']} ({device_id})")
+            controller_info = {
+                "device_name": client['name'],
+                "device_id": device_id,
+                "connected": False,
+            }
+            self.emit_controller_update(controller_info)
+            self.emit_client_disconnected(device_id, client['name'])
+            del self.controllers[device_id]
+            # The pad unplugs when its last reference goes, on the pad output
+            # thread after anything still in flight for it
+            client.pop("gamepad", None)
+            pad_output.discard(self.input_core, device_id)
+            await pad_output.call(self.input_core.remove, device_id)
+
+    async def clear(self):
+        for device_id in list(self.controllers):
+            await self.remove_client(device_id)
+
+    async def handle_input(self, device_id: str, payload):
+        # payload: bin1 frame or ControllerState, see src/core/input_core.py
+        if device_id not in self.controllers:
+            return
+
+        try:
+            # Only decoded here, the pad is written by the pad output thread
+            decoded = self.input_core.decode_payload(payload)
+            if decoded is not None:
+                sent = sender_time(decoded) if self.jitter_buffer else None
+                pad_output.put(self.input_core, device_id, decoded, sent)
+
+        except Exception as e:
+            print(f"Error processing {self.label.lower()} input: {e}")
+            raise
@@ -0,0 +1,329 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+
+from src.core.jitter_buffer import JitterBuffer
+
+# vgamepad calls go through the ViGEm driver and block for as long as the
+# driver takes, so they do not run on the asyncio loop that reads the
+# sockets. One worker thread owns every virtual pad: it creates them, applies
+# states to them and drops them.
+#
+# The loop only decodes and validates (InputCore.decode_payload) and puts the
+# result in the pad's slot. A slot holds the latest state only, a newer one
+# replaces a state the worker has not picked up yet (counted as coalesced),
+# every snapshot is a full state so nothing is lost. Slots are a plain dict,
+# an assignment on the loop and popitem() on the worker are atomic, there is
+# no lock to wait for on either side.
+#
+# Creating and dropping pads go through call(), which the worker runs before
+# the slots and the loop awaits.
+#
+# With output_hz set (OUTPUT_HZ, e.g. 250/500/1000) the worker no longer
+# applies on arrival but on a fixed tick: each tick takes whatever is in the
+# slots, so a pad gets at most one report per tick however the frames came
+# in (Wi-Fi bursts are coalesced, a gap just repeats nothing). The tick
+# sleeps most of the way with time.sleep, then in short sleeps for the last
+# `margin`, which follows how much the coarse sleeps overshoot. No spinning,
+# and with nothing in the slots the worker sleeps until the next put.
+#
+# put() with the phone's send time goes through a JitterBuffer per device
+# (src/core/jitter_buffer.py) instead: the loop appends to the inbox, the
+# worker sorts it into the buffers and moves what is due into the slots, on
+# arrival mode at the buffers' release times, on a tick at every tick.
+
+# Fine sleeps near the deadline, and the range the margin moves in
+FINE_SLEEP = 0.0001
+MIN_MARGIN = 0.0002
+MAX_MARGIN = 0.002
+
+
+class Latency:
+    """count/avg/p50/p99/max in ms, percentiles over the last `window` values."""
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+
+    def summary(self) -> dict:
+        recent = sorted(list(self.recent))
+        if not recent:
+            return {"count": 0, "avg_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3),
+            "p50_ms": round(recent[len(recent) // 2] * 1000, 3),
+            "p99_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.99))] * 1000, 3),
+            "max_ms": round(self.max * 1000, 3)
+        }
+
+
+class LoopLag:
+    """How late the event loop runs a sleep of `interval` seconds."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lag = Latency()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lag.observe(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class PadOutput:
+    def __init__(self, output_hz: int = 0):
+        self.output_hz = output_hz  # 0 = apply on arrival
+        # (core, device_id) -> (decoded state, perf_counter when it was put)
+        self.slots: Dict[Tuple[object, str], tuple] = {}
+        self.commands = deque()
+        # (key, decoded, send time, arrival), for the jitter buffers
+        self.inbox = deque()
+        self.buffers: Dict[Tuple[object, str], JitterBuffer] = {}
+        self.min_delay = 0.0
+        self.max_delay = 0.06
+        self.queued = 0
+        self.coalesced = 0
+        self.applied = 0
+        self.errors = 0
+        self.reports = 0
+        self.reports_per_s = 0.0
+        self.apply_latency = Latency()
+        # Tick mode
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.tick_jitter = Latency()
+        self._margin = MIN_MARGIN
+        self._window_start = time.perf_counter()
+        self._window_reports = 0
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()  # start() only
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="pad-output", daemon=True)
+                self._thread.start()
+
+    def put(self, core, device_id: str, decoded, sent: Optional[float] = None):
+        # sent: the phone's send time in seconds, buffers the state (see above)
+        key = (core, device_id)
+        self.queued += 1
+        if sent is not None:
+            self.inbox.append((key, decoded, sent, time.perf_counter()))
+        else:
+            if key in self.slots:
+                self.coalesced += 1
+            self.slots[key] = (decoded, time.perf_counter())
+        self._wakeup.set()
+
+    def discard(self, core, device_id: str):
+        key = (core, device_id)
+        self.slots.pop(key, None)
+        # The buffers belong to the worker
+        self.commands.append((self.buffers.pop, (key, None), Future()))
+        self._wakeup.set()
+
+    def set_delay(self, min_ms: float, max_ms: float):
+        self.min_delay = min_ms / 1000
+        self.max_delay = max(min_ms, max_ms) / 1000
+        for buffer in list(self.buffers.values()):
+            buffer.min_delay = self.min_delay
+            buffer.max_delay = self.max_delay
+
+    def call(self, function, *args) -> asyncio.Future:
+        # Runs function(*args) on the worker, e.g. vg.VX360Gamepad
+        self.start()
+        future = Future()
+        self.commands.append((function, args, future))
+        self._wakeup.set()
+        return asyncio.wrap_future(future)
+
+    def set_rate(self, output_hz: int):
+        # Takes effect at the next tick (or the next put when idle)
+        if output_hz > 0 and sys.platform == "win32" and sys.version_info < (3, 11):
+            # Older Pythons sleep in 15.6 ms steps on Windows otherwise
+            import ctypes
+            ctypes.windll.winmm.timeBeginPeriod(1)
+        self.output_hz = output_hz
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            if self.output_hz > 0:
+                self._run_ticks()
+                continue
+            due = self._next_due()
+            if due is None:
+                self._wakeup.wait()
+            else:
+                self._wait_until(due)
+            # Cleared before draining: a put that lands meanwhile sets it again
+            self._wakeup.clear()
+            self._run_commands()
+            self._release(time.perf_counter())
+            self._drain()
+
+    def _run_ticks(self):
+        output_hz = self.output_hz
+        period = 1.0 / output_hz
+        clock = time.perf_counter
+        deadline = clock() + period
+        while self.output_hz == output_hz:
+            if not self.slots and not self.inbox and self._next_due() is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                # Back on the tick grid
+                now = clock()
+                if now > deadline:
+                    deadline += ((now - deadline) // period + 1) * period
+            self._run_commands()
+            self._sleep_until(deadline)
+            now = clock()
+            self.tick_jitter.observe(now - deadline)
+            self._release(now)
+            self._drain(once=True)
+            self.ticks += 1
+            deadline += period
+            now = clock()
+            if now > deadline:
+                # Overran, the ticks in between are skipped
+                missed = int((now - deadline) // period) + 1
+                self.missed_ticks += missed
+                deadline += missed * period
+
+    def _sleep_until(self, deadline: float):
+        clock = time.perf_counter
+        coarse = deadline - clock() - self._margin
+        if coarse > 0:
+            started = clock()
+            time.sleep(coarse)
+            overshoot = clock() - started - coarse
+            self._margin = min(MAX_MARGIN, max(MIN_MARGIN, 0.9 * self._margin + 0.2 * overshoot))
+        while True:
+            remaining = deadline - clock()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, FINE_SLEEP))
+
+    def _wait_until(self, deadline: float):
+        # _sleep_until that a put ends early: a state for a pad without a
+        # jitter buffer does not wait for another pad's release
+        coarse = deadline - time.perf_counter() - self._margin
+        if coarse > 0 and self._wakeup.wait(coarse):
+            return
+        self._sleep_until(deadline)
+
+    def _next_due(self) -> Optional[float]:
+        due = None
+        for buffer in self.buffers.values():
+            buffer_due = buffer.due()
+            if buffer_due is not None and (due is None or buffer_due < due):
+                due = buffer_due
+        return due
+
+    def _release(self, now: float):
+        inbox = self.inbox
+        buffers = self.buffers
+        while inbox:
+            key, decoded, sent, arrival = inbox.popleft()
+            buffer = buffers.get(key)
+            if buffer is None:
+                buffer = buffers[key] = JitterBuffer(self.min_delay, self.max_delay)
+            buffer.push(sent, arrival, decoded)
+        for key, buffer in buffers.items():
+            if buffer.frames:
+                released = buffer.pop(now)
+                if released is not None:
+                    self.slots[key] = released
+
+    def _run_commands(self):
+        commands = self.commands
+        while commands:
+            function, args, future = commands.popleft()
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _drain(self, once: bool = False):
+        # once: only the pads that had a state when the drain started, a
+        # state put meanwhile waits for the next tick
+        slots = self.slots
+        clock = time.perf_counter
+        keys = list(slots) if once else None
+        while True:
+            if once:
+                if not keys:
+                    break
+                key = keys.pop()
+                item = slots.pop(key, None)
+                if item is None:
+                    continue
+            else:
+                try:
+                    key, item = slots.popitem()
+                except KeyError:
+                    break
+            core, device_id = key
+            decoded, queued_at = item
+            try:
+                if core.apply_decoded(device_id, decoded) is not None:
+                    self.reports += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Error applying input for {device_id}: {e}")
+            self.applied += 1
+            self.apply_latency.observe(clock() - queued_at)
+        now = clock()
+        if now - self._window_start >= 1.0:
+            self.reports_per_s = (self.reports - self._window_reports) / (now - self._window_start)
+            self._window_start = now
+            self._window_reports = self.reports
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "applied": self.applied,
+            "errors": self.errors,
+            "reports": self.reports,
+            # Last full second with any input, 0 once it went quiet
+            "reports_per_s": round(self.reports_per_s, 1) if time.perf_counter() - self._window_start < 2.0 else 0.0,
+            "apply_latency": self.apply_latency.summary(),
+            "output_hz": self.output_hz,
+            "ticks": self.ticks,
+            "missed_ticks": self.missed_ticks,
+            "tick_jitter": self.tick_jitter.summary(),
+            "jitter_buffers": {
+                device_id: buffer.stats() for (_, device_id), buffer in list(self.buffers.items())
+            }
+        }
+
+
+pad_output = PadOutput()
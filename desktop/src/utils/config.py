@@ -8,5 +8,15 @@ class Settings(BaseSettings):
     PORT: int = 8058
     REMOTE_SERVER: str = "buana-vpad.up.railway.app"
     REMOTE_LOCAL_PORT: int = 8052
+    # Virtual pads get their reports on a fixed tick of this many Hz (250,
+    # 500, 1000), at most one per pad per tick. 0 = as the frames arrive
+    OUTPUT_HZ: int = 0
+    # Jitter buffer on the phone's send times, for the local server and for
+    # the relayed inputs. Its delay follows the measured jitter within
+    # JITTER_MIN_MS..JITTER_MAX_MS
+    JITTER_BUFFER: bool = False
+    REMOTE_JITTER_BUFFER: bool = True
+    JITTER_MIN_MS: float = 0.0
+    JITTER_MAX_MS: float = 60.0
 
 settings = Settings()
@@ -0,0 +1,218 @@
+import struct
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+# Compact binary controller frame, negotiated in the first handshake message
+# ("formats": ["bin1", "json"]). JSON stays the fallback for every endpoint.
+#
+# The same module lives in remote_server/src/core/frames.py and in the mobile
+# ControllerState.toBinary(), keep the three in sync.
+#
+# v1 layout, little-endian, 26 bytes:
+#   version u8 | flags u8 | seq u32 | timestamp_us u64 | buttons u16 |
+#   lx i16 | ly i16 | rx i16 | ry i16 | lt u8 | rt u8
+#
+# Button bits follow the XUSB wButtons layout so they map 1:1 on XInput pads.
+
+FORMAT_BIN1 = "bin1"
+FORMAT_JSON = "json"
+SUPPORTED_FORMATS = (FORMAT_BIN1, FORMAT_JSON)
+
+FRAME_VERSION = 1
+_FRAME = struct.Struct("<BBIQHhhhhBB")
+FRAME_SIZE = _FRAME.size
+
+DPAD_UP = 0x0001
+DPAD_DOWN = 0x0002
+DPAD_LEFT = 0x0004
+DPAD_RIGHT = 0x0008
+
+BUTTON_BITS = {
+    'A': 0x1000,
+    'B': 0x2000,
+    'X': 0x4000,
+    'Y': 0x8000,
+    'LB': 0x0100,
+    'RB': 0x0200,
+    'Start': 0x0010,
+    'Select': 0x0020,
+    'LS': 0x0040,
+    'RS': 0x0080,
+}
+
+DPAD_BITS = {
+    'upPressed': DPAD_UP,
+    'downPressed': DPAD_DOWN,
+    'leftPressed': DPAD_LEFT,
+    'rightPressed': DPAD_RIGHT,
+}
+
+AXIS_MAX = 32767
+TRIGGER_MAX = 255
+
+
+def negotiate(offered) -> str:
+    # Picks the first format offered by the client that we understand
+    for name in offered or ():
+        if name in SUPPORTED_FORMATS:
+            return name
+    return FORMAT_JSON
+
+
+def _axis(value) -> int:
+    value = float(value or 0.0)
+    if value > 1.0:
+        value = 1.0
+    elif value < -1.0:
+        value = -1.0
+    return int(round(value * AXIS_MAX))
+
+
+def _trigger(value) -> int:
+    value = float(value or 0.0)
+    if value > 1.0:
+        value = 1.0
+    elif value < 0.0:
+        value = 0.0
+    return int(round(value * TRIGGER_MAX))
+
+
+class ControllerFrame:
+    __slots__ = ("seq", "timestamp_us", "buttons", "lx", "ly", "rx", "ry", "lt", "rt")
+
+    def __init__(self, seq: int = 0, timestamp_us: int = 0, buttons: int = 0,
+                 lx: int = 0, ly: int = 0, rx: int = 0, ry: int = 0, lt: int = 0, rt: int = 0):
+        self.seq = seq
+        self.timestamp_us = timestamp_us
+        self.buttons = buttons
+        self.lx = lx
+        self.ly = ly
+        self.rx = rx
+        self.ry = ry
+        self.lt = lt
+        self.rt = rt
+
+    def encode(self) -> bytes:
+        return _FRAME.pack(
+            FRAME_VERSION, 0, self.seq & 0xFFFFFFFF, self.timestamp_us, self.buttons,
+            self.lx, self.ly, self.rx, self.ry, self.lt, self.rt
+        )
+
+    @classmethod
+    def from_state(cls, data: dict, seq: int = 0) -> "ControllerFrame":
+        # Builds a frame from the JSON ControllerState layout sent by the phone
+        buttons = 0
+        lt = rt = 0
+        for button_id, state in (data.get("buttonStates") or {}).items():
+            button_id = button_id.split('_')[-1]
+            if button_id == 'LT':
+                lt = _trigger(state.get("value"))
+            elif button_id == 'RT':
+                rt = _trigger(state.get("value"))
+            elif state.get("isPressed") and button_id in BUTTON_BITS:
+                buttons |= BUTTON_BITS[button_id]
+
+        dpad = data.get("dpadState") or {}
+        for key, bit in DPAD_BITS.items():
+            if dpad.get(key):
+                buttons |= bit
+
+        left = data.get("leftJoystickState") or {}
+        right = data.get("rightJoystickState") or {}
+
+        timestamp_us = 0
+        timestamp = data.get("timestamp")
+        if timestamp:
+            try:
+                timestamp_us = int(datetime.fromisoformat(timestamp).timestamp() * 1_000_000)
+            except ValueError:
+                pass
+
+        return cls(
+            seq, timestamp_us, buttons,
+            _axis(left.get("dx")), _axis(left.get("dy")),
+            _axis(right.get("dx")), _axis(right.get("dy")),
+            lt, rt
+        )
+
+    def to_state(self) -> dict:
+        # Expands the frame into the JSON ControllerState layout
+        buttons = self.buttons
+        button_states = {
+            button_id: {"isPressed": bool(buttons & bit), "value": 1.0 if buttons & bit else 0.0}
+            for button_id, bit in BUTTON_BITS.items()
+        }
+        button_states['LT'] = {"isPressed": self.lt > 0, "value": self.lt / TRIGGER_MAX}
+        button_states['RT'] = {"isPressed": self.rt > 0, "value": self.rt / TRIGGER_MAX}
+
+        state = {
+            "buttonStates": button_states,
+            "leftJoystickState": {"dx": self.lx / AXIS_MAX, "dy": self.ly / AXIS_MAX},
+            "rightJoystickState": {"dx": self.rx / AXIS_MAX, "dy": self.ry / AXIS_MAX},
+            "dpadState": {key: bool(buttons & bit) for key, bit in DPAD_BITS.items()},
+        }
+        if self.timestamp_us:
+            state["timestamp"] = datetime.fromtimestamp(self.timestamp_us / 1_000_000).isoformat()
+        return state
+
+
+def decode_frame(data: bytes) -> Optional[ControllerFrame]:
+    # Returns None for frames of another size or version
+    if len(data) != FRAME_SIZE or data[0] != FRAME_VERSION:
+        return None
+    _, _, seq, timestamp_us, buttons, lx, ly, rx, ry, lt, rt = _FRAME.unpack(data)
+    return ControllerFrame(seq, timestamp_us, buttons, lx, ly, rx, ry, lt, rt)
+
+
+# Binary frames forwarded by the relay to the PC carry the sender's device_id
+# as a prefix: length u8 | device_id utf-8 | frame
+
+MAX_DEVICE_ID = 255  # bytes of UTF-8, the tag length is one byte
+
+
+def device_tag(device_id: str) -> bytes:
+    # Cut on a character boundary, never through one
+    encoded = (device_id or "").encode()[:MAX_DEVICE_ID].decode(errors="ignore").encode()
+    return bytes((len(encoded),)) + encoded
+
+
+def split_device_tag(data: bytes) -> Tuple[str, bytes]:
+    # A tag that does not decode still splits, the frame behind it is kept
+    length = data[0]
+    return data[1:1 + length].decode(errors="replace"), data[1 + length:]
+
+
+def split_tagged_frames(data: bytes) -> List[Tuple[str, bytes]]:
+    # A batched binary message is several tagged v1 frames back to back
+    records = []
+    offset = 0
+    while offset < len(data):
+        length = data[offset]
+        start = offset + 1 + length
+        records.append((data[offset + 1:start].decode(errors="replace"), data[start:start + FRAME_SIZE]))
+        offset = start + FRAME_SIZE
+    return records
+
+
+# A multiplexed PC uplink (/mux) carries several rooms. Binary frames on it
+# start with the room index the relay assigned when the room was joined:
+# index u8 | length u8 | device_id utf-8 | frame
+
+MAX_MUX_ROOMS = 256
+
+
+def room_tag(index: int) -> bytes:
+    return bytes((index,))
+
+
+def split_room_frames(data: bytes) -> List[Tuple[int, str, bytes]]:
+    # Like split_tagged_frames, with the room index in front of every frame
+    records = []
+    offset = 0
+    while offset < len(data):
+        index = data[offset]
+        length = data[offset + 1]
+        start = offset + 2 + length
+        records.append((index, data[offset + 2:start].decode(errors="replace"), data[start:start + FRAME_SIZE]))
+        offset = start + FRAME_SIZE
+    return records
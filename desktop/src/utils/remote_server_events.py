@@ -1,6 +1,8 @@
 from PyQt6.QtCore import QObject, pyqtSignal
 import queue
 
+from src.core.input_core import PadState, display_state
+
 class RemoteServerEvents(QObject):
     # Signals
     remote_server_started = pyqtSignal(str)
@@ -50,33 +52,8 @@ class RemoteServerEvents(QObject):
     def emit_remote_controller_update(self, controller_info: dict):
         self.remote_update_controller_card.emit(controller_info)
 
-    def emit_remote_controller_input(self, device_id: str, input_data: dict):
-        formatted_data = {}
-        
-        # Handle button states
-        button_states = input_data.get("buttonStates", {})
-        formatted_buttons = {}
-        for button_id, state in button_states.items():
-            formatted_buttons[f"_{button_id.upper()}"] = {
-                "isPressed": state.get("isPressed", False),
-                "value": state.get("value", 0)
-            }
-        formatted_data["buttonStates"] = formatted_buttons
-        
-        # Handle dpad
-        dpad = input_data.get("dpadState", {})
-        formatted_data["dpadState"] = {
-            "upPressed": dpad.get("upPressed", False),
-            "rightPressed": dpad.get("rightPressed", False),
-            "downPressed": dpad.get("downPressed", False),
-            "leftPressed": dpad.get("leftPressed", False)
-        }
-        
-        # Handle joysticks
-        formatted_data["leftJoystickState"] = input_data.get("leftJoystickState", {})
-        formatted_data["rightJoystickState"] = input_data.get("rightJoystickState", {})
-        
-        self.remote_controller_input.emit(device_id, formatted_data)
+    def emit_remote_controller_input(self, device_id: str, state: PadState):
+        self.remote_controller_input.emit(device_id, display_state(state))
 
     def emit_remote_connection_established(self, unique_id: str):
         self.is_connected_to_remote = True
@@ -1,3 +1,5 @@
+import 'dart:typed_data';
+
 import 'package:buana_vpad/models/button_state.dart';
 import 'package:buana_vpad/models/joystick_state.dart';
 import 'package:buana_vpad/models/dpad_state.dart';
@@ -9,6 +11,26 @@ class ControllerState {
   final DPadState? dpadState;
   final DateTime timestamp;
 
+  // Compact binary frame "bin1", sama dengan src/utils/frames.py di desktop.
+  // Little-endian, 26 byte: version u8 | flags u8 | seq u32 | timestamp_us u64 |
+  // buttons u16 | lx i16 | ly i16 | rx i16 | ry i16 | lt u8 | rt u8
+  static const int binaryFrameVersion = 1;
+  static const int binaryFrameSize = 26;
+
+  // Bit tombol mengikuti layout XUSB wButtons
+  static const Map<String, int> _buttonBits = {
+    'A': 0x1000,
+    'B': 0x2000,
+    'X': 0x4000,
+    'Y': 0x8000,
+    'LB': 0x0100,
+    'RB': 0x0200,
+    'Start': 0x0010,
+    'Select': 0x0020,
+    'LS': 0x0040,
+    'RS': 0x0080,
+  };
+
   ControllerState({
     required this.buttonStates,
     this.leftJoystickState,
@@ -50,4 +72,51 @@ class ControllerState {
       'timestamp': timestamp.toIso8601String(),
     };
   }
+
+  Uint8List toBinary(int sequence) {
+    int buttons = 0;
+    int leftTrigger = 0;
+    int rightTrigger = 0;
+
+    buttonStates.forEach((key, state) {
+      final id = key.split('_').last;
+      if (id == 'LT') {
+        leftTrigger = _toTrigger(state.value);
+      } else if (id == 'RT') {
+        rightTrigger = _toTrigger(state.value);
+      } else if (state.isPressed) {
+        buttons |= _buttonBits[id] ?? 0;
+      }
+    });
+
+    final dpad = dpadState;
+    if (dpad != null) {
+      if (dpad.upPressed) buttons |= 0x0001;
+      if (dpad.downPressed) buttons |= 0x0002;
+      if (dpad.leftPressed) buttons |= 0x0004;
+      if (dpad.rightPressed) buttons |= 0x0008;
+    }
+
+    final micros = timestamp.microsecondsSinceEpoch;
+    final data = ByteData(binaryFrameSize);
+    data.setUint8(0, binaryFrameVersion);
+    data.setUint8(1, 0);
+    data.setUint32(2, sequence & 0xFFFFFFFF, Endian.little);
+    // Ditulis sebagai dua u32 supaya tetap jalan di web
+    data.setUint32(6, micros % 0x100000000, Endian.little);
+    data.setUint32(10, micros ~/ 0x100000000, Endian.little);
+    data.setUint16(14, buttons, Endian.little);
+    data.setInt16(16, _toAxis(leftJoystickState?.dx), Endian.little);
+    data.setInt16(18, _toAxis(leftJoystickState?.dy), Endian.little);
+    data.setInt16(20, _toAxis(rightJoystickState?.dx), Endian.little);
+    data.setInt16(22, _toAxis(rightJoystickState?.dy), Endian.little);
+    data.setUint8(24, leftTrigger);
+    data.setUint8(25, rightTrigger);
+    return data.buffer.asUint8List();
+  }
+
+  static int _toAxis(double? value) =>
+      ((value ?? 0.0).clamp(-1.0, 1.0) * 32767).round();
+
+  static int _toTrigger(double value) => (value.clamp(0.0, 1.0) * 255).round();
 }
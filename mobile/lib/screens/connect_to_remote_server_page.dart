@@ -206,7 +206,8 @@ class _RemoteServerPageState extends State<RemoteServerPage> {
       setState(() => _isConnecting = true);
 
       try {
-        final wsUrl = '$_remoteServerUrl/ws/${_codeController.text}';
+        // Relay cluster: owner node dikirim sebagai pesan "redirect", bukan 307
+        final wsUrl = '$_remoteServerUrl/ws/${_codeController.text}?redirect=message';
         print(wsUrl);
         _socket = await WebSocket.connect(wsUrl)
             .timeout(const Duration(seconds: 5), onTimeout: () {
@@ -225,6 +226,7 @@ class _RemoteServerPageState extends State<RemoteServerPage> {
                 socket: _socket!,
                 deviceId: _deviceId!,
                 deviceName: _deviceName ?? 'Unknown Device',
+                resumeUrl: wsUrl,
                 onConnect: () {
                   setState(() {
                     _isConnecting = false;
@@ -18,6 +18,8 @@ class ControllerModePage extends StatefulWidget {
   final VoidCallback onConnect;
   final VoidCallback onDisconnect;
   final Stream<dynamic> broadcastStream; 
+  // Relay URL to resume the session on when the connection drops (remote mode)
+  final String? resumeUrl;
 
   const ControllerModePage({
     super.key,
@@ -27,7 +29,8 @@ class ControllerModePage extends StatefulWidget {
     required this.deviceName,
     required this.onConnect,
     required this.onDisconnect,
-    required this.broadcastStream
+    required this.broadcastStream,
+    this.resumeUrl,
   });
 
   @override
@@ -44,6 +47,24 @@ class _ControllerModePageState extends State<ControllerModePage> {
   StreamSubscription? _socketSubscription;
   Timer? _pingTimer;
   Timer? _sendDebouncer;
+  bool _useBinaryFrames = false;
+  int _frameSequence = 0;
+
+  // Resume token dari relay: koneksi yang putus disambung lagi ke slot yang
+  // sama, PC tidak melihat controller dicabut
+  late WebSocket _socket;
+  String? _resumeToken;
+  bool _leaving = false;
+  bool _resuming = false;
+  static const List<int> _resumeBackoffMs = [0, 300, 1000, 2500];
+  // Relay restart: "reconnect" membawa delay_ms acak supaya semua phone tidak
+  // menyambung di milidetik yang sama, dipakai sekali untuk percobaan pertama
+  int? _reconnectDelayMs;
+  // Relay cluster: phone tidak bisa mengikuti 307 pada upgrade websocket,
+  // relay mengirim "redirect" ke node pemilik room dan kita pindah ke sana
+  String? _relayUrl;
+  int _redirects = 0;
+  static const int _maxRedirects = 5;
 
   @override
   void initState() {
@@ -76,7 +97,9 @@ class _ControllerModePageState extends State<ControllerModePage> {
 
     dpadNotifier = ValueNotifier(DPadState());
 
-    _setupSocketListener();
+    _socket = widget.socket;
+    _relayUrl = widget.resumeUrl;
+    _setupSocketListener(widget.broadcastStream);
     _setupPingPong();
     _sendInitialConnect();
   }
@@ -86,6 +109,10 @@ class _ControllerModePageState extends State<ControllerModePage> {
     _socketSubscription?.cancel();
     _pingTimer?.cancel();
     _sendDebouncer?.cancel();
+    _leaving = true;
+    if (!identical(_socket, widget.socket)) {
+      _socket.close();
+    }
     leftJoystickNotifier.dispose();
     rightJoystickNotifier.dispose();
     buttonStatesNotifier.dispose();
@@ -102,28 +129,35 @@ class _ControllerModePageState extends State<ControllerModePage> {
 
   Future<void> _sendInitialConnect() async {
     try {
-      widget.socket.add(jsonEncode({
-        "type": "connect",
-        "device_id": widget.deviceId,
-        "device_name": widget.deviceName,
-        "device_type": "mobile"
-      }));
+      _socket.add(jsonEncode(_connectMessage()));
     } catch (e) {
       print('Failed to send initial connect: $e');
       _handleDisconnect();
     }
   }
 
+  Map<String, dynamic> _connectMessage() {
+    return {
+      "type": "connect",
+      "device_id": widget.deviceId,
+      "device_name": widget.deviceName,
+      "device_type": "mobile",
+      "formats": ["bin1", "json"],
+      if (_resumeToken != null) "resume": _resumeToken,
+    };
+  }
+
   void _setupPingPong() {
+    _pingTimer?.cancel();
     _pingTimer = Timer.periodic(const Duration(seconds: 5), (timer) {
       if (mounted && isConnectedNotifier.value) {
         try {
-          widget.socket
+          _socket
               .add(jsonEncode({"type": "ping", "device_id": widget.deviceId, "device_type": "mobile"}));
         } catch (e) {
           print('Ping error: $e');
           timer.cancel();
-          _handleDisconnect();
+          _handleConnectionLost();
         }
       } else {
         timer.cancel();
@@ -131,15 +165,32 @@ class _ControllerModePageState extends State<ControllerModePage> {
     });
   }
 
-  void _setupSocketListener() {
-    _socketSubscription = widget.broadcastStream.listen(
+  void _setupSocketListener(Stream<dynamic> stream) {
+    _socketSubscription?.cancel();
+    _socketSubscription = stream.listen(
       (message) {
         final data = jsonDecode(message);
-        if (data["type"] == "connect_success") {
+        // Format frame hasil negosiasi (relay: "hello", PC: "connect_success")
+        if (data["format"] != null) {
+          _useBinaryFrames = data["format"] == "bin1";
+        }
+        if (data["type"] == "hello") {
+          _resumeToken = data["resume"] ?? _resumeToken;
+          // Slot lama diambil alih, PC tidak akan kirim connect_success lagi
+          if (data["resumed"] == true) {
+            widget.onConnect();
+          }
+        } else if (data["type"] == "connect_success") {
           widget.onConnect();
+        } else if (data["type"] == "redirect") {
+          _followRedirect(data["url"]);
+        } else if (data["type"] == "reconnect") {
+          final delayMs = data["delay_ms"];
+          _reconnectDelayMs = delayMs is int && delayMs > 0 ? delayMs : 0;
         } else if (data["type"] == "pong") {
           isConnectedNotifier.value = true;
         } else if(data["type"] == "pc_disconnected"){
+          _leaving = true;
           widget.onDisconnect();
         } else if(data["type"] == "error") {
           // Show error message first
@@ -150,19 +201,85 @@ class _ControllerModePageState extends State<ControllerModePage> {
             ),
           );
           // Then trigger disconnect
+          _leaving = true;
           widget.onDisconnect();
       }
     },
-    onDone: _handleDisconnect,
+    onDone: _handleConnectionLost,
     onError: (error) {
       print('Socket error: $error');
-      _handleDisconnect();
+      _handleConnectionLost();
     },
     );
 
   }
 
+  Future<void> _handleConnectionLost() async {
+    if (_leaving || _resuming || !mounted) return;
+    if (_resumeToken == null || _relayUrl == null) {
+      _handleDisconnect();
+      return;
+    }
+
+    _resuming = true;
+    isConnectedNotifier.value = false;
+    _pingTimer?.cancel();
+    final backoffMs = List<int>.of(_resumeBackoffMs);
+    if (_reconnectDelayMs != null) {
+      backoffMs[0] = _reconnectDelayMs!;
+      _reconnectDelayMs = null;
+    }
+    for (final delay in backoffMs) {
+      await Future.delayed(Duration(milliseconds: delay));
+      if (_leaving || !mounted) return;
+      try {
+        final socket = await WebSocket.connect(_relayUrl!)
+            .timeout(const Duration(seconds: 3));
+        _socket = socket;
+        _setupSocketListener(socket.asBroadcastStream());
+        socket.add(jsonEncode(_connectMessage()));
+        _resuming = false;
+        isConnectedNotifier.value = true;
+        _setupPingPong();
+        // State terakhir langsung dikirim, bukan menunggu input berikutnya
+        _sendControllerState();
+        return;
+      } catch (e) {
+        print('Resume failed: $e');
+      }
+    }
+    _resuming = false;
+    _handleDisconnect();
+  }
+
+  Future<void> _followRedirect(dynamic url) async {
+    if (_leaving || !mounted) return;
+    if (url is! String || _redirects >= _maxRedirects) {
+      _handleDisconnect();
+      return;
+    }
+    _redirects++;
+    final uri = Uri.parse(url);
+    _relayUrl = uri.replace(queryParameters: {...uri.queryParameters, 'redirect': 'message'}).toString();
+    // Socket lama ditutup relay (4307), itu bukan koneksi putus
+    _resuming = true;
+    await _socketSubscription?.cancel();
+    try {
+      final socket = await WebSocket.connect(_relayUrl!)
+          .timeout(const Duration(seconds: 3));
+      _socket = socket;
+      _setupSocketListener(socket.asBroadcastStream());
+      socket.add(jsonEncode(_connectMessage()));
+      _resuming = false;
+    } catch (e) {
+      print('Redirect failed: $e');
+      _resuming = false;
+      _handleDisconnect();
+    }
+  }
+
   void _handleDisconnect() {
+    _leaving = true;
     isConnectedNotifier.value = false;
     _pingTimer?.cancel();
     widget.onDisconnect();
@@ -248,7 +365,12 @@ class _ControllerModePageState extends State<ControllerModePage> {
       dpadState: dpadNotifier.value,
     );
 
-    widget.socket.add(jsonEncode({
+    if (_useBinaryFrames) {
+      _socket.add(state.toBinary(_frameSequence++));
+      return;
+    }
+
+    _socket.add(jsonEncode({
       "type": "controller_input",
       "device_id": widget.deviceId,
       "device_name": widget.deviceName,
@@ -256,7 +378,7 @@ class _ControllerModePageState extends State<ControllerModePage> {
     }));
   } catch (e) {
     print('Failed to send input: $e');
-    _handleDisconnect();
+    _handleConnectionLost();
   }
 }
 
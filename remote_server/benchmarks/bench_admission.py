@@ -0,0 +1,122 @@
+"""Forward latency of the rooms already open while more keep arriving.
+
+A relay is started with and without load shedding (LAG_LIMIT_MS). A new
+room (a PC and a phone streaming timestamped controller_input at --rate Hz)
+tries to open every --arrival seconds until --rooms rooms have tried, and
+every room streams until the end of the run. Without admission control each
+room adds load until the event loop falls behind for everyone; with it the
+relay refuses upgrades (503 + Retry-After) once the loop lags, and the rooms
+it took keep their latency.
+
+The load generator shares the machine with the relay, so the relay runs
+at a lower priority (--nice) to make it the side that falls behind first,
+as it would on a box of its own. Reported: rooms admitted and refused, and
+the forward latency to the PC over the last --tail seconds, when all the
+admitted rooms are streaming.
+
+    python -m benchmarks.bench_admission --rooms 80 --rate 250 --lag-ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+
+import websockets
+
+from benchmarks.bench_workers import free_port, start_relay
+from benchmarks.loadtest import json_bodies, now_us, percentile, sent_at
+
+
+async def room(url: str, args, end: float, latencies: list, counts: dict):
+    unique_id = str(uuid.uuid4())
+    try:
+        pc = await websockets.connect(f"{url}/ws/{unique_id}")
+    except websockets.InvalidStatusCode as e:
+        counts["refused" if e.status_code == 503 else "failed"] += 1
+        return
+    await pc.send(json.dumps({"device_type": "pc", "device_id": "pc", "formats": ["json"]}))
+    await pc.recv()  # hello
+    try:
+        mobile = await websockets.connect(f"{url}/ws/{unique_id}")
+    except websockets.InvalidStatusCode:
+        # The PC got in, its phone no longer did
+        counts["refused"] += 1
+        await pc.close()
+        return
+    counts["admitted"] += 1
+    await mobile.send(json.dumps({
+        "type": "connect", "device_id": "m", "device_name": "bench", "device_type": "mobile"
+    }))
+    tail = end - args.tail
+
+    async def consume():
+        try:
+            async for message in pc:
+                received = now_us()
+                sent = sent_at(message)
+                if sent and time.monotonic() >= tail:
+                    latencies.append(received - sent)
+        except websockets.ConnectionClosed:
+            pass
+
+    reader = asyncio.create_task(consume())
+    bodies = json_bodies()
+    period = 1.0 / args.rate
+    next_send = time.monotonic()
+    seq = 0
+    while next_send < end:
+        delay = next_send - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_send += period
+        await mobile.send('{"type":"controller_input","sent_us":%d' % now_us() + bodies[seq % len(bodies)])
+        seq += 1
+    await mobile.close()
+    await asyncio.sleep(0.2)
+    await pc.close()
+    await reader
+
+
+def measure(lag_ms: float, args):
+    port = free_port()
+    relay = start_relay(1, port, LAG_LIMIT_MS=str(lag_ms), DEVICE_RATE="0", ROOM_RATE="0", BATCH_INPUTS="0")
+    if args.nice:
+        os.setpriority(os.PRIO_PROCESS, relay.pid, args.nice)
+    latencies, counts = [], {"admitted": 0, "refused": 0, "failed": 0}
+    try:
+        async def main():
+            end = time.monotonic() + args.rooms * args.arrival + args.tail
+            tasks = []
+            for _ in range(args.rooms):
+                tasks.append(asyncio.create_task(room(f"ws://127.0.0.1:{port}", args, end, latencies, counts)))
+                await asyncio.sleep(args.arrival)
+            await asyncio.gather(*tasks)
+
+        asyncio.run(main())
+    finally:
+        relay.terminate()
+        relay.wait(15)
+    return counts, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=80)
+    parser.add_argument("--rate", type=float, default=250.0)
+    parser.add_argument("--arrival", type=float, default=0.1, help="seconds between new rooms")
+    parser.add_argument("--tail", type=float, default=3.0, help="seconds measured with every room open")
+    parser.add_argument("--lag-ms", type=float, default=20.0, help="LAG_LIMIT_MS with shedding on")
+    parser.add_argument("--nice", type=int, default=10, help="priority of the relay process (0 keeps it)")
+    args = parser.parse_args()
+
+    print(f"{'shedding':>9} {'admitted':>9} {'refused':>8} {'inputs':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for label, lag_ms in (("off", 0), ("on", args.lag_ms)):
+        counts, latencies = measure(lag_ms, args)
+        print(f"{label:>9} {counts['admitted']:>9} {counts['refused']:>8} {len(latencies):>7} "
+              f"{percentile(latencies, 0.5):>7.2f} {percentile(latencies, 0.99):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
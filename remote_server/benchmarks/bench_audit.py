@@ -0,0 +1,55 @@
+"""Cost of AuditLog.record() on the event loop and throughput of its writer.
+
+Records events at --rate per second for --duration seconds (bursts every
+millisecond) into an AuditLog writing to a temporary directory, then reports
+the time per record() call, what the writer got through and what was
+dropped on a full queue. Raise --rate until drops show up to find the limit
+for a given --queue and --flush-ms.
+
+    python -m benchmarks.bench_audit --rate 100000 --queue 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from src.core.audit import AuditLog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=int, default=100000)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--queue", type=int, default=10000)
+    parser.add_argument("--flush-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    log = AuditLog(os.path.join(directory, "audit.log"), maxsize=args.queue,
+                   flush_interval=args.flush_ms / 1000, max_bytes=4 * 1024 * 1024, backups=3)
+    log.start()
+    record = log.record
+    recording = 0.0
+    started = time.perf_counter()
+    sent = 0
+    burst = max(1, args.rate // 1000)
+    while time.perf_counter() - started < args.duration:
+        begin = time.perf_counter()
+        for _ in range(burst):
+            record("limit_hold", "3f1c2a9e-room", "phone-1", "device")
+        recording += time.perf_counter() - begin
+        sent += burst
+        time.sleep(max(0.0, started + sent / args.rate - time.perf_counter()))
+    log.stop()
+    elapsed = time.perf_counter() - started
+
+    files = sorted(os.listdir(directory))
+    print(f"record()        {recording / sent * 1e9:8.0f} ns per call")
+    print(f"written         {log.written:8d} events in {log.batches} batches, "
+          f"{log.written / elapsed:,.0f} events/s, {log.bytes_written / elapsed / 1e6:.1f} MB/s")
+    print(f"dropped         {log.dropped:8d} ({log.dropped / sent:.1%})")
+    print(f"files           {', '.join(files)}")
+
+
+if __name__ == "__main__":
+    main()
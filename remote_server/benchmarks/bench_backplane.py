@@ -0,0 +1,107 @@
+"""Latency added by routing through the backplane broker.
+
+Starts a standalone broker (broker.py) and two single-worker relay nodes
+joined to it, then streams timestamped controller_input from a mobile to a
+PC in the same room: both on node A (zero hop, the backplane is not touched)
+and PC on node A with the mobile on node B (one hop through the broker).
+
+    python -m benchmarks.bench_backplane --frames 2000 --rate 250
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import websockets
+
+from benchmarks.bench_workers import ROOT, free_port, start_relay
+from benchmarks.loadtest import json_bodies, now_us, sent_at
+
+
+def start_broker(port: int) -> subprocess.Popen:
+    env = dict(os.environ, BROKER_ADDRESS=f"127.0.0.1:{port}")
+    process = subprocess.Popen(
+        [sys.executable, "broker.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    time.sleep(1.0)
+    return process
+
+
+async def measure(pc_url: str, mobile_url: str, frames: int, rate: float):
+    unique_id = str(uuid.uuid4())
+    pc = await websockets.connect(f"{pc_url}/ws/{unique_id}")
+    await pc.send(json.dumps({"device_type": "pc", "device_id": "pc"}))
+    await asyncio.sleep(0.2)
+    mobile = await websockets.connect(f"{mobile_url}/ws/{unique_id}")
+    await mobile.send(json.dumps({
+        "type": "connect", "device_id": "m", "device_name": "bench", "device_type": "mobile"
+    }))
+    await asyncio.wait_for(pc.recv(), 5)  # connect
+
+    latencies = []
+
+    async def consume():
+        try:
+            async for message in pc:
+                sent = sent_at(message)
+                if sent:
+                    latencies.append(now_us() - sent)
+        except websockets.ConnectionClosed:
+            pass
+
+    consumer = asyncio.create_task(consume())
+    bodies = json_bodies()
+    period = 1.0 / rate
+    next_send = time.monotonic()
+    for seq in range(frames):
+        delay = next_send - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_send += period
+        await mobile.send('{"type":"controller_input","sent_us":%d' % now_us() + bodies[seq % len(bodies)])
+    await asyncio.sleep(0.5)
+    await mobile.close()
+    await pc.close()
+    await consumer
+    return sorted(latencies)
+
+
+def percentile(values, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] / 1000.0 if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=250.0)
+    args = parser.parse_args()
+
+    broker_port, port_a, port_b = free_port(), free_port(), free_port()
+    broker = start_broker(broker_port)
+    address = f"127.0.0.1:{broker_port}"
+    nodes = [start_relay(1, port, BUS_ADDRESS=address) for port in (port_a, port_b)]
+    try:
+        url_a, url_b = f"ws://127.0.0.1:{port_a}", f"ws://127.0.0.1:{port_b}"
+        print(f"{'route':>12} {'frames':>7} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8}")
+        results = {}
+        for name, mobile_url in (("same node", url_a), ("cross node", url_b)):
+            latencies = asyncio.run(measure(url_a, mobile_url, args.frames, args.rate))
+            results[name] = percentile(latencies, 0.5)
+            print(f"{name:>12} {len(latencies):>7} {percentile(latencies, 0.5):>8.3f} "
+                  f"{percentile(latencies, 0.99):>8.3f} {percentile(latencies, 0.999):>8.3f}")
+        print(f"added by the broker hop (p50): {results['cross node'] - results['same node']:.3f} ms")
+    finally:
+        for node in nodes:
+            node.terminate()
+            node.wait(15)
+        broker.terminate()
+        broker.wait(5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""PC sends per second against added latency for input batching windows.
+
+For every setting a relay is started on a free port, --rooms rooms get a PC
+(asking for batching) and --phones phones streaming timestamped
+controller_input at --rate Hz. The relay's /metrics gives the frames written
+to PC sockets (one send syscall each), the PCs measure the forward latency
+of every input they unpack.
+
+    python -m benchmarks.bench_batching --rooms 10 --phones 4 --rate 120 --windows off 0 0.5 1 2
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+import urllib.request
+import uuid
+
+import websockets
+
+from benchmarks.bench_workers import free_port, start_relay
+from benchmarks.loadtest import json_bodies, now_us, percentile
+
+PC_SENDS = re.compile(r'^vpad_relay_messages_out_total\{target="pc"\} (\d+)', re.M)
+
+
+def pc_sends(port: int) -> int:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        return int(PC_SENDS.search(response.read().decode()).group(1))
+
+
+async def room(url: str, phones: int, rate: float, duration: float, latencies: list, inputs: list):
+    unique_id = str(uuid.uuid4())
+    pc = await websockets.connect(f"{url}/ws/{unique_id}")
+    await pc.send(json.dumps({"device_type": "pc", "device_id": "pc", "formats": ["json"], "batch": True}))
+    await asyncio.wait_for(pc.recv(), 5)  # hello
+    mobiles = []
+    for index in range(phones):
+        mobile = await websockets.connect(f"{url}/ws/{unique_id}")
+        await mobile.send(json.dumps({
+            "type": "connect", "device_id": f"m{index}", "device_name": "bench", "device_type": "mobile"
+        }))
+        await asyncio.wait_for(pc.recv(), 5)  # connect
+        mobiles.append(mobile)
+
+    async def consume():
+        try:
+            async for message in pc:
+                received = now_us()
+                data = json.loads(message)
+                for item in data if isinstance(data, list) else [data]:
+                    sent = item.get("frame", {}).get("sent_us")
+                    if sent:
+                        inputs[0] += 1
+                        latencies.append(received - sent)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def produce(mobile, device_id: str):
+        bodies = json_bodies()
+        period = 1.0 / rate
+        end = time.monotonic() + duration
+        next_send = time.monotonic()
+        seq = 0
+        while next_send < end:
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_send += period
+            body = bodies[seq % len(bodies)].replace('"device_id":"m"', f'"device_id":"{device_id}"')
+            await mobile.send('{"type":"controller_input","sent_us":%d' % now_us() + body)
+            seq += 1
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.gather(*(produce(mobile, f"m{index}") for index, mobile in enumerate(mobiles)))
+    await asyncio.sleep(0.3)
+    for mobile in mobiles:
+        await mobile.close()
+    await pc.close()
+    await consumer
+
+
+def measure(window: str, rooms: int, phones: int, rate: float, duration: float):
+    port = free_port()
+    env = {"BATCH_INPUTS": "0"} if window == "off" else {"BATCH_INPUTS": "1", "BATCH_WINDOW_MS": window}
+    relay = start_relay(1, port, **env)
+    try:
+        latencies, inputs = [], [0]
+
+        async def main():
+            await asyncio.gather(*(
+                room(f"ws://127.0.0.1:{port}", phones, rate, duration, latencies, inputs)
+                for _ in range(rooms)
+            ))
+
+        sends_before = pc_sends(port)
+        asyncio.run(main())
+        sends = pc_sends(port) - sends_before
+    finally:
+        relay.terminate()
+        relay.wait(15)
+    return sends / duration, inputs[0] / duration, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--phones", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=120.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--windows", nargs="+", default=["off", "0", "0.5", "1", "2"],
+                        help="batch window in ms, 'off' disables batching")
+    args = parser.parse_args()
+
+    print(f"{'window':>7} {'pc sends/s':>11} {'inputs/s':>9} {'inputs/send':>12} {'p50 ms':>7} {'p99 ms':>7}")
+    for window in args.windows:
+        sends, inputs, latencies = measure(window, args.rooms, args.phones, args.rate, args.duration)
+        print(f"{window:>7} {sends:>11.0f} {inputs:>9.0f} {inputs / sends if sends else 0:>12.2f} "
+              f"{percentile(latencies, 0.5):>7.2f} {percentile(latencies, 0.99):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""PC -> mobiles fan-out latency: sequential awaits vs per-subscriber outboxes.
+
+Uses in-process fake sockets, one of which is slow, and reports how long the
+sender is blocked per broadcast and how long the fast subscribers wait for it.
+
+    python -m benchmarks.bench_fanout --subscribers 8 --slow-ms 20 --messages 200
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from src.core.outbox import Outbox, fanout, fanout_stats
+
+
+class FakeSocket:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.received = []
+
+    async def send_text(self, data: str):
+        await asyncio.sleep(self.delay)
+        self.received.append(time.perf_counter())
+
+    async def send_bytes(self, data: bytes):
+        await self.send_text("")
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(mode: str, subscribers: int, slow_delay: float, messages: int, interval: float):
+    # The slow phone comes first, so sequential sends block everyone behind it
+    sockets = [FakeSocket(slow_delay)] + [FakeSocket(0) for _ in range(subscribers - 1)]
+    outboxes = [Outbox(ws) for ws in sockets] if mode == "outbox" else None
+    blocked = []
+    sent_at = []
+
+    for index in range(messages):
+        payload = json.dumps({"type": "vibrate", "seq": index})
+        start = time.perf_counter()
+        sent_at.append(start)
+        if mode == "outbox":
+            fanout(outboxes, payload)
+        else:
+            for ws in sockets:
+                await ws.send_text(payload)
+        blocked.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+    await asyncio.sleep(0.2)
+    if outboxes:
+        for outbox in outboxes:
+            outbox.close()
+
+    fast_latency = [
+        received - sent_at[index]
+        for ws in sockets[1:]
+        for index, received in enumerate(ws.received)
+    ]
+    return blocked, fast_latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=8)
+    parser.add_argument("--slow-ms", type=float, default=20.0)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<12} {'sender p50 us':>14} {'sender p99 us':>14} {'fast sub p50 us':>16} {'fast sub p99 us':>16}")
+    for mode in ("sequential", "outbox"):
+        blocked, fast = asyncio.run(run(
+            mode, args.subscribers, args.slow_ms / 1000, args.messages, args.interval_ms / 1000
+        ))
+        print(f"{mode:<12} {statistics.median(blocked) * 1e6:>14.0f} {percentile(blocked, 0.99) * 1e6:>14.0f} "
+              f"{statistics.median(fast) * 1e6:>16.0f} {percentile(fast, 0.99) * 1e6:>16.0f}")
+    print(f"outbox drops: {fanout_stats.dropped}, slow disconnects: {fanout_stats.slow_disconnects}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Byte size and decode time of JSON vs bin1 controller frames.
+
+    python -m benchmarks.bench_frames --iterations 200000
+"""
+import argparse
+import json
+import time
+
+from src.core.frames import ControllerFrame, decode_frame
+
+from benchmarks.bench_workers import INPUT_FRAME
+
+
+def timed(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    state = json.loads(INPUT_FRAME)["data"]
+    json_frame = INPUT_FRAME.encode()
+    binary_frame = ControllerFrame.from_state(state, seq=1).encode()
+
+    rows = [
+        ("json", len(json_frame), timed(lambda: json.loads(json_frame), args.iterations)),
+        ("bin1", len(binary_frame), timed(lambda: decode_frame(binary_frame), args.iterations)),
+        ("bin1 -> state dict", len(binary_frame),
+         timed(lambda: decode_frame(binary_frame).to_state(), args.iterations)),
+    ]
+
+    print(f"{'format':<20} {'bytes':>6} {'decode ns':>10}")
+    for name, size, ns in rows:
+        print(f"{name:<20} {size:>6} {ns:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
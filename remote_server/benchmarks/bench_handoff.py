@@ -0,0 +1,174 @@
+"""Relay restart with session handoff: time for the rooms to resync.
+
+Starts relay A on a free port, connects --rooms rooms of a PC and --phones
+phones streaming controller_input at --rate Hz, then starts relay B on the
+same port (SO_REUSEPORT) and sends A a SIGTERM. A drains: it writes its
+session snapshot, tells every client to reconnect after a random delay of up
+to --jitter ms and closes; the clients come back to B with the same
+handshake, retrying with backoff when they still hit A (503).
+
+Reported: time from the SIGTERM until each PC got its first input through
+B, how many devices the snapshots from B carried with a restored state, and
+the retries.
+
+    python -m benchmarks.bench_handoff --rooms 20 --phones 2 --jitter 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import tempfile
+import time
+import uuid
+
+import websockets
+
+from benchmarks.bench_workers import INPUT_FRAME, free_port, start_relay
+from benchmarks.loadtest import percentile
+
+BACKOFF = 0.2
+
+
+class Client:
+    """A PC or a phone that follows the relay's reconnect instructions."""
+
+    def __init__(self, url: str, handshake: dict, stats: dict):
+        self.url = url
+        self.handshake = json.dumps(handshake)
+        self.stats = stats
+        self.ws = None
+        self.reconnected = asyncio.Event()
+
+    async def open(self):
+        for attempt in range(8):
+            try:
+                self.ws = await websockets.connect(self.url)
+                await self.ws.send(self.handshake)
+                return
+            except (OSError, websockets.InvalidHandshake):
+                self.stats["retries"] += 1
+                await asyncio.sleep(random.uniform(0, BACKOFF * 2 ** attempt))
+        raise RuntimeError("relay unreachable")
+
+    async def run(self, on_message=None):
+        reconnect_at = None
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                timeout = None if reconnect_at is None else max(0, reconnect_at - loop.time())
+                message = await asyncio.wait_for(self.ws.recv(), timeout)
+            except (asyncio.TimeoutError, websockets.ConnectionClosed) as e:
+                if reconnect_at is None and isinstance(e, websockets.ConnectionClosed):
+                    if e.rcvd is None or e.rcvd.code not in (1012, 1013):
+                        return
+                    reconnect_at = loop.time()
+                await asyncio.sleep(max(0, reconnect_at - loop.time()))
+                reconnect_at = None
+                await self.ws.close()
+                await self.open()
+                self.reconnected.set()
+                continue
+            if isinstance(message, str) and message.startswith('{"type":"reconnect"'):
+                reconnect_at = loop.time() + json.loads(message)["delay_ms"] / 1000
+            elif on_message:
+                on_message(message)
+
+
+async def room(url: str, phones: int, rate: float, stats: dict, terminated: list, stop: asyncio.Event):
+    unique_id = str(uuid.uuid4())
+    pc = Client(f"{url}/ws/{unique_id}", {"device_type": "pc", "device_id": "pc", "formats": ["json"]}, stats)
+    await pc.open()
+    resynced = []
+
+    def pc_message(message):
+        data = json.loads(message)
+        if data.get("type") == "snapshot" and pc.reconnected.is_set():
+            stats["restored"] += sum(1 for device in data["devices"] if device["data"])
+        elif data.get("type") == "controller_input" and pc.reconnected.is_set() and not resynced:
+            resynced.append(time.monotonic() - terminated[0])
+
+    mobiles = []
+    for index in range(phones):
+        mobile = Client(f"{url}/ws/{unique_id}", {
+            "type": "connect", "device_id": f"m{index}", "device_name": "bench", "device_type": "mobile"
+        }, stats)
+        await mobile.open()
+        mobiles.append(mobile)
+    tasks = [asyncio.create_task(pc.run(pc_message))]
+    tasks += [asyncio.create_task(mobile.run()) for mobile in mobiles]
+
+    async def produce(mobile):
+        while not stop.is_set():
+            try:
+                await mobile.ws.send(INPUT_FRAME)
+            except websockets.ConnectionClosed:
+                pass
+            await asyncio.sleep(1.0 / rate)
+
+    producers = [asyncio.create_task(produce(mobile)) for mobile in mobiles]
+    await stop.wait()
+    await asyncio.gather(*producers)
+    for client in [pc] + mobiles:
+        await client.ws.close()
+    for task in tasks:
+        task.cancel()
+    if resynced:
+        stats["resync"].append(resynced[0] * 1e6)
+    else:
+        stats["lost"] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=20)
+    parser.add_argument("--phones", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=60.0)
+    parser.add_argument("--jitter", type=int, default=1000, help="DRAIN_JITTER_MS of the relays")
+    parser.add_argument("--settle", type=float, default=5.0, help="seconds to run after the SIGTERM")
+    args = parser.parse_args()
+
+    port = free_port()
+    env = {
+        "DRAIN_JITTER_MS": str(args.jitter), "DRAIN_GRACE": "1",
+        "DRAIN_SNAPSHOT": os.path.join(tempfile.mkdtemp(), "handoff.json")
+    }
+    relay_a = start_relay(1, port, **env)
+    relay_b = None
+    stats = {"resync": [], "restored": 0, "retries": 0, "lost": 0}
+    try:
+        async def run():
+            nonlocal relay_b
+            stop = asyncio.Event()
+            terminated = [0.0]
+            rooms = [
+                asyncio.create_task(room(f"ws://127.0.0.1:{port}", args.phones, args.rate, stats, terminated, stop))
+                for _ in range(args.rooms)
+            ]
+            await asyncio.sleep(1.0)
+            relay_b = await asyncio.to_thread(start_relay, 1, port, **env)
+            await asyncio.sleep(1.0)
+            terminated[0] = time.monotonic()
+            relay_a.send_signal(signal.SIGTERM)
+            await asyncio.sleep(args.settle)
+            stop.set()
+            await asyncio.gather(*rooms)
+
+        asyncio.run(run())
+        relay_a.wait(15)
+    finally:
+        for relay in (relay_a, relay_b):
+            if relay and relay.poll() is None:
+                relay.terminate()
+                relay.wait(15)
+
+    resync = sorted(stats["resync"])
+    print(f"rooms {args.rooms}, phones/room {args.phones}, jitter {args.jitter} ms, relay A exit {relay_a.returncode}")
+    print(f"resync after SIGTERM  p50 {percentile(resync, 0.5):.0f} ms  "
+          f"p99 {percentile(resync, 0.99):.0f} ms  max {percentile(resync, 1.0):.0f} ms")
+    print(f"rooms lost {stats['lost']}, restored device states {stats['restored']}, handshake retries {stats['retries']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""One PC hosting many rooms: a socket per room against one /mux uplink.
+
+A relay is started on a free port and a PC hosts --rooms rooms, each with
+--phones phones streaming timestamped controller_input at --rate Hz. The PC
+either opens one /ws/{unique_id} socket per room (one reader task each) or
+joins all rooms on a single /mux uplink read by one task. Reported: the
+frames the relay wrote to the PC, the inputs the PC received and their
+forward latency.
+
+    python -m benchmarks.bench_mux --rooms 8 --phones 2 --rate 120
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import websockets
+
+from benchmarks.bench_batching import pc_sends
+from benchmarks.bench_workers import free_port, start_relay
+from benchmarks.loadtest import json_bodies, now_us, percentile
+
+
+def read_inputs(message, latencies: list, counter: list):
+    received = now_us()
+    data = json.loads(message)
+    for item in data if isinstance(data, list) else [data]:
+        # {"r": index, "m": message} on the uplink
+        item = item.get("m", item)
+        sent = item.get("frame", {}).get("sent_us")
+        if sent:
+            counter[0] += 1
+            latencies.append(received - sent)
+
+
+async def pc_sockets(url: str, rooms: list, latencies: list, counter: list, ready: asyncio.Event):
+    sockets = []
+    for unique_id in rooms:
+        pc = await websockets.connect(f"{url}/ws/{unique_id}")
+        await pc.send(json.dumps({"device_type": "pc", "device_id": "pc", "formats": ["json"], "batch": True}))
+        await pc.recv()  # hello
+        sockets.append(pc)
+    ready.set()
+
+    async def consume(pc):
+        try:
+            async for message in pc:
+                read_inputs(message, latencies, counter)
+        except websockets.ConnectionClosed:
+            pass
+
+    return sockets, [asyncio.create_task(consume(pc)) for pc in sockets]
+
+
+async def pc_uplink(url: str, rooms: list, latencies: list, counter: list, ready: asyncio.Event):
+    pc = await websockets.connect(f"{url}/mux")
+    await pc.send(json.dumps({
+        "device_type": "pc", "device_id": "pc", "formats": ["json"], "batch": True, "rooms": rooms
+    }))
+    await pc.recv()  # hello
+    for _ in rooms:
+        await pc.recv()  # joined
+    ready.set()
+
+    async def consume():
+        try:
+            async for message in pc:
+                read_inputs(message, latencies, counter)
+        except websockets.ConnectionClosed:
+            pass
+
+    return [pc], [asyncio.create_task(consume())]
+
+
+async def phone(url: str, unique_id: str, device_id: str, rate: float, duration: float):
+    mobile = await websockets.connect(f"{url}/ws/{unique_id}")
+    await mobile.send(json.dumps({
+        "type": "connect", "device_id": device_id, "device_name": "bench", "device_type": "mobile"
+    }))
+    bodies = json_bodies()
+    period = 1.0 / rate
+    end = time.monotonic() + duration
+    next_send = time.monotonic()
+    seq = 0
+    while next_send < end:
+        delay = next_send - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_send += period
+        await mobile.send('{"type":"controller_input","sent_us":%d' % now_us() + bodies[seq % len(bodies)])
+        seq += 1
+    await mobile.close()
+
+
+def measure(mode: str, args):
+    port = free_port()
+    relay = start_relay(1, port, BATCH_INPUTS="1", BATCH_WINDOW_MS="0")
+    url = f"ws://127.0.0.1:{port}"
+    latencies, counter = [], [0]
+    try:
+        async def main():
+            rooms = [str(uuid.uuid4()) for _ in range(args.rooms)]
+            ready = asyncio.Event()
+            open_pc = pc_uplink if mode == "mux" else pc_sockets
+            sockets, readers = await open_pc(url, rooms, latencies, counter, ready)
+            await ready.wait()
+            await asyncio.gather(*(
+                phone(url, unique_id, f"m{index}", args.rate, args.duration)
+                for unique_id in rooms for index in range(args.phones)
+            ))
+            await asyncio.sleep(0.3)
+            for pc in sockets:
+                await pc.close()
+            await asyncio.gather(*readers)
+            return len(sockets)
+
+        sends_before = pc_sends(port)
+        sockets = asyncio.run(main())
+        sends = pc_sends(port) - sends_before
+    finally:
+        relay.terminate()
+        relay.wait(15)
+    return sockets, sends / args.duration, counter[0] / args.duration, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=8)
+    parser.add_argument("--phones", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=120.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'pc':>8} {'sockets':>8} {'pc sends/s':>11} {'inputs/s':>9} {'p50 ms':>7} {'p99 ms':>7}")
+    for mode in ("sockets", "mux"):
+        sockets, sends, inputs, latencies = measure(mode, args)
+        print(f"{mode:>8} {sockets:>8} {sends:>11.0f} {inputs:>9.0f} "
+              f"{percentile(latencies, 0.5):>7.2f} {percentile(latencies, 0.99):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
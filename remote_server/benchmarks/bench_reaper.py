@@ -0,0 +1,89 @@
+"""Idle expiry cost: timer wheel vs scanning every peer each tick.
+
+Simulates --peers connections of which --active-fraction send something every
+second (only last_seen changes) and runs --seconds of both strategies on a
+virtual clock, checking every --resolution seconds. Reports the expiry CPU
+time per simulated second: the scan pays for every peer on every check, the
+wheel only for the entries that come due.
+
+    python -m benchmarks.bench_reaper --peers 100000 --timeout 30 --resolution 0.25
+"""
+import argparse
+import random
+import time
+
+from src.core.timers import TimerWheel
+
+
+class FakePeer:
+    __slots__ = ("last_seen", "gone")
+
+    def __init__(self, now: float):
+        self.last_seen = now
+        self.gone = False
+
+
+def clock(seconds: int, resolution: float, active: list):
+    # Yields the check times, touching the active peers once per second
+    steps = int(round(1 / resolution))
+    for second in range(seconds):
+        for peer in active:
+            peer.last_seen = float(second)
+        for step in range(1, steps + 1):
+            yield second + step * resolution
+
+
+def run_wheel(peers, timeout: float, seconds: int, resolution: float, active: list):
+    wheel = TimerWheel(resolution, size=int(timeout / resolution) + 2, now=0.0)
+    for peer in peers:
+        wheel.schedule(peer.last_seen + timeout, peer)
+    spent = 0.0
+    evicted = 0
+    for now in clock(seconds, resolution, active):
+        started = time.perf_counter()
+        for peer in wheel.advance(now):
+            if peer.gone:
+                continue
+            deadline = peer.last_seen + timeout
+            if deadline > now:
+                wheel.schedule(deadline, peer)
+            else:
+                peer.gone = True
+                evicted += 1
+        spent += time.perf_counter() - started
+    return spent / seconds, evicted
+
+
+def run_scan(peers, timeout: float, seconds: int, resolution: float, active: list):
+    spent = 0.0
+    evicted = 0
+    for now in clock(seconds, resolution, active):
+        started = time.perf_counter()
+        for peer in peers:
+            if not peer.gone and peer.last_seen + timeout <= now:
+                peer.gone = True
+                evicted += 1
+        spent += time.perf_counter() - started
+    return spent / seconds, evicted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peers", type=int, default=100_000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--resolution", type=float, default=0.25)
+    parser.add_argument("--active-fraction", type=float, default=0.9)
+    args = parser.parse_args()
+
+    print(f"{'strategy':>8} {'ms/second':>10} {'evicted':>8}")
+    for name, run in (("wheel", run_wheel), ("scan", run_scan)):
+        random.seed(1)
+        peers = [FakePeer(-random.random() * args.timeout) for _ in range(args.peers)]
+        active = random.sample(peers, int(args.peers * args.active_fraction))
+        per_second, evicted = run(peers, args.timeout, args.seconds, args.resolution, active)
+        print(f"{name:>8} {per_second * 1000:>10.3f} {evicted:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Per-connection memory of the slotted Room/Peer registry.
+
+Builds N rooms with one PC and M mobiles each and reports the traced memory
+per room and per peer, next to the old nested-dict layout.
+
+    python -m benchmarks.bench_registry --rooms 10000 --mobiles 2
+"""
+import argparse
+import time
+import tracemalloc
+import uuid
+
+from src.core.registry import Peer, Registry
+
+
+def build_registry(rooms: int, mobiles: int):
+    registry = Registry()
+    for _ in range(rooms):
+        unique_id = str(uuid.uuid4())
+        room, _ = registry.open_room(unique_id)
+        registry.add_pc(room, Peer(unique_id, "pc", "pc", "pc", None))
+        for index in range(mobiles):
+            registry.add_mobile(room, Peer(unique_id, f"mobile-{index}", "phone", "mobile", None))
+    return registry
+
+
+def build_dicts(rooms: int, mobiles: int):
+    # Layout before the registry, plus the per-room stats it could not hold
+    connections = {}
+    for _ in range(rooms):
+        unique_id = str(uuid.uuid4())
+        connections[unique_id] = {
+            "pc": {"ws": None, "device_name": "pc", "format": "json", "messages": 0, "bytes": 0,
+                   "connected_at": time.time(), "last_seen": time.monotonic()},
+            "mobile": {
+                f"mobile-{index}": {"ws": None, "device_name": "phone", "format": "json", "messages": 0,
+                                    "bytes": 0, "connected_at": time.time(), "last_seen": time.monotonic()}
+                for index in range(mobiles)
+            },
+            "remote_pc": False,
+            "created_at": time.time(),
+            "last_activity": time.monotonic(),
+            "messages": 0,
+            "bytes": 0,
+        }
+    return connections
+
+
+def measure(build, rooms: int, mobiles: int) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(rooms, mobiles)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--mobiles", type=int, default=2)
+    args = parser.parse_args()
+
+    peers = args.rooms * (1 + args.mobiles)
+    print(f"{'layout':<10} {'total KiB':>10} {'B/room':>8} {'B/peer':>8}")
+    for name, build in (("dicts", build_dicts), ("slots", build_registry)):
+        total = measure(build, args.rooms, args.mobiles)
+        print(f"{name:<10} {total / 1024:>10.0f} {total / args.rooms:>8.0f} {total / peers:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
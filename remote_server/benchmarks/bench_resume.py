@@ -0,0 +1,131 @@
+"""Reconnect-to-first-input latency of a phone whose connection dropped.
+
+A relay is started with RESUME_GRACE on and off. Each of --rooms rooms gets
+a PC behaving like the desktop client (it ignores inputs of devices it has no
+pad for, and creating a pad on "connect" takes --pad-ms) and a phone
+streaming controller_input at --rate Hz. Every --interval seconds the
+phone's TCP connection is cut without a close frame, and the phone
+reconnects right away, with its resume token when it has one.
+
+Measured from the start of the reconnect to the first input the PC applies
+again, together with the pad unplug/replug cycles the PC went through.
+
+    python -m benchmarks.bench_resume --rooms 10 --drops 5 --pad-ms 50
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import websockets
+
+from benchmarks.bench_workers import INPUT_FRAME, free_port, start_relay
+from benchmarks.loadtest import percentile
+
+
+async def room(url: str, args, latencies: list, replugs: list):
+    unique_id = str(uuid.uuid4())
+    pc = await websockets.connect(f"{url}/ws/{unique_id}")
+    await pc.send(json.dumps({"device_type": "pc", "device_id": "pc", "formats": ["json"]}))
+    await asyncio.wait_for(pc.recv(), 5)  # hello
+    pads = set()
+    waiting = {}  # reconnect started at, until the PC applies an input again
+
+    async def run_pc():
+        try:
+            async for message in pc:
+                data = json.loads(message)
+                kind = data.get("type")
+                if kind == "connect":
+                    if data["device_id"] not in pads:
+                        replugs[0] += 1
+                        await asyncio.sleep(args.pad_ms / 1000)  # new virtual pad
+                        pads.add(data["device_id"])
+                    await pc.send(json.dumps({"type": "connect_success", "device_id": data["device_id"]}))
+                elif kind == "disconnect":
+                    pads.discard(data["device_id"])
+                elif kind == "controller_input" and data["device_id"] in pads:
+                    started = waiting.pop(data["device_id"], None)
+                    if started is not None:
+                        latencies.append((time.perf_counter() - started) * 1e6)
+        except websockets.ConnectionClosed:
+            pass
+
+    pc_task = asyncio.create_task(run_pc())
+    token = None
+
+    async def connect_phone():
+        nonlocal token
+        mobile = await websockets.connect(f"{url}/ws/{unique_id}")
+        handshake = {"type": "connect", "device_id": "m", "device_name": "bench",
+                     "device_type": "mobile", "formats": ["json"]}
+        if token:
+            handshake["resume"] = token
+        await mobile.send(json.dumps(handshake))
+        hello = json.loads(await asyncio.wait_for(mobile.recv(), 5))
+        token = hello.get("resume")
+        return mobile
+
+    async def drain(mobile):
+        try:
+            async for _ in mobile:
+                pass
+        except websockets.ConnectionClosed:
+            pass
+
+    mobile = await connect_phone()
+    reader = asyncio.create_task(drain(mobile))
+    period = 1.0 / args.rate
+    for _ in range(args.drops + 1):
+        end = time.monotonic() + args.interval
+        while time.monotonic() < end:
+            await mobile.send(INPUT_FRAME)
+            await asyncio.sleep(period)
+        # Wi-Fi gone: no close frame, the relay sees 1006
+        mobile.transport.abort()
+        await reader
+        waiting["m"] = time.perf_counter()
+        mobile = await connect_phone()
+        reader = asyncio.create_task(drain(mobile))
+    await asyncio.sleep(0.5)
+    await mobile.close()
+    await pc.close()
+    await pc_task
+
+
+def measure(grace: str, args):
+    port = free_port()
+    relay = start_relay(1, port, RESUME_GRACE=grace, DEVICE_RATE="0", ROOM_RATE="0")
+    try:
+        latencies, replugs = [], [0]
+
+        async def main():
+            await asyncio.gather(*(room(f"ws://127.0.0.1:{port}", args, latencies, replugs) for _ in range(args.rooms)))
+
+        asyncio.run(main())
+    finally:
+        relay.terminate()
+        relay.wait(15)
+    return sorted(latencies), replugs[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--drops", type=int, default=5)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between drops")
+    parser.add_argument("--rate", type=float, default=60.0)
+    parser.add_argument("--pad-ms", type=float, default=50.0, help="time the PC takes to create a pad")
+    args = parser.parse_args()
+
+    print(f"{'resume':>7} {'reconnects':>11} {'p50 ms':>7} {'p99 ms':>7} {'pad replugs':>12}")
+    for label, grace in (("off", "0"), ("on", "10")):
+        latencies, replugs = measure(grace, args)
+        # The first connect of every phone creates a pad either way
+        print(f"{label:>7} {len(latencies):>11} {percentile(latencies, 0.5):>7.2f} "
+              f"{percentile(latencies, 0.99):>7.2f} {replugs - args.rooms:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Room movement when relay nodes join or leave the consistent-hash ring.
+
+Assigns --rooms random unique_ids over N nodes, adds one node and removes one,
+and reports the fraction of rooms that changed owner (ideal: 1/(N+1) and 1/N)
+plus the balance and lookup cost.
+
+    python -m benchmarks.bench_ring --nodes 4 --rooms 100000
+"""
+import argparse
+import time
+import uuid
+from collections import Counter
+
+from src.core.ring import HashRing
+
+
+def owners(ring: HashRing, rooms):
+    return [ring.owner(room) for room in rooms]
+
+
+def moved(before, after) -> float:
+    return sum(1 for a, b in zip(before, after) if a != b) / len(before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=4)
+    parser.add_argument("--rooms", type=int, default=100_000)
+    parser.add_argument("--vnodes", type=int, default=160)
+    args = parser.parse_args()
+
+    nodes = [f"relay-{index}:8080" for index in range(args.nodes)]
+    rooms = [str(uuid.uuid4()) for _ in range(args.rooms)]
+
+    ring = HashRing(nodes, args.vnodes)
+    started = time.perf_counter()
+    base = owners(ring, rooms)
+    lookup_us = (time.perf_counter() - started) / len(rooms) * 1_000_000
+
+    load = Counter(base)
+    ideal = len(rooms) / len(nodes)
+    print(f"lookup            {lookup_us:.2f} us")
+    print(f"balance           min {min(load.values()) / ideal:.2f}  max {max(load.values()) / ideal:.2f} of ideal")
+
+    joined = owners(HashRing(nodes + [f"relay-{args.nodes}:8080"], args.vnodes), rooms)
+    print(f"node joins        {moved(base, joined) * 100:.1f}% moved (ideal {100 / (args.nodes + 1):.1f}%)")
+    left = owners(HashRing(nodes[1:], args.vnodes), rooms)
+    print(f"node leaves       {moved(base, left) * 100:.1f}% moved (ideal {100 / args.nodes:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
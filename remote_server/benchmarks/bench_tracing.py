@@ -0,0 +1,109 @@
+"""Cost of sampled tracing on the forwarding path.
+
+A relay is started with tracing off, at --sample and tracing every message
+(TRACE_SAMPLE=1), and --pairs PC/phone pairs stream controller_input at
+--rate Hz through it for --duration seconds. Reported: forward latency to
+the PC, the relay's CPU time per forwarded input (user + system, startup
+included) and the traces written.
+
+    python -m benchmarks.bench_tracing --pairs 20 --rate 120 --sample 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import tempfile
+import time
+import uuid
+
+import websockets
+
+from benchmarks.bench_workers import free_port, start_relay
+from benchmarks.loadtest import json_bodies, now_us, percentile, sent_at
+
+
+async def pair(url: str, args, latencies: list):
+    unique_id = str(uuid.uuid4())
+    pc = await websockets.connect(f"{url}/ws/{unique_id}")
+    await pc.send(json.dumps({"device_type": "pc", "device_id": "pc", "formats": ["json"]}))
+    await pc.recv()  # hello
+    mobile = await websockets.connect(f"{url}/ws/{unique_id}")
+    await mobile.send(json.dumps({
+        "type": "connect", "device_id": "m", "device_name": "bench", "device_type": "mobile"
+    }))
+
+    async def consume():
+        try:
+            async for message in pc:
+                received = now_us()
+                sent = sent_at(message)
+                if sent:
+                    latencies.append(received - sent)
+        except websockets.ConnectionClosed:
+            pass
+
+    reader = asyncio.create_task(consume())
+    bodies = json_bodies()
+    period = 1.0 / args.rate
+    end = time.monotonic() + args.duration
+    next_send = time.monotonic()
+    seq = 0
+    while next_send < end:
+        delay = next_send - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        next_send += period
+        await mobile.send('{"type":"controller_input","sent_us":%d' % now_us() + bodies[seq % len(bodies)])
+        seq += 1
+    await mobile.close()
+    await asyncio.sleep(0.2)
+    await pc.close()
+    await reader
+
+
+def relay_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(sample: float, args):
+    trace_file = os.path.join(tempfile.mkdtemp(), "trace.json")
+    port = free_port()
+    cpu_before = relay_cpu()
+    relay = start_relay(1, port, TRACE_SAMPLE=str(sample), TRACE_FILE=trace_file, AUDIT_LOG="",
+                        DEVICE_RATE="0", ROOM_RATE="0")
+    latencies = []
+    try:
+        async def main():
+            await asyncio.gather(*(pair(f"ws://127.0.0.1:{port}", args, latencies) for _ in range(args.pairs)))
+
+        asyncio.run(main())
+    finally:
+        relay.terminate()
+        relay.wait(15)
+    cpu = relay_cpu() - cpu_before
+    traces = 0
+    if os.path.exists(trace_file):
+        with open(trace_file) as file:
+            traces = sum(1 for event in json.loads(file.read() + "]") if event.get("cat") == "message")
+    return sorted(latencies), cpu, traces
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=120.0)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--sample", type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"{'sample':>7} {'inputs':>7} {'p50 ms':>7} {'p99 ms':>7} {'cpu us/input':>13} {'traces':>7}")
+    for sample in (0.0, args.sample, 1.0):
+        latencies, cpu, traces = measure(sample, args)
+        print(f"{sample:>7g} {len(latencies):>7} {percentile(latencies, 0.5):>7.2f} "
+              f"{percentile(latencies, 0.99):>7.2f} {cpu / max(1, len(latencies)) * 1e6:>13.1f} {traces:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Relay throughput against the number of worker processes.
+
+Starts `main.py` with WORKERS=1,2,4... on a free local port, connects
+PC/mobile pairs (unique_ids spread over the workers by the kernel, so many
+pairs cross the bus) and counts the controller_input frames that reach the
+PCs per second.
+
+    python -m benchmarks.bench_workers --workers 1 2 4 --pairs 64 --duration 10
+
+The load generators run on the same host, so the speedup only means
+something with spare cores for them (--clients). Multi-core scaling has not
+been measured yet. On a 1-CPU host (--pairs 32 --duration 5) the extra
+worker only adds the bus hop: 3239 frames/s with 1 worker, 3012 with 2.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INPUT_FRAME = json.dumps({
+    "type": "controller_input",
+    "device_id": "bench",
+    "device_name": "bench",
+    "data": {
+        "buttonStates": {
+            b: {"id": b, "isPressed": False, "value": 0.0, "timestamp": "2024-01-01T00:00:00.000"}
+            for b in ("A", "B", "X", "Y", "LB", "RB", "LT", "RT", "Start", "Select")
+        },
+        "leftJoystickState": {"dx": 0.25, "dy": -0.5, "isPressed": True, "intensity": 0.5, "angle": 1.1},
+        "rightJoystickState": {"dx": 0.0, "dy": 0.0, "isPressed": False, "intensity": 0.0, "angle": 0.0},
+        "dpadState": {"upPressed": False, "rightPressed": False, "downPressed": False, "leftPressed": False},
+        "timestamp": "2024-01-01T00:00:00.000"
+    }
+})
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_relay(workers: int, port: int, **extra_env) -> subprocess.Popen:
+    env = dict(os.environ, WORKERS=str(workers), PORT=str(port), HOST="127.0.0.1", ACCESS_LOG="0", **extra_env)
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+            time.sleep(1.0)  # let every worker finish booting
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("relay did not start")
+
+
+async def run_pair(url: str, duration: float, counter: list):
+    unique_id = str(uuid.uuid4())
+    pc = await websockets.connect(f"{url}/ws/{unique_id}")
+    await pc.send(json.dumps({"device_type": "pc", "device_id": "pc"}))
+    await asyncio.sleep(0.2)  # PC registration may have to reach the bus first
+    mobile = await websockets.connect(f"{url}/ws/{unique_id}")
+    await mobile.send(json.dumps({
+        "type": "connect", "device_id": "bench", "device_name": "bench", "device_type": "mobile"
+    }))
+    await asyncio.wait_for(pc.recv(), 5)  # connect
+    end = time.monotonic() + duration
+
+    async def consume():
+        # Keeps reading until the PC socket closes so the relay never blocks
+        try:
+            async for _ in pc:
+                if time.monotonic() < end:
+                    counter[0] += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    consumer = asyncio.create_task(consume())
+    while time.monotonic() < end:
+        await mobile.send(INPUT_FRAME)
+        await asyncio.sleep(0)
+    await mobile.close()
+    await pc.close()
+    await consumer
+
+
+def client_process(url: str, pairs: int, duration: float, result):
+    async def main():
+        counter = [0]
+        await asyncio.gather(*(run_pair(url, duration, counter) for _ in range(pairs)))
+        return counter[0]
+
+    result.put(asyncio.run(main()))
+
+
+def measure(workers: int, pairs: int, duration: float, clients: int) -> float:
+    port = free_port()
+    relay = start_relay(workers, port)
+    try:
+        result = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=client_process,
+                args=(f"ws://127.0.0.1:{port}", max(1, pairs // clients), duration, result)
+            )
+            for _ in range(clients)
+        ]
+        for process in processes:
+            process.start()
+        total = sum(result.get() for _ in processes)
+        for process in processes:
+            process.join()
+        return total / duration
+    finally:
+        relay.terminate()
+        relay.wait(15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--pairs", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'frames/s':>12} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        rate = measure(workers, args.pairs, args.duration, args.clients)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>12.0f} {rate / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Relay capacity test with simulated PC/mobile pairs.
+
+Every pair is one room: a PC and a mobile connected to /ws/{unique_id}. The
+mobiles stream controller_input snapshots at a rate drawn from --rate (Hz)
+and stamp each with its send time, the PCs measure the forward latency when
+the frame comes out of the relay. Clients are split over --clients processes
+so the load generator is not the bottleneck before the relay is.
+
+Reports sent/delivered throughput, p50/p99/p999 forward latency, relay CPU
+and RSS per connection (CPU and RSS need psutil).
+
+    python -m benchmarks.loadtest --spawn --pairs 500 --rate 60 250 --duration 30
+    python -m benchmarks.loadtest --url ws://127.0.0.1:8080 --pairs 2000 --format bin1
+
+Everything runs on localhost: --spawn starts `main.py` on a free port (with
+--workers processes), otherwise a relay must already listen on --url.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from array import array
+
+import websockets
+
+from benchmarks.bench_workers import free_port, start_relay
+from src.core.frames import FORMAT_BIN1, FRAME_SIZE, ControllerFrame, decode_frame
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BUTTONS = ("A", "B", "X", "Y", "LB", "RB", "LT", "RT", "Start", "Select")
+SENT_KEY = '"sent_us":'
+
+
+def now_us() -> int:
+    # Wall clock, shared by all client processes on this host
+    return time.time_ns() // 1000
+
+
+def json_bodies(count: int = 16):
+    # Snapshots in the layout of the phone's ControllerState.toJson(), with the
+    # stick moving so consecutive frames differ. sent_us is spliced in front.
+    bodies = []
+    for step in range(count):
+        dx = round(-1.0 + 2.0 * step / count, 3)
+        data = {
+            "buttonStates": {
+                button: {
+                    "id": button, "isPressed": step % 4 == 0 and button == "A",
+                    "value": 1.0 if step % 4 == 0 and button == "A" else 0.0,
+                    "timestamp": "2024-01-01T00:00:00.000"
+                }
+                for button in BUTTONS
+            },
+            "leftJoystickState": {"dx": dx, "dy": -dx, "isPressed": True, "intensity": abs(dx), "angle": 0.8},
+            "rightJoystickState": {"dx": 0.0, "dy": 0.0, "isPressed": False, "intensity": 0.0, "angle": 0.0},
+            "dpadState": {"upPressed": False, "rightPressed": False, "downPressed": False, "leftPressed": False},
+            "timestamp": "2024-01-01T00:00:00.000"
+        }
+        bodies.append(',"device_id":"m","data":' + json.dumps(data, separators=(",", ":")) + "}")
+    return bodies
+
+
+def sent_at(message) -> int:
+    if isinstance(message, bytes):
+        frame = decode_frame(message[-FRAME_SIZE:])
+        return frame.timestamp_us if frame else 0
+    start = message.find(SENT_KEY)
+    if start < 0:
+        return 0
+    start += len(SENT_KEY)
+    return int(message[start:message.find(",", start)])
+
+
+class ClientStats:
+    def __init__(self):
+        self.sent = 0
+        self.delivered = 0
+        self.latencies = array("I")  # microseconds
+        self.failed = 0
+
+
+async def open_pair(url: str, frame_format: str):
+    unique_id = str(uuid.uuid4())
+    pc = await websockets.connect(f"{url}/ws/{unique_id}", max_queue=None)
+    hello = {"device_type": "pc", "device_id": "pc", "device_name": "loadtest"}
+    if frame_format == FORMAT_BIN1:
+        hello["formats"] = [FORMAT_BIN1, "json"]
+    await pc.send(json.dumps(hello))
+    if frame_format == FORMAT_BIN1:
+        await asyncio.wait_for(pc.recv(), 10)  # hello
+
+    mobile = await websockets.connect(f"{url}/ws/{unique_id}")
+    connect = {"type": "connect", "device_id": "m", "device_name": "loadtest", "device_type": "mobile"}
+    if frame_format == FORMAT_BIN1:
+        connect["formats"] = [FORMAT_BIN1, "json"]
+    await mobile.send(json.dumps(connect))
+    # The connect notification proves the room is wired end to end
+    while True:
+        message = await asyncio.wait_for(pc.recv(), 10)
+        if isinstance(message, str) and '"connect"' in message:
+            break
+    return pc, mobile
+
+
+async def consume(pc, stats: ClientStats, window):
+    start, end = window
+    try:
+        async for message in pc:
+            received = now_us()
+            sent = sent_at(message)
+            if start <= sent < end:
+                stats.delivered += 1
+                stats.latencies.append(max(0, received - sent))
+    except websockets.ConnectionClosed:
+        pass
+
+
+async def produce(mobile, rate: float, frame_format: str, window, stats: ClientStats):
+    start, end = window
+    period = 1.0 / rate
+    bodies = json_bodies()
+    frame = ControllerFrame()
+    seq = 0
+    next_send = time.monotonic() + random.random() * period  # spread the pairs over one period
+    try:
+        while True:
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_send += period
+            sent = now_us()
+            if sent >= end:
+                break
+            if frame_format == FORMAT_BIN1:
+                frame.seq = seq
+                frame.timestamp_us = sent
+                frame.lx = (seq * 997) % 65535 - 32767
+                await mobile.send(frame.encode())
+            else:
+                await mobile.send('{"type":"controller_input","sent_us":%d' % sent + bodies[seq % len(bodies)])
+            if sent >= start:
+                stats.sent += 1
+            seq += 1
+    except websockets.ConnectionClosed:
+        stats.failed += 1
+
+
+def client_process(url, pairs, rates, frame_format, ramp, ready, go, window_value, result):
+    async def main():
+        stats = ClientStats()
+        connections = []
+        interval = 1.0 / ramp if ramp else 0
+        for _ in range(pairs):
+            try:
+                connections.append(await open_pair(url, frame_format))
+            except Exception as exc:
+                stats.failed += 1
+                print(f"pair failed: {exc!r}")
+            if interval:
+                await asyncio.sleep(interval)
+
+        ready.put(len(connections))
+        await asyncio.get_running_loop().run_in_executor(None, go.wait)
+        window = (int(window_value[0]), int(window_value[1]))
+
+        consumers = [asyncio.create_task(consume(pc, stats, window)) for pc, _ in connections]
+        await asyncio.gather(*(
+            produce(mobile, random.uniform(*rates), frame_format, window, stats)
+            for _, mobile in connections
+        ))
+        await asyncio.sleep(0.5)  # let the last frames come out of the relay
+        for pc, mobile in connections:
+            await mobile.close()
+            await pc.close()
+        await asyncio.gather(*consumers)
+        return stats
+
+    stats = asyncio.run(main())
+    result.put((stats.sent, stats.delivered, stats.failed, stats.latencies.tobytes()))
+
+
+def raise_fd_limit():
+    # Thousands of sockets per process; children (and a spawned relay) inherit it
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def relay_processes(pid: int):
+    if psutil is None or not pid:
+        return []
+    process = psutil.Process(pid)
+    return [process] + process.children(recursive=True)
+
+
+def relay_usage(processes):
+    # (cpu seconds, rss bytes) summed over the relay and its workers
+    cpu = rss = 0
+    for process in processes:
+        try:
+            times = process.cpu_times()
+            cpu += times.user + times.system
+            rss += process.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return cpu, rss
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))] / 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8080")
+    parser.add_argument("--spawn", action="store_true", help="start a local relay on a free port")
+    parser.add_argument("--workers", type=int, default=1, help="relay workers with --spawn")
+    parser.add_argument("--pid", type=int, default=0, help="relay pid for CPU/RSS without --spawn")
+    parser.add_argument("--pairs", type=int, default=100)
+    parser.add_argument("--rate", type=float, nargs=2, default=[60.0, 250.0], metavar=("MIN", "MAX"))
+    parser.add_argument("--format", choices=["json", FORMAT_BIN1], default="json")
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--ramp", type=float, default=200.0, help="new pairs per second per client, 0 = no limit")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    relay = None
+    url, pid = args.url, args.pid
+    if args.spawn:
+        port = free_port()
+        relay = start_relay(args.workers, port)
+        url, pid = f"ws://127.0.0.1:{port}", relay.pid
+    if psutil is None:
+        print("psutil is not installed, CPU and RSS are not reported")
+
+    try:
+        processes = relay_processes(pid)
+        _, rss_idle = relay_usage(processes)
+
+        ready, result = multiprocessing.Queue(), multiprocessing.Queue()
+        go = multiprocessing.Event()
+        window = multiprocessing.Array("d", 2, lock=False)
+        counts = [args.pairs // args.clients + (1 if i < args.pairs % args.clients else 0) for i in range(args.clients)]
+        clients = [
+            multiprocessing.Process(
+                target=client_process,
+                args=(url, count, tuple(args.rate), args.format, args.ramp, ready, go, window, result)
+            )
+            for count in counts if count
+        ]
+        for client in clients:
+            client.start()
+        connected = sum(ready.get() for _ in clients)
+
+        processes = relay_processes(pid)
+        _, rss_connected = relay_usage(processes)
+        start = now_us() + int(args.warmup * 1_000_000)
+        window[0], window[1] = start, start + int(args.duration * 1_000_000)
+        go.set()
+
+        time.sleep(args.warmup)
+        cpu_start, _ = relay_usage(processes)
+        time.sleep(args.duration)
+        cpu_end, rss_loaded = relay_usage(processes)
+
+        sent = delivered = failed = 0
+        latencies = array("I")
+        for _ in clients:
+            client_sent, client_delivered, client_failed, raw = result.get()
+            sent += client_sent
+            delivered += client_delivered
+            failed += client_failed
+            latencies.frombytes(raw)
+        for client in clients:
+            client.join()
+    finally:
+        if relay:
+            relay.terminate()
+            relay.wait(15)
+
+    latencies = sorted(latencies)
+    connections = connected * 2
+    print(f"pairs connected     {connected}/{args.pairs} ({failed} failures)")
+    print(f"format / rate       {args.format} / {args.rate[0]:.0f}-{args.rate[1]:.0f} Hz")
+    print(f"sent                {sent / args.duration:,.0f} frames/s")
+    print(f"delivered           {delivered / args.duration:,.0f} frames/s "
+          f"({delivered / sent * 100 if sent else 0:.1f}%, the rest superseded or lost)")
+    print(f"forward latency ms  p50 {percentile(latencies, 0.5):.2f}  "
+          f"p99 {percentile(latencies, 0.99):.2f}  p999 {percentile(latencies, 0.999):.2f}  "
+          f"max {latencies[-1] / 1000 if latencies else 0:.2f}")
+    if processes:
+        print(f"relay cpu           {(cpu_end - cpu_start) / args.duration * 100:.0f}%")
+        print(f"relay rss           {rss_loaded / 2**20:.1f} MiB "
+              f"({(rss_connected - rss_idle) / max(1, connections) / 1024:.1f} KiB per connection)")
+
+
+if __name__ == "__main__":
+    main()
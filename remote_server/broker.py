@@ -0,0 +1,21 @@
+import asyncio
+import os
+
+from dotenv import load_dotenv
+
+from src.core.bus import BusHub
+
+# Standalone backplane broker for relay nodes on several hosts. Start one,
+# then point every node at it with BUS_ADDRESS=<host>:<port>.
+#
+#   BROKER_ADDRESS=0.0.0.0:7070 python broker.py
+
+load_dotenv()
+
+if __name__ == "__main__":
+    address = os.getenv("BROKER_ADDRESS", "0.0.0.0:7070")
+    print(f"BROKER LISTENING {address}")
+    try:
+        asyncio.run(BusHub().serve(address))
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,16 @@
+import os
+
 import uvicorn
-from src.core.app import app
+from src.core.config import settings
 
 if __name__ == "__main__":
-    uvicorn.run(
-        app,
-        host='0.0.0.0',
-        port=8080,
-        access_log=True
-    )
\ No newline at end of file
+    if settings.WORKERS > 1:
+        from src.core.supervisor import run_workers
+        run_workers()
+    else:
+        from src.core.supervisor import bind_socket, worker_config
+        # SO_REUSEPORT socket: a new relay can start on this port before the
+        # old one drains (SIGTERM), see src/core/drain.py
+        sock = bind_socket(settings.HOST, settings.PORT)
+        print(f"RELAY LISTENING {settings.HOST}:{settings.PORT} pid {os.getpid()}")
+        uvicorn.Server(worker_config()).run(sockets=[sock])
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+import time
+from typing import Optional
+
+from src.core import metrics
+from src.core.config import settings
+from src.core.registry import Registry
+
+# Admission control: new websocket upgrades are refused (503 with a
+# Retry-After hint) once this process holds MAX_ROOMS rooms or
+# MAX_CONNECTIONS sockets, uses more than MAX_RSS_MB, or its event loop lags
+# more than LAG_LIMIT_MS behind. Peers already connected are never touched,
+# shedding the newcomers keeps latency up for everyone else.
+#
+# Loop lag is measured by a task that sleeps LAG_INTERVAL_MS and looks at how
+# late it woke up, smoothed so that a single slow tick does not flap /ready.
+# The same task samples RSS, so admit() itself only compares numbers.
+
+REASONS = ("rooms", "connections", "memory", "lag")
+LAG_SMOOTHING = 0.3
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        # No procfs: the peak RSS is the best there is (bytes on macOS, kB elsewhere)
+        import resource
+    except ImportError:
+        # Windows: no RSS, the memory limit is not enforced
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Admission:
+    def __init__(self, registry: Registry):
+        self.registry = registry
+        self.connections = 0
+        self.lag = 0.0
+        self.rss = _rss_bytes()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        interval = settings.LAG_INTERVAL_MS / 1000
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - started - interval)
+            metrics.loop_lag.observe(lag)
+            self.lag += (lag - self.lag) * LAG_SMOOTHING
+            self.rss = _rss_bytes()
+
+    def refusal(self, new_room: bool = True) -> Optional[str]:
+        # Why a new connection would be refused right now, None to admit it
+        if settings.LAG_LIMIT_MS > 0 and self.lag * 1000 > settings.LAG_LIMIT_MS:
+            return "lag"
+        if settings.MAX_RSS_MB > 0 and self.rss > settings.MAX_RSS_MB * 1024 * 1024:
+            return "memory"
+        if settings.MAX_CONNECTIONS > 0 and self.connections >= settings.MAX_CONNECTIONS:
+            return "connections"
+        if new_room and self.rooms_full():
+            return "rooms"
+        return None
+
+    def rooms_full(self) -> bool:
+        return settings.MAX_ROOMS > 0 and len(self.registry.rooms) >= settings.MAX_ROOMS
+
+    def admit(self, new_room: bool = True) -> Optional[str]:
+        reason = self.refusal(new_room)
+        if reason is None:
+            metrics.admitted.inc()
+        else:
+            metrics.admission_rejected[reason].inc()
+        return reason
@@ -1,8 +1,257 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+import asyncio
+import hmac
+import json
+import os
+import random
+import signal
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import Dict, Optional, Tuple
+
+from src.core import limits, metrics
+from src.core.admission import Admission
+from src.core.audit import audit
+from src.core.backplane import (
+    Backplane, InMemoryBackplane, KIND_TEXT, TARGET_INPUT, TARGET_MOBILE, TARGET_PC
+)
+from src.core.bus import BrokerBackplane
+from src.core.config import settings
+from src.core.drain import Handoff
+from src.core.outbox import MuxPort, Outbox, PcMailbox, fanout, fanout_stats, mailbox_stats
+from src.core.frames import (
+    FORMAT_BIN1, FRAME_SIZE, FRAME_VERSION, MAX_DEVICE_ID, MAX_MUX_ROOMS, ControllerFrame, decode_frame, device_tag,
+    negotiate, split_device_tag
+)
+from src.core.reaper import Reaper
+from src.core.registry import Peer, Registry, Room
+from src.core.resume import ResumeTable, new_token
+from src.core.ring import HashRing, ws_url
+from src.core.tracing import Trace, tracer
+
+registry = Registry()
+admission = Admission(registry)
+backplane: Optional[Backplane] = None
+reaper: Optional[Reaper] = None
+sessions: Optional[ResumeTable] = None
+handoff = Handoff(settings.DRAIN_SNAPSHOT, settings.DRAIN_TTL)
+draining = False
+
+# Close code for peers evicted by the reaper (4000-4999 is application range)
+IDLE_CLOSE_CODE = 4408
+# Close code after a redirect message, for servers without HTTP responses
+# on the WebSocket handshake
+REDIRECT_CLOSE_CODE = 4307
+
+
+def _create_ring() -> Optional[HashRing]:
+    if not settings.RELAY_NODES:
+        return None
+    if settings.RELAY_SELF not in settings.RELAY_NODES:
+        print(f"RELAY_SELF {settings.RELAY_SELF!r} IS NOT IN RELAY_NODES, ROOM AFFINITY DISABLED")
+        return None
+    return HashRing(settings.RELAY_NODES, settings.RING_VNODES)
+
+
+ring = _create_ring()
+
+
+async def _on_backplane_message(unique_id: str, target: bytes, kind: bytes, data: bytes):
+    # Frames published by another node for peers living on this one
+    room = registry.get(unique_id)
+    if not room:
+        return
+    if target == TARGET_INPUT:
+        if room.pc:
+            device_id, data = split_device_tag(data)
+            if kind == KIND_TEXT:
+                data = data.decode()
+                if not _valid_input_text(data):
+                    metrics.invalid_inputs.inc()
+                    return
+            _deliver_input(room, device_id, data)
+        return
+    payload = data.decode() if kind == KIND_TEXT else data
+    if target == TARGET_PC:
+        if kind == KIND_TEXT and not _valid_text(payload):
+            metrics.invalid_inputs.inc()
+            return
+        # A phone parked here came back on another node
+        if sessions and sessions.parked and kind == KIND_TEXT and _peek_type(payload) == "connect":
+            await _drop_parked(room, json.loads(payload).get("device_id"))
+        if room.pc:
+            _deliver_to_pc(room, payload)
+    else:
+        fanout(_mobile_outboxes(room), payload)
+
+
+async def _on_backplane_presence(unique_id: str, present: bool):
+    room = registry.get(unique_id)
+    if room:
+        room.remote_pc = present
+        # A PC came up on another node, it needs the state of our phones too
+        if present and room.mobiles:
+            await backplane.publish(unique_id, TARGET_PC, _snapshot(room))
+
+
+async def _on_backplane_members(unique_id: str, count: int):
+    room = registry.get(unique_id)
+    if room:
+        room.remote_nodes = count
+
+
+def _create_backplane() -> Backplane:
+    handlers = (_on_backplane_message, _on_backplane_presence, _on_backplane_members)
+    if settings.BUS_ADDRESS:
+        return BrokerBackplane(settings.BUS_ADDRESS, *handlers)
+    return InMemoryBackplane(*handlers)
+
+
+async def _expire_peer(peer: Peer):
+    # Same notifications as a disconnect, then the socket is closed. Its
+    # receive loop finds the peer already released and does nothing more
+    room = registry.get(peer.unique_id)
+    if room:
+        await _notify_departure(room, peer)
+    await _release(peer)
+    try:
+        await peer.websocket.close(code=IDLE_CLOSE_CODE)
+    except Exception:
+        pass
+
+
+async def _expire_parked(peer: Peer):
+    room = registry.get(peer.unique_id)
+    if room and room.mobiles.get(peer.device_id) is peer:
+        metrics.resume_expired.inc()
+        audit.record("park_expire", peer.unique_id, peer.device_id)
+        print("PARKED MOBILE EXPIRED")
+        await _notify_departure(room, peer)
+        await _release(peer)
+
+
+async def _expire_restored(unique_id: str, device_id: str, device_name: str):
+    # A phone from the old process's snapshot that never came back here
+    room = registry.get(unique_id)
+    if room and device_id not in room.mobiles:
+        audit.record("handoff_expire", unique_id, device_id)
+        print("RESTORED MOBILE EXPIRED")
+        await _send_to_pc(room, {
+            "type": "disconnect",
+            "device_id": device_id,
+            "device_name": device_name
+        })
+
+
+async def _drop_parked(room: Room, device_id: str):
+    peer = room.mobiles.get(device_id)
+    if peer and sessions.discard(peer):
+        await _release(peer)
+
+
+def _can_park(room: Room, peer: Peer, code: int) -> bool:
+    # Only a drop parks: closes from the phone itself (1000, 1001, and 1005
+    # for a close frame without a code) are a real leave
+    return (
+        sessions is not None and not draining and peer.resume_token is not None
+        and room.mobiles.get(peer.device_id) is peer and code not in (1000, 1001, 1005)
+    )
+
+
+def _reconnect_message(jitter_ms: int) -> str:
+    return json.dumps({
+        "type": "reconnect",
+        "reason": "restart",
+        "delay_ms": random.randint(0, jitter_ms) if jitter_ms > 0 else 0
+    }, separators=(",", ":"))
+
+
+async def drain():
+    """Hands the sessions of this process over to the next one and exits."""
+    global draining
+    if draining:
+        return
+    draining = True
+    print("DRAINING")
+    audit.record("drain", detail=f"{len(registry.rooms)} rooms")
+    try:
+        path = handoff.save(registry, _compact_state)
+        print(f"HANDOFF SAVED {path} ({len(registry.rooms)} rooms)")
+    except OSError as e:
+        # The clients still reconnect, just without their last state
+        print(f"HANDOFF NOT SAVED: {e}")
+
+    peers = []
+    for room in registry.rooms.values():
+        if room.pc:
+            peers.append(room.pc)
+        peers.extend(room.mobiles.values())
+    # Each client gets its own delay so the new process is not hit all at once
+    uplinks = set()
+    for peer in peers:
+        if isinstance(peer.outbox, MuxPort):
+            # Once per multiplexed uplink, not once per room on it
+            if peer.outbox.mailbox not in uplinks:
+                uplinks.add(peer.outbox.mailbox)
+                peer.outbox.mailbox.put_control(_reconnect_message(settings.DRAIN_JITTER_MS))
+        elif peer.is_pc:
+            peer.outbox.put_control(_reconnect_message(settings.DRAIN_JITTER_MS))
+        else:
+            peer.outbox.put(_reconnect_message(settings.DRAIN_JITTER_MS))
+
+    await asyncio.sleep(settings.DRAIN_GRACE)
+    for peer in peers:
+        try:
+            await peer.websocket.close(code=1012)  # service restart
+        except Exception:
+            pass
+    # uvicorn's own shutdown from here, it still listens for SIGINT
+    os.kill(os.getpid(), signal.SIGINT)
+
+
+def _install_drain_handler():
+    try:
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(drain()))
+    except (NotImplementedError, RuntimeError, ValueError):
+        # Windows, or not in the main thread: plain shutdown
+        pass
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global backplane, reaper, sessions
+    backplane = _create_backplane()
+    await backplane.connect()
+    if settings.BUS_ADDRESS:
+        print(f"BUS CONNECTED {settings.BUS_ADDRESS}")
+    reaper = Reaper(_expire_peer)
+    reaper.start()
+    admission.start()
+    audit.start()
+    tracer.start()
+    if settings.RESUME_GRACE > 0:
+        sessions = ResumeTable(settings.RESUME_GRACE, _expire_parked)
+        sessions.start()
+    handoff.start(_expire_restored)
+    # Replaces uvicorn's SIGTERM handler, installed just before the lifespan
+    _install_drain_handler()
+    yield
+    reaper.stop()
+    reaper = None
+    handoff.stop()
+    admission.stop()
+    if sessions:
+        sessions.stop()
+        sessions = None
+    await backplane.close()
+    backplane = None
+    audit.stop()
+    tracer.stop()
 
-app = FastAPI(title="Vpad Remote Server")
+
+app = FastAPI(title="Vpad Remote Server", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -12,119 +261,768 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-connections: Dict[str, Dict] = {}
+
+async def _join_room(unique_id: str) -> Room:
+    room, created = registry.open_room(unique_id)
+    if created:
+        handoff.poll()
+        room.remote_pc = await backplane.subscribe(unique_id)
+    return room
+
+
+# Hot path frames are forwarded as received. Only the leading "type" key is
+# peeked at, and controller_input gets the relay's device_id through a
+# pre-encoded envelope instead of a re-dump of the whole state. The phone's
+# text is pasted into that envelope, so it is parsed once to make sure it is
+# exactly one JSON object: anything else could close the envelope early and
+# bring its own device_id. Other mobile text gets the same check, on a /mux
+# uplink it is pasted into {"r":<index>,"m":<text>} the same way and could
+# otherwise bring its own "r".
+PONG = '{"type":"pong"}'
+
+
+def _peek_type(raw: str) -> Optional[str]:
+    if raw.startswith('{"type":'):
+        start = raw.find('"', 8) + 1
+        if start:
+            return raw[start:raw.find('"', start)]
+    try:
+        return json.loads(raw).get("type")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _valid_text(raw: str) -> bool:
+    try:
+        return isinstance(json.loads(raw), dict)
+    except ValueError:
+        return False
+
+
+def _valid_input_text(raw: str) -> bool:
+    # Its "data" is cached as the device's last state, an object or nothing
+    try:
+        message = json.loads(raw)
+    except ValueError:
+        return False
+    return isinstance(message, dict) and isinstance(message.get("data", {}), dict)
+
+
+def _input_envelope(device_id: str) -> str:
+    # The PC receives {"type":"controller_input","device_id":...,"frame":<raw>}
+    return '{"type":"controller_input","device_id":%s,"frame":' % json.dumps(device_id)
+
+
+async def _receive_raw(websocket: WebSocket):
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    text = message.get("text")
+    return text if text is not None else message["bytes"]
+
+
+def _transcode_input(data: bytes) -> Optional[str]:
+    # Binary input for a PC that only negotiated JSON
+    device_id, payload = split_device_tag(data)
+    frame = decode_frame(payload)
+    if frame is None:
+        return None
+    return json.dumps({
+        "type": "controller_input",
+        "device_id": device_id,
+        "data": frame.to_state()
+    }, separators=(",", ":"))
+
+
+def _mobile_outboxes(room: Room):
+    return [peer.outbox for peer in room.mobiles.values()]
+
+
+def _deliver_to_pc(room: Room, data):
+    mailbox = room.pc.outbox
+    if data.startswith('{"type":"disconnect"'):
+        # Pending input of a device that just left is stale
+        mailbox.discard_input(json.loads(data).get("device_id"))
+    mailbox.put_control(data)
+
+
+def _valid_tagged_frame(data: bytes) -> bool:
+    # Device tag and exactly one bin1 frame: a batch is these back to back
+    # and split_tagged_frames only finds its way through whole ones
+    if not data:
+        return False
+    start = 1 + data[0]
+    return len(data) == start + FRAME_SIZE and data[start] == FRAME_VERSION
+
+
+def _deliver_input(room: Room, device_id: str, data):
+    # Everything here may end up in one batch with other devices' inputs,
+    # one bad item would take the whole batch with it. Local input was
+    # checked on arrival, the tagged frames are checked again (cheap) for
+    # what comes over the backplane
+    if isinstance(data, bytes) and not _valid_tagged_frame(data):
+        metrics.invalid_inputs.inc()
+        return
+    if isinstance(data, bytes) and room.pc_format != FORMAT_BIN1:
+        data = _transcode_input(data)
+        if data is None:
+            return
+    room.pc.outbox.put_input(device_id, data)
+
+
+async def _forward_to_pc(room: Room, data):
+    if room.pc:
+        _deliver_to_pc(room, data)
+    elif room.remote_pc:
+        await backplane.publish(room.unique_id, TARGET_PC, data)
+
+
+async def _forward_input_to_pc(room: Room, device_id: str, data):
+    if room.pc:
+        _deliver_input(room, device_id, data)
+    elif room.remote_pc:
+        await backplane.publish(room.unique_id, TARGET_INPUT, data, prefix=device_tag(device_id))
+
+
+async def _forward_to_mobiles(room: Room, data):
+    fanout(_mobile_outboxes(room), data)
+    # Zero hop when nobody else is in the room
+    if room.remote_nodes:
+        await backplane.publish(room.unique_id, TARGET_MOBILE, data)
+
+
+def _end_trace(trace: Trace, room: Room, peer: Peer):
+    trace.mark("forward")
+    if not peer.is_pc:
+        if peer.held is not None and trace.kind in ("controller_input", "binary"):
+            trace.note = "held"  # by the rate limiter, forwarded later
+        elif room.pc:
+            # Finished by the mailbox once the frame is written
+            room.pc.outbox.trace(trace)
+            return
+        elif room.remote_pc:
+            trace.note = "backplane"
+    tracer.finish(trace)
+
+
+async def _send_to_pc(room: Room, message: dict):
+    await _forward_to_pc(room, json.dumps(message, separators=(",", ":")))
+
+
+async def _send_to_mobiles(room: Room, message: dict):
+    await _forward_to_mobiles(room, json.dumps(message, separators=(",", ":")))
+
+
+async def _attach_pc(room: Room, peer: Peer):
+    # peer.outbox is ready, its first frame is the snapshot of the room
+    registry.add_pc(room, peer)
+    if room.mobiles:
+        peer.outbox.put_control(_snapshot(room))
+    await backplane.pc_up(room.unique_id)
+    # Notify all mobile devices that PC is connected
+    await _send_to_mobiles(room, {
+        "type": "pc_connected",
+        "unique_id": room.unique_id
+    })
+
+
+# Last known state: every mobile keeps a reference to its newest input (no
+# work on the hot path). A PC that (re)connects gets one snapshot with all
+# phones of the room so its virtual pads resume at once. The states are
+# compacted to ControllerFrames when a snapshot is built, and go away with
+# their peer and room.
+
+def _compact_state(peer: Peer) -> Optional[ControllerFrame]:
+    state = peer.last_input
+    if state is None or isinstance(state, ControllerFrame):
+        return state
+    if isinstance(state, bytes):
+        frame = decode_frame(state)
+    else:
+        try:
+            frame = ControllerFrame.from_state(json.loads(state).get("data") or {})
+        except (ValueError, AttributeError, TypeError):
+            # Shaped right but not numbers where numbers go, e.g. "dx": [1]
+            frame = None
+    peer.last_input = frame
+    return frame
+
+
+def _snapshot(room: Room) -> str:
+    devices = []
+    for peer in room.mobiles.values():
+        frame = _compact_state(peer)
+        devices.append({
+            "device_id": peer.device_id,
+            "device_name": peer.device_name,
+            "data": frame.to_state() if frame else None
+        })
+    return json.dumps({"type": "snapshot", "devices": devices}, separators=(",", ":"))
+
+
+async def _notify_departure(room: Room, peer: Peer):
+    # Only for the registered peer, a replaced one leaves silently. While
+    # draining nobody leaves for good, the pads stay up for the reconnect
+    if draining:
+        return
+    if peer.is_pc and room.pc is peer:
+        print("PC DISCONNECTED")
+        # Notify all mobile devices about PC disconnect
+        await _send_to_mobiles(room, {
+            "type": "pc_disconnected",
+            "message": "PC has disconnected"
+        })
+    elif not peer.is_pc and room.mobiles.get(peer.device_id) is peer:
+        # Notify PC about mobile device disconnect
+        print("MOBILE DISCONNECTED")
+        await _send_to_pc(room, {
+            "type": "disconnect",
+            "device_id": peer.device_id,
+            "device_name": peer.device_name
+        })
+
+
+async def _release(peer: Peer):
+    detached, room_closed = registry.remove(peer)
+    if detached:
+        print("REMOVE PC" if peer.is_pc else "REMOVE MOBILE")
+        if peer.is_pc:
+            await backplane.pc_down(peer.unique_id)
+    if room_closed:
+        print("REMOVE ALL")
+        await backplane.unsubscribe(peer.unique_id)
+
 
 @app.get("/")
 async def root():
     print("Hey bro")
     return {"status": "running"}
 
+@app.get("/stats")
+async def stats():
+    return {
+        "rooms": len(registry.rooms),
+        "pcs": registry.pc_count,
+        "mobiles": registry.mobile_count,
+        "parked": len(sessions.parked) if sessions else 0,
+        "messages": registry.messages,
+        "bytes": registry.bytes,
+        "messages_per_second": registry.message_rate(),
+        "fanout": {
+            "sent": fanout_stats.sent,
+            "dropped": fanout_stats.dropped,
+            "slow_disconnects": fanout_stats.slow_disconnects,
+            "avg_latency_ms": (
+                metrics.forward_latency_mobile.sum / metrics.forward_latency_mobile.count * 1000
+                if metrics.forward_latency_mobile.count else 0.0
+            )
+        },
+        "pc_mailbox": {
+            "inputs": mailbox_stats.inputs,
+            "superseded": mailbox_stats.superseded,
+            "controls": mailbox_stats.controls
+        }
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return metrics.render(registry, fanout_stats, mailbox_stats, audit, admission)
+
+@app.get("/ready")
+async def ready():
+    # For load balancers: 503 while this process would refuse new connections
+    reason = "draining" if draining else admission.refusal()
+    body = {
+        "ready": reason is None,
+        "rooms": len(registry.rooms),
+        "connections": admission.connections,
+        "loop_lag_ms": round(admission.lag * 1000, 2),
+        "rss_mb": round(admission.rss / (1024 * 1024), 1)
+    }
+    if reason is None:
+        return body
+    body["reason"] = reason
+    return JSONResponse(body, status_code=503, headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)})
+
+@app.get("/trace")
+async def trace_status():
+    return {
+        "active": tracer.active,
+        "sample": tracer.sample,
+        "rooms": sorted(tracer.rooms),
+        "traced": tracer.traced,
+        "dropped": tracer.log.dropped,
+        "file": tracer.log.path
+    }
+
+def _trace_denied(request: Request) -> Optional[JSONResponse]:
+    # Switching tracing on writes every message of a room to disk, so only
+    # whoever holds TRACE_TOKEN may do it
+    if not settings.TRACE_TOKEN:
+        return JSONResponse({"detail": "trace control is disabled"}, status_code=403)
+    expected = f"Bearer {settings.TRACE_TOKEN}".encode()
+    given = request.headers.get("authorization", "").encode()
+    if not hmac.compare_digest(given, expected):
+        return JSONResponse({"detail": "unauthorized"}, status_code=401,
+                            headers={"WWW-Authenticate": "Bearer"})
+    return None
+
+@app.post("/trace/{unique_id}")
+async def trace_room(unique_id: str, request: Request):
+    denied = _trace_denied(request)
+    if denied:
+        return denied
+    # Every message of this room, in this process
+    tracer.enable(unique_id)
+    return await trace_status()
+
+@app.delete("/trace/{unique_id}")
+async def untrace_room(unique_id: str, request: Request):
+    denied = _trace_denied(request)
+    if denied:
+        return denied
+    tracer.disable(unique_id)
+    return await trace_status()
+
+async def _http_response(websocket: WebSocket, status: int, headers: list) -> bool:
+    # Answers the handshake with a plain HTTP response instead of the upgrade,
+    # when the server supports it. Starlette has no API for it yet, so the
+    # ASGI messages go out raw
+    if "websocket.http.response" not in websocket.scope.get("extensions", {}):
+        return False
+    await websocket._send({
+        "type": "websocket.http.response.start",
+        "status": status,
+        "headers": headers + [(b"content-length", b"0")]
+    })
+    await websocket._send({"type": "websocket.http.response.body", "body": b""})
+    return True
+
+
+async def _redirect(websocket: WebSocket, owner: str, unique_id: str):
+    url = ws_url(owner, f"/ws/{unique_id}")
+    # 307 instead of the upgrade, websocket clients follow it on their own.
+    # Clients that cannot (dart:io, the phones) ask for the message instead
+    if websocket.query_params.get("redirect") != "message" and await _http_response(
+        websocket, 307, [(b"location", url.encode())]
+    ):
+        return
+    await websocket.accept()
+    await websocket.send_text(json.dumps({"type": "redirect", "url": url}))
+    await websocket.close(code=REDIRECT_CLOSE_CODE)
+
+
+async def _refuse_draining(websocket: WebSocket):
+    # A draining process takes nobody new, the next process does
+    retry_after = str(max(1, settings.DRAIN_JITTER_MS // 1000)).encode()
+    if not await _http_response(websocket, 503, [(b"retry-after", retry_after)]):
+        await websocket.accept()
+        await websocket.send_text(_reconnect_message(settings.DRAIN_JITTER_MS))
+        await websocket.close(code=1013)  # try again later
+
+
+async def _refuse_overloaded(websocket: WebSocket, reason: str, unique_id: str = ""):
+    # Load shedding: the peers already here keep their latency, the newcomer
+    # tries again later (or elsewhere, behind a load balancer)
+    audit.record("refuse", unique_id, detail=reason)
+    retry_after = settings.ADMISSION_RETRY_AFTER
+    if not await _http_response(websocket, 503, [(b"retry-after", str(retry_after).encode())]):
+        await websocket.accept()
+        await websocket.send_json({"type": "overloaded", "reason": reason, "retry_after_ms": retry_after * 1000})
+        await websocket.close(code=1013)  # try again later
+
+
 @app.websocket("/ws/{unique_id}")
 async def websocket_endpoint(websocket: WebSocket, unique_id: str):
+    # Rooms live on the node that owns them, send everyone else there
+    if ring:
+        owner = ring.owner(unique_id)
+        if owner != settings.RELAY_SELF:
+            metrics.redirects.inc()
+            audit.record("redirect", unique_id, detail=owner)
+            await _redirect(websocket, owner, unique_id)
+            return
+
+    if draining:
+        await _refuse_draining(websocket)
+        return
+
+    reason = admission.admit(new_room=registry.get(unique_id) is None)
+    if reason:
+        await _refuse_overloaded(websocket, reason, unique_id)
+        return
+
     await websocket.accept()
-    device_id = None
-    device_name = None
+    admission.connections += 1
+    peer: Optional[Peer] = None
+    room: Optional[Room] = None
+    parked = False
     
     try:
         # Initial connection data
-        data = await websocket.receive_json()
+        raw = await _receive_raw(websocket)
+        if len(raw) > settings.MAX_FRAME_SIZE:
+            metrics.oversize_frames.inc()
+            audit.record("oversize", unique_id, detail=f"handshake {len(raw)}")
+            await websocket.close(code=1009)
+            return
+        data = json.loads(raw)
         device_type = data.get("device_type")
         device_id = data.get("device_id")
         device_name = data.get("device_name", "Unknown Device")
-        
+        if device_type != "pc" and (
+            not isinstance(device_id, (str, type(None))) or len((device_id or "").encode()) > MAX_DEVICE_ID
+        ):
+            # Its binary frames are tagged with the device_id, which has to fit
+            audit.record("bad_handshake", unique_id, detail="device_id")
+            await websocket.close(code=1008)
+            return
+
+        # Frame format negotiation, clients that offer nothing stay on JSON
+        offered_formats = data.get("formats")
+        frame_format = negotiate(offered_formats)
+        batching = bool(data.get("batch")) and settings.BATCH_INPUTS and device_type == "pc"
+
         # Initialize connection structure if needed
-        if unique_id not in connections:
-            connections[unique_id] = {
-                "pc": None,
-                "mobile": {}
-            }
+        room = await _join_room(unique_id)
+        peer = Peer(unique_id, device_id, device_name, device_type, websocket, frame_format)
+
+        # Mobiles coming back with their token take their old slot over: a
+        # parked one, or one whose dead socket was not noticed yet
+        resumed: Optional[Peer] = None
+        if sessions and not peer.is_pc:
+            token = data.get("resume")
+            if token:
+                resumed = sessions.take(token, unique_id, device_id)
+                current = room.mobiles.get(device_id)
+                if resumed is None and current is not None and current.resume_token == token:
+                    resumed = current
+            peer.resume_token = resumed.resume_token if resumed else new_token()
+
+        if offered_formats:
+            hello = {"type": "hello", "format": frame_format, "batch": batching}
+            if peer.resume_token:
+                hello["resume"] = peer.resume_token
+                hello["resumed"] = resumed is not None
+            await websocket.send_json(hello)
             
         # Handle PC connection
-        if device_type == "pc":
+        if peer.is_pc:
             print("PC CONNECTED...")
-            connections[unique_id]["pc"] = websocket
-            # Notify all mobile devices that PC is connected
-            for mobile_ws in connections[unique_id]["mobile"].values():
-                await mobile_ws.send_json({
-                    "type": "pc_connected",
-                    "unique_id": unique_id
-                })
+            audit.record("pc_connect", unique_id, device_id, frame_format)
+            peer.outbox = PcMailbox(websocket, settings.BATCH_WINDOW_MS / 1000 if batching else None)
+            await _attach_pc(room, peer)
         # Handle mobile connection
         else:
             # Send error if no PC connected, but continue with normal flow
-            if not connections[unique_id]["pc"]:
+            if not room.pc and not room.remote_pc:
                 await websocket.send_json({
                     "type": "error",
                     "message": "No PC connected. Please connect to PC first."
                 })
                 
-            # Send connect message to PC if it exists
-            if connections[unique_id]["pc"]:
-                await connections[unique_id]["pc"].send_json({
+            if resumed is not None:
+                # Same slot as before, the PC's pad stays as it is
+                print("MOBILE RESUMED")
+                metrics.resumed.inc()
+                audit.record("resume", unique_id, device_id)
+                peer.bucket = resumed.bucket
+                peer.last_input = resumed.last_input
+            else:
+                audit.record("mobile_connect", unique_id, device_id, frame_format)
+                # Send connect message to PC if it exists
+                await _send_to_pc(room, {
                     "type": "connect",
                     "device_id": device_id,
                     "device_name": device_name
                 })
-            connections[unique_id]["mobile"][device_id] = websocket
+            peer.outbox = Outbox(websocket)
+            registry.add_mobile(room, peer)
+            # Back from a relay restart: the state the old process knew
+            if handoff.restored and resumed is None:
+                peer.last_input = handoff.take(unique_id, device_id)
+
+        if reaper:
+            reaper.watch(peer)
+
+        input_envelope = _input_envelope(device_id)
+        input_tag = device_tag(device_id)
+        traffic_in = metrics.incoming["pc" if peer.is_pc else "mobile"]
 
         while True:
-            data = await websocket.receive_json()
+            raw = await _receive_raw(websocket)
+            trace = tracer.begin(unique_id, device_id) if tracer.active else None
+            if len(raw) > settings.MAX_FRAME_SIZE:
+                metrics.oversize_frames.inc()
+                audit.record("oversize", unique_id, device_id, len(raw))
+                continue
+            registry.count_message(room, peer, len(raw))
+
+            # Binary frames: controller input from mobiles, opaque from the PC
+            if isinstance(raw, bytes):
+                traffic_in["binary"].add(len(raw))
+                if trace:
+                    trace.kind, trace.size = "binary", len(raw)
+                    trace.mark("parse")
+                if peer.is_pc:
+                    await _forward_to_mobiles(room, raw)
+                elif len(raw) != FRAME_SIZE or raw[0] != FRAME_VERSION:
+                    # The PC splits tagged frames by FRAME_SIZE, anything but
+                    # exactly one frame would shift the next device's tag
+                    metrics.invalid_inputs.inc()
+                    if trace:
+                        trace.note = "invalid"
+                        trace.mark("validate")
+                        tracer.finish(trace)
+                    continue
+                else:
+                    peer.last_input = raw
+                    await limits.submit_input(room, peer, input_tag + raw, _forward_input_to_pc)
+                if trace:
+                    _end_trace(trace, room, peer)
+                continue
+
+            message_type = _peek_type(raw)
+            traffic_in[metrics.message_type_key(message_type)].add(len(raw))
+            if trace:
+                trace.kind, trace.size = message_type or "other", len(raw)
+                trace.mark("parse")
+
+            # Mobiles are rate limited, over budget input is coalesced below
+            # and anything else dropped
+            if not peer.is_pc and message_type != "controller_input" and not limits.admit_message(room, peer):
+                if trace:
+                    trace.note = "dropped"
+                    trace.mark("limit")
+                    tracer.finish(trace)
+                continue
             
             # Handle ping/pong
-            if data.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
+            if message_type == "ping":
+                await websocket.send_text(PONG)
+                if trace:
+                    trace.mark("pong")
+                    tracer.finish(trace)
                 continue
                 
             # Handle messages from PC
-            if device_type == "pc":
+            if peer.is_pc:
                 # Broadcast to all mobile devices
-                for mobile_ws in connections[unique_id]["mobile"].values():
-                    await mobile_ws.send_json(data)
+                await _forward_to_mobiles(room, raw)
                     
             # Handle messages from mobile
             else:
-                if connections[unique_id]["pc"]:
-                    if data.get("type") == "controller_input":
-                        # Forward controller input to PC
-                        await connections[unique_id]["pc"].send_json({
-                            "type": "controller_input",
-                            "device_id": device_id,
-                            "data": data.get("data", {})
-                        })
-                    else:
-                        # Forward other messages as is
-                        await connections[unique_id]["pc"].send_json(data)
+                if message_type == "controller_input":
+                    if not _valid_input_text(raw):
+                        metrics.invalid_inputs.inc()
+                        if trace:
+                            trace.note = "invalid"
+                            trace.mark("validate")
+                            tracer.finish(trace)
+                        continue
+                    peer.last_input = raw
+                    # Forward controller input to PC
+                    await limits.submit_input(room, peer, input_envelope + raw + "}", _forward_input_to_pc)
+                elif not _valid_text(raw):
+                    metrics.invalid_inputs.inc()
+                    if trace:
+                        trace.note = "invalid"
+                        trace.mark("validate")
+                        tracer.finish(trace)
+                    continue
+                else:
+                    # Forward other messages as is
+                    await _forward_to_pc(room, raw)
+
+            if trace:
+                _end_trace(trace, room, peer)
                     
-    except WebSocketDisconnect:
-        if device_type == "pc":
-            print("PC DISCONNECTED")
-            # Notify all mobile devices about PC disconnect
-            for mobile_ws in connections[unique_id]["mobile"].values():
-                await mobile_ws.send_json({
-                    "type": "pc_disconnected",
-                    "message": "PC has disconnected"
-                })
-        else:
-            # Notify PC about mobile device disconnect
-            print("MOBILE DISCONNECTED")
-            if connections[unique_id]["pc"]:
-                await connections[unique_id]["pc"].send_json({
-                    "type": "disconnect",
-                    "device_id": device_id,
-                    "device_name": device_name
-                })
+    except WebSocketDisconnect as e:
+        if peer:
+            if _can_park(room, peer, e.code):
+                # Keeps its slot until it resumes or RESUME_GRACE runs out
+                peer.outbox.close()
+                sessions.park(peer)
+                parked = True
+                audit.record("park", unique_id, peer.device_id, e.code)
+            else:
+                audit.record("disconnect", unique_id, peer.device_id, e.code)
+                await _notify_departure(room, peer)
+
+    except Exception as e:
+        audit.record("error", unique_id, peer.device_id if peer else "", f"{type(e).__name__}: {e}")
+        raise
         
     finally:
-        if unique_id in connections:
-            # Clean up connections
-            if device_type == "pc":
-                print("REMOVE PC")
-                connections[unique_id]["pc"] = None
-            elif device_id and device_id in connections[unique_id]["mobile"]:
-                print("REMOVE MOBILE")
-                connections[unique_id]["mobile"].pop(device_id)
-            
-            # Remove unique_id if no connections left
-            if not connections[unique_id]["pc"] and not connections[unique_id]["mobile"]:
-                print("REMOVE ALL")
-                connections.pop(unique_id)
\ No newline at end of file
+        admission.connections -= 1
+        if peer and not parked:
+            await _release(peer)
+
+
+# Multiplexed PC uplink: one socket for every room a PC hosts. The handshake
+# lists the rooms ("rooms": [unique_id, ...]), more can be joined and left
+# later with {"type":"join"|"leave","room":unique_id}. Each joined room gets
+# a small index, announced with {"type":"joined","room":...,"index":n}, and
+# every frame of that room carries it (see MuxPort): the PC sends
+# {"r":<index>,"m":<message>} and binary frames with the index byte in front.
+# Everything else works as for a PC on /ws/{unique_id}.
+
+class MuxUplink:
+    def __init__(self, websocket: WebSocket, device_id: str, device_name: str, frame_format: str,
+                 mailbox: PcMailbox):
+        self.websocket = websocket
+        self.device_id = device_id
+        self.device_name = device_name
+        self.frame_format = frame_format
+        self.mailbox = mailbox
+        # index -> (room, peer)
+        self.ports: Dict[int, Tuple[Room, Peer]] = {}
+
+    def _control(self, message: dict):
+        self.mailbox.put_control(json.dumps(message, separators=(",", ":")))
+
+    def _free_index(self) -> Optional[int]:
+        for index in range(MAX_MUX_ROOMS):
+            if index not in self.ports:
+                return index
+        return None
+
+    async def join(self, unique_id):
+        if not isinstance(unique_id, str) or not unique_id:
+            return
+        if any(room.unique_id == unique_id for room, _ in self.ports.values()):
+            return
+        # Without a backplane between the nodes a room only works on its owner
+        if ring and not settings.BUS_ADDRESS:
+            owner = ring.owner(unique_id)
+            if owner != settings.RELAY_SELF:
+                self._control({"type": "join_error", "room": unique_id, "url": ws_url(owner, f"/ws/{unique_id}")})
+                return
+        index = self._free_index()
+        if index is None:
+            self._control({"type": "join_error", "room": unique_id, "message": "Too many rooms"})
+            return
+        # The uplink itself was admitted already, only the room count applies
+        if registry.get(unique_id) is None and admission.rooms_full():
+            metrics.admission_rejected["rooms"].inc()
+            audit.record("refuse", unique_id, self.device_id, "rooms")
+            self._control({"type": "join_error", "room": unique_id, "message": "Room limit",
+                           "retry_after_ms": settings.ADMISSION_RETRY_AFTER * 1000})
+            return
+
+        room = await _join_room(unique_id)
+        peer = Peer(unique_id, self.device_id, self.device_name, "pc", self.websocket, self.frame_format)
+        peer.outbox = MuxPort(self.mailbox, index)
+        self.ports[index] = (room, peer)
+        self._control({"type": "joined", "room": unique_id, "index": index})
+        print(f"PC CONNECTED... (mux {index})")
+        audit.record("pc_connect", unique_id, self.device_id, f"{self.frame_format} mux {index}")
+        await _attach_pc(room, peer)
+
+    async def leave(self, unique_id, notify: bool = True):
+        for index, (room, peer) in list(self.ports.items()):
+            if room.unique_id == unique_id:
+                del self.ports[index]
+                if notify:
+                    audit.record("disconnect", unique_id, self.device_id, "mux leave")
+                    await _notify_departure(room, peer)
+                await _release(peer)
+                self._control({"type": "left", "room": unique_id, "index": index})
+                return
+
+    async def close(self, code: Optional[int]):
+        for room, peer in list(self.ports.values()):
+            if code is not None:
+                audit.record("disconnect", room.unique_id, self.device_id, code)
+                await _notify_departure(room, peer)
+            await _release(peer)
+        self.ports.clear()
+        self.mailbox.close()
+
+    def port(self, index) -> Optional[Tuple[Room, Peer]]:
+        return self.ports.get(index)
+
+
+@app.websocket("/mux")
+async def mux_endpoint(websocket: WebSocket):
+    if draining:
+        await _refuse_draining(websocket)
+        return
+
+    # The rooms are checked one by one as the uplink joins them
+    reason = admission.admit(new_room=False)
+    if reason:
+        await _refuse_overloaded(websocket, reason)
+        return
+
+    await websocket.accept()
+    admission.connections += 1
+    uplink: Optional[MuxUplink] = None
+    code = None
+    try:
+        raw = await _receive_raw(websocket)
+        if len(raw) > settings.MAX_FRAME_SIZE:
+            metrics.oversize_frames.inc()
+            audit.record("oversize", detail=f"mux handshake {len(raw)}")
+            await websocket.close(code=1009)
+            return
+        data = json.loads(raw)
+        frame_format = negotiate(data.get("formats"))
+        batching = bool(data.get("batch")) and settings.BATCH_INPUTS
+        await websocket.send_json({"type": "hello", "format": frame_format, "batch": batching, "mux": True})
+        mailbox = PcMailbox(websocket, settings.BATCH_WINDOW_MS / 1000 if batching else None)
+        uplink = MuxUplink(websocket, data.get("device_id"), data.get("device_name", "Unknown Device"),
+                           frame_format, mailbox)
+        for unique_id in data.get("rooms") or []:
+            await uplink.join(unique_id)
+
+        traffic_in = metrics.incoming["pc"]
+        while True:
+            raw = await _receive_raw(websocket)
+            if len(raw) > settings.MAX_FRAME_SIZE:
+                metrics.oversize_frames.inc()
+                audit.record("oversize", device_id=uplink.device_id, detail=len(raw))
+                continue
+
+            # Binary frames for the mobiles of one room, index byte first
+            if isinstance(raw, bytes):
+                traffic_in["binary"].add(len(raw))
+                port = uplink.port(raw[0]) if raw else None
+                if port:
+                    registry.count_message(port[0], port[1], len(raw))
+                    await _forward_to_mobiles(port[0], raw[1:])
+                continue
+
+            if raw.startswith('{"r":'):
+                traffic_in["other"].add(len(raw))
+                try:
+                    envelope = json.loads(raw)
+                    port = uplink.port(envelope.get("r"))
+                    message = envelope["m"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if port:
+                    registry.count_message(port[0], port[1], len(raw))
+                    await _forward_to_mobiles(port[0], json.dumps(message, separators=(",", ":")))
+                continue
+
+            message_type = _peek_type(raw)
+            traffic_in[metrics.message_type_key(message_type)].add(len(raw))
+            if message_type == "ping":
+                await websocket.send_text(PONG)
+            elif message_type == "join":
+                await uplink.join(json.loads(raw).get("room"))
+            elif message_type == "leave":
+                await uplink.leave(json.loads(raw).get("room"))
+
+    except WebSocketDisconnect as e:
+        code = e.code
+
+    except Exception as e:
+        audit.record("error", device_id=uplink.device_id if uplink else "", detail=f"{type(e).__name__}: {e}")
+        raise
+
+    finally:
+        admission.connections -= 1
+        if uplink:
+            await uplink.close(code)
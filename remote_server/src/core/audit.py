@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from src.core.config import settings
+
+# Audit log of room lifecycle events (connects, disconnects, evictions,
+# rate limit hits, errors) for digging into production incidents.
+#
+# record() is the only thing the event loop pays for: one tuple appended to a
+# bounded deque, or a counter bump when the deque is full. Formatting and file
+# I/O happen in a writer thread that wakes every AUDIT_FLUSH_MS (or as soon
+# as the queue is half full), writes what piled up as one batch and rotates
+# the file at AUDIT_MAX_BYTES. Lines are tab separated:
+#
+#   <unix ms>\t<event>\t<unique_id>\t<device_id>\t<detail>
+
+# Fields are never allowed to break a line
+_CLEAN = str.maketrans("\t\n\r", "   ")
+
+
+def _clean(value) -> str:
+    text = value if isinstance(value, str) else ("" if value is None else str(value))
+    return text.translate(_CLEAN) if "\t" in text or "\n" in text or "\r" in text else text
+
+
+class AuditLog:
+    def __init__(self, path: str, maxsize: int = 10000, flush_interval: float = 0.2,
+                 max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.path = path
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = deque()
+        self._wake_at = max(1, maxsize // 2)
+        # dropped is counted by the event loop (queue full), the rest by the
+        # writer thread, /metrics only reads them
+        self.dropped = 0
+        self.failed = 0
+        self.errors = 0
+        self.written = 0
+        self.bytes_written = 0
+        self.batches = 0
+        self._file = None
+        self._size = 0
+        self._stop = False
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def record(self, event: str, unique_id: str = "", device_id: str = "", detail: str = ""):
+        if not self.path:
+            return
+        queue = self.queue
+        if len(queue) < self.maxsize:
+            queue.append((time.time(), event, unique_id, device_id, detail))
+            if len(queue) == self._wake_at:
+                self._wakeup.set()
+        else:
+            self.dropped += 1
+
+    def start(self):
+        if not self.path or self._thread:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._open()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Writes what is still queued before returning
+        if not self._thread:
+            return
+        self._stop = True
+        self._wakeup.set()
+        self._thread.join(5)
+        self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def _format(self, item) -> str:
+        at, event, unique_id, device_id, detail = item
+        return f"{int(at * 1000)}\t{event}\t{_clean(unique_id)}\t{_clean(device_id)}\t{_clean(detail)}"
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.unlink(self.path)
+        self._open()
+
+    def _run(self):
+        # The writer outlives any error: a dead thread would leave record()
+        # filling the queue with nothing reported
+        while not self._stop:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._safe_flush()
+        self._safe_flush()
+
+    def _safe_flush(self):
+        try:
+            self._flush()
+        except Exception as e:
+            self.errors += 1
+            print(f"Audit log flush failed: {type(e).__name__}: {e}")
+
+    def _flush(self):
+        queue = self.queue
+        count = len(queue)
+        if not count:
+            return
+        format = self._format
+        lines = [format(queue.popleft()) for _ in range(count)]
+        chunk = ("\n".join(lines) + "\n").encode("utf-8", "replace")
+        try:
+            if self._file is None or self._file.closed:
+                # A rotation that failed halfway, opened again here
+                self._open()
+            self._file.write(chunk)
+            self._file.flush()
+        except OSError as e:
+            print(f"Audit log write failed: {e}")
+            self.errors += 1
+            self.failed += count
+            return
+        self._size += len(chunk)
+        self.written += count
+        self.bytes_written += len(chunk)
+        self.batches += 1
+        if self.max_bytes and self._size >= self.max_bytes:
+            try:
+                self._rotate()
+            except OSError as e:
+                # Logging carries on, in whichever file is open now
+                print(f"Audit log rotation failed: {e}")
+                self.errors += 1
+
+
+def _log_path(path: str) -> str:
+    # Pre-forked workers each write their own file, rotation is per process
+    if path and settings.WORKERS > 1:
+        root, extension = os.path.splitext(path)
+        path = f"{root}-{os.getpid()}{extension}"
+    return path
+
+
+audit = AuditLog(
+    _log_path(settings.AUDIT_LOG),
+    maxsize=settings.AUDIT_QUEUE,
+    flush_interval=settings.AUDIT_FLUSH_MS / 1000,
+    max_bytes=settings.AUDIT_MAX_BYTES,
+    backups=settings.AUDIT_BACKUPS
+)
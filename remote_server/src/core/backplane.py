@@ -0,0 +1,138 @@
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+# Room routing between relay nodes.
+#
+# Every node keeps the rooms of its own sockets in its Registry. When the PC
+# and the mobiles of one unique_id land on different nodes (worker processes
+# of one host, or replicas behind a load balancer), frames for the peers that
+# are not local go through the backplane to the other nodes subscribed to the
+# same room.
+#
+# Peers on the same node never touch the backplane: the app delivers to them
+# directly and only publishes when the backplane reported another node in the
+# room (on_members) or the room's PC on another node (on_presence).
+#
+# Implementations:
+#   InMemoryBackplane  nodes living in one process (single process relay)
+#   BrokerBackplane    nodes connected to a BusHub broker over a unix or TCP
+#                      socket, see src/core/bus.py and broker.py
+
+TARGET_PC = b"p"
+TARGET_MOBILE = b"m"
+# controller_input for the PC, payload starts with the sender's device tag
+TARGET_INPUT = b"i"
+
+KIND_TEXT = b"t"
+KIND_BYTES = b"b"
+
+# on_message(unique_id, target, kind, data): data is always bytes
+MessageHandler = Callable[[str, bytes, bytes, bytes], Awaitable[None]]
+# on_presence(unique_id, present): the room's PC is connected on another node
+PresenceHandler = Callable[[str, bool], Awaitable[None]]
+# on_members(unique_id, count): how many other nodes are subscribed to the room
+MembersHandler = Callable[[str, int], Awaitable[None]]
+
+
+async def _ignore(*args):
+    pass
+
+
+class Backplane:
+    def __init__(self, on_message: MessageHandler, on_presence: PresenceHandler,
+                 on_members: Optional[MembersHandler] = None):
+        self.on_message = on_message
+        self.on_presence = on_presence
+        self.on_members = on_members or _ignore
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def subscribe(self, room: str) -> bool:
+        # Returns whether the room's PC is connected on another node
+        raise NotImplementedError
+
+    async def unsubscribe(self, room: str):
+        raise NotImplementedError
+
+    async def pc_up(self, room: str):
+        raise NotImplementedError
+
+    async def pc_down(self, room: str):
+        raise NotImplementedError
+
+    async def publish(self, room: str, target: bytes, data, prefix: bytes = b""):
+        raise NotImplementedError
+
+
+class InMemoryHub:
+    def __init__(self):
+        self.subscribers: Dict[str, Set["InMemoryBackplane"]] = {}
+        self.pc_owner: Dict[str, "InMemoryBackplane"] = {}
+
+
+class InMemoryBackplane(Backplane):
+    """Backplane for nodes sharing one process (and one event loop).
+
+    Nodes created with the same hub see each other, delivery is a direct call
+    of the other node's handlers. With a private hub this is the single
+    process relay: there is never another member, so nothing is published.
+    """
+
+    def __init__(self, on_message: MessageHandler, on_presence: PresenceHandler,
+                 on_members: Optional[MembersHandler] = None, hub: Optional[InMemoryHub] = None):
+        super().__init__(on_message, on_presence, on_members)
+        self.hub = hub or InMemoryHub()
+        self.rooms: Set[str] = set()
+
+    def _others(self, room: str):
+        return [node for node in self.hub.subscribers.get(room, ()) if node is not self]
+
+    async def _announce_members(self, room: str):
+        nodes = self.hub.subscribers.get(room, ())
+        for node in list(nodes):
+            await node.on_members(room, len(nodes) - 1)
+
+    async def close(self):
+        for room in list(self.rooms):
+            await self.unsubscribe(room)
+
+    async def subscribe(self, room: str) -> bool:
+        self.rooms.add(room)
+        self.hub.subscribers.setdefault(room, set()).add(self)
+        await self._announce_members(room)
+        owner = self.hub.pc_owner.get(room)
+        return owner is not None and owner is not self
+
+    async def unsubscribe(self, room: str):
+        self.rooms.discard(room)
+        await self.pc_down(room)
+        nodes = self.hub.subscribers.get(room)
+        if nodes is None:
+            return
+        nodes.discard(self)
+        if nodes:
+            await self._announce_members(room)
+        else:
+            self.hub.subscribers.pop(room)
+
+    async def pc_up(self, room: str):
+        self.hub.pc_owner[room] = self
+        for node in self._others(room):
+            await node.on_presence(room, True)
+
+    async def pc_down(self, room: str):
+        if self.hub.pc_owner.get(room) is self:
+            self.hub.pc_owner.pop(room)
+            for node in self._others(room):
+                await node.on_presence(room, False)
+
+    async def publish(self, room: str, target: bytes, data, prefix: bytes = b""):
+        if isinstance(data, str):
+            kind, payload = KIND_TEXT, prefix + data.encode()
+        else:
+            kind, payload = KIND_BYTES, prefix + data
+        for node in self._others(room):
+            await node.on_message(room, target, kind, payload)
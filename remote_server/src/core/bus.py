@@ -0,0 +1,281 @@
+import asyncio
+import struct
+from typing import Dict, Optional, Set
+
+from src.core.backplane import (
+    Backplane, KIND_BYTES, KIND_TEXT, MembersHandler, MessageHandler, PresenceHandler
+)
+
+# Broker backplane.
+#
+# BusHub is the broker: the supervisor runs one next to its workers on a unix
+# socket, and `python broker.py` runs one standalone on TCP for relay nodes on
+# several hosts. Nodes talk to it through BrokerBackplane, which forwards
+# frames to the other nodes subscribed to the same room.
+#
+# Wire frame: length (uint32, excludes itself) | op (uint8) | room length
+# (uint16) | room | payload
+#
+# A node that loses the broker keeps serving its own sockets: pending
+# subscribes resolve as "no PC elsewhere", every room falls back to local
+# delivery (no other members, no remote PC) and frames for other nodes are
+# dropped. It reconnects with backoff and subscribes its rooms (and announces
+# its PCs) again, the broker answers with presence and member counts as for
+# any new subscriber.
+
+OP_SUB = 1
+OP_UNSUB = 2
+OP_PUB = 3
+OP_PC_UP = 4
+OP_PC_DOWN = 5
+OP_PRESENCE = 6
+# Hub -> node: number of other nodes subscribed to the room (uint16)
+OP_MEMBERS = 7
+
+_HEADER = struct.Struct("!IBH")
+_MEMBERS = struct.Struct("!H")
+
+# Above this many buffered bytes a publisher waits for the hub to catch up
+WRITE_HIGH_WATER = 256 * 1024
+
+# Reconnect backoff of a node that lost the broker, seconds
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 5.0
+
+
+def _pack(op: int, room: bytes, payload: bytes = b"") -> bytes:
+    return _HEADER.pack(3 + len(room) + len(payload), op, len(room)) + room + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader):
+    header = await reader.readexactly(_HEADER.size)
+    length, op, room_len = _HEADER.unpack(header)
+    body = await reader.readexactly(length - 3)
+    return op, body[:room_len], body[room_len:]
+
+
+async def open_connection(address: str):
+    if address.startswith("unix:"):
+        return await asyncio.open_unix_connection(address[5:])
+    host, _, port = address.rpartition(":")
+    return await asyncio.open_connection(host, int(port))
+
+
+async def start_server(handler, address: str):
+    if address.startswith("unix:"):
+        return await asyncio.start_unix_server(handler, address[5:])
+    host, _, port = address.rpartition(":")
+    return await asyncio.start_server(handler, host, int(port))
+
+
+class BusHub:
+    """Room pub/sub broker shared by relay nodes."""
+
+    def __init__(self):
+        self.subscribers: Dict[bytes, Set[asyncio.StreamWriter]] = {}
+        self.pc_owner: Dict[bytes, asyncio.StreamWriter] = {}
+
+    def _send_others(self, room: bytes, sender, frame: bytes):
+        for writer in self.subscribers.get(room, ()):
+            if writer is not sender:
+                writer.write(frame)
+
+    def _set_presence(self, room: bytes, sender, present: bool):
+        self._send_others(room, sender, _pack(OP_PRESENCE, room, b"\x01" if present else b"\x00"))
+
+    def _send_members(self, room: bytes):
+        subscribers = self.subscribers.get(room, ())
+        frame = _pack(OP_MEMBERS, room, _MEMBERS.pack(max(0, len(subscribers) - 1)))
+        for writer in subscribers:
+            writer.write(frame)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        rooms: Set[bytes] = set()
+        try:
+            while True:
+                op, room, payload = await _read_frame(reader)
+
+                if op == OP_PUB:
+                    self._send_others(room, writer, _pack(OP_PUB, room, payload))
+
+                elif op == OP_SUB:
+                    rooms.add(room)
+                    self.subscribers.setdefault(room, set()).add(writer)
+                    owner = self.pc_owner.get(room)
+                    present = owner is not None and owner is not writer
+                    writer.write(_pack(OP_PRESENCE, room, b"\x01" if present else b"\x00"))
+                    self._send_members(room)
+
+                elif op == OP_UNSUB:
+                    rooms.discard(room)
+                    self._drop(room, writer)
+
+                elif op == OP_PC_UP:
+                    self.pc_owner[room] = writer
+                    self._set_presence(room, writer, True)
+
+                elif op == OP_PC_DOWN:
+                    if self.pc_owner.get(room) is writer:
+                        self.pc_owner.pop(room)
+                        self._set_presence(room, writer, False)
+
+                if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                    await writer.drain()
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for room in rooms:
+                self._drop(room, writer)
+            writer.close()
+
+    def _drop(self, room: bytes, writer):
+        if self.pc_owner.get(room) is writer:
+            self.pc_owner.pop(room)
+            self._set_presence(room, writer, False)
+        subscribers = self.subscribers.get(room)
+        if subscribers is not None and writer in subscribers:
+            subscribers.discard(writer)
+            if subscribers:
+                self._send_members(room)
+            else:
+                self.subscribers.pop(room)
+
+    async def serve(self, address: str):
+        server = await start_server(self.handle, address)
+        async with server:
+            await server.serve_forever()
+
+
+class BrokerBackplane(Backplane):
+    """Node side of the broker."""
+
+    def __init__(self, address: str, on_message: MessageHandler, on_presence: PresenceHandler,
+                 on_members: Optional[MembersHandler] = None):
+        super().__init__(on_message, on_presence, on_members)
+        self.address = address
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.connected = False
+        self._closing = False
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending_sub: Dict[bytes, asyncio.Future] = {}
+        # Frames a handler failed on, the read loop carries on with the next
+        self.handler_errors = 0
+        # What the broker has to hear again after a reconnect
+        self.rooms: Set[bytes] = set()
+        self.pc_rooms: Set[bytes] = set()
+
+    async def connect(self):
+        self.reader, self.writer = await open_connection(self.address)
+        self.connected = True
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def close(self):
+        self._closing = True
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self.writer:
+            self.writer.close()
+
+    async def _read_loop(self):
+        while not self._closing:
+            try:
+                while True:
+                    op, room, payload = await _read_frame(self.reader)
+                    try:
+                        await self._dispatch(op, room, payload)
+                    except Exception as e:
+                        self.handler_errors += 1
+                        print(f"BUS HANDLER ERROR ({op}): {type(e).__name__}: {e}")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                print("BUS CONNECTION LOST")
+            await self._lost()
+            await self._reconnect()
+
+    async def _dispatch(self, op: int, room: bytes, payload: bytes):
+        if op == OP_PUB:
+            await self.on_message(room.decode(), payload[:1], payload[1:2], payload[2:])
+        elif op == OP_PRESENCE:
+            present = payload == b"\x01"
+            future = self._pending_sub.pop(room, None)
+            if future is not None and not future.done():
+                future.set_result(present)
+            else:
+                await self.on_presence(room.decode(), present)
+        elif op == OP_MEMBERS:
+            await self.on_members(room.decode(), _MEMBERS.unpack(payload)[0])
+
+    async def _lost(self):
+        self.connected = False
+        self.writer.close()
+        pending, self._pending_sub = self._pending_sub, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_result(False)
+        for room in list(self.rooms):
+            await self.on_members(room.decode(), 0)
+            await self.on_presence(room.decode(), False)
+
+    async def _reconnect(self):
+        delay = RECONNECT_MIN
+        while not self._closing:
+            await asyncio.sleep(delay)
+            try:
+                self.reader, self.writer = await open_connection(self.address)
+            except OSError as e:
+                print(f"BUS RECONNECT FAILED: {e}")
+                delay = min(RECONNECT_MAX, delay * 2)
+                continue
+            self.connected = True
+            for room in self.rooms:
+                self.writer.write(_pack(OP_SUB, room))
+            for room in self.pc_rooms:
+                self.writer.write(_pack(OP_PC_UP, room))
+            print(f"BUS RECONNECTED ({len(self.rooms)} rooms)")
+            return
+
+    async def _write(self, frame: bytes):
+        # Frames for other nodes are lost while the broker is away
+        if not self.connected:
+            return
+        self.writer.write(frame)
+        if self.writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                pass  # the read loop sees it too and reconnects
+
+    async def subscribe(self, room: str) -> bool:
+        # Returns whether the room's PC is connected on another worker
+        key = room.encode()
+        self.rooms.add(key)
+        if not self.connected:
+            return False
+        future = asyncio.get_running_loop().create_future()
+        self._pending_sub[key] = future
+        await self._write(_pack(OP_SUB, key))
+        return await future
+
+    async def unsubscribe(self, room: str):
+        key = room.encode()
+        self.rooms.discard(key)
+        self.pc_rooms.discard(key)
+        await self._write(_pack(OP_UNSUB, key))
+
+    async def pc_up(self, room: str):
+        key = room.encode()
+        self.pc_rooms.add(key)
+        await self._write(_pack(OP_PC_UP, key))
+
+    async def pc_down(self, room: str):
+        key = room.encode()
+        self.pc_rooms.discard(key)
+        await self._write(_pack(OP_PC_DOWN, key))
+
+    async def publish(self, room: str, target: bytes, data, prefix: bytes = b""):
+        if isinstance(data, str):
+            payload = target + KIND_TEXT + prefix + data.encode()
+        else:
+            payload = target + KIND_BYTES + prefix + data
+        await self._write(_pack(OP_PUB, room.encode(), payload))
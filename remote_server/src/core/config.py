@@ -0,0 +1,111 @@
+import os
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Settings:
+    def __init__(self):
+        self.HOST: str = os.getenv("HOST", "0.0.0.0")
+        self.PORT: int = int(os.getenv("PORT", "8080"))
+        self.ACCESS_LOG: bool = os.getenv("ACCESS_LOG", "1") == "1"
+
+        # Production launch mode: WORKERS > 1 pre-forks that many uvicorn
+        # processes sharing one listening socket
+        self.WORKERS: int = int(os.getenv("WORKERS", "1"))
+        self.LOOP: str = os.getenv("LOOP", "auto")  # auto | asyncio | uvloop
+        self.HTTP: str = os.getenv("HTTP", "auto")  # auto | h11 | httptools
+
+        # Backplane broker ("unix:/path" or "host:port"). Set it to a broker.py
+        # address to join other relay nodes, the supervisor sets it for its
+        # workers otherwise. Empty means single process (in-memory backplane)
+        self.BUS_ADDRESS: str = os.getenv("BUS_ADDRESS", "")
+
+        # Relay cluster: public addresses of all nodes ("host:port" or a
+        # ws:// / wss:// URL, comma separated) and the one of this node. Rooms
+        # are owned by consistent hashing of unique_id, clients are redirected
+        # to the owner. Empty means every room is served here
+        self.RELAY_NODES: list = [node.strip() for node in os.getenv("RELAY_NODES", "").split(",") if node.strip()]
+        self.RELAY_SELF: str = os.getenv("RELAY_SELF", "")
+        self.RING_VNODES: int = int(os.getenv("RING_VNODES", "160"))
+
+        # Graceful drain on SIGTERM: session snapshot for the next process
+        # (kept DRAIN_TTL seconds), clients reconnect after a random delay of
+        # up to DRAIN_JITTER_MS, sockets are closed DRAIN_GRACE seconds later
+        self.DRAIN_SNAPSHOT: str = os.getenv(
+            "DRAIN_SNAPSHOT", os.path.join(tempfile.gettempdir(), "vpad-relay-handoff.json")
+        )
+        self.DRAIN_TTL: float = float(os.getenv("DRAIN_TTL", "60"))
+        self.DRAIN_JITTER_MS: int = int(os.getenv("DRAIN_JITTER_MS", "5000"))
+        self.DRAIN_GRACE: float = float(os.getenv("DRAIN_GRACE", "1"))
+
+        # Per-subscriber outbound queue: frames kept before the oldest is
+        # dropped, and consecutive drops before a slow consumer is cut off
+        # (0 keeps it connected and only drops)
+        self.OUTBOX_SIZE: int = int(os.getenv("OUTBOX_SIZE", "64"))
+        self.SLOW_CONSUMER_DROPS: int = int(os.getenv("SLOW_CONSUMER_DROPS", "256"))
+
+        # Input batching for PCs that ask for it ("batch": true in the
+        # handshake): inputs pending within BATCH_WINDOW_MS go out as one
+        # frame. 0 only batches what piled up during the previous send
+        self.BATCH_INPUTS: bool = os.getenv("BATCH_INPUTS", "0") == "1"
+        self.BATCH_WINDOW_MS: float = float(os.getenv("BATCH_WINDOW_MS", "1"))
+
+        # Liveness: protocol-level pings (seconds, 0 disables) drop half-open
+        # sockets, IDLE_TIMEOUT evicts mobiles that stopped sending, even their
+        # 5 second app pings. PCs are silent by design, 0 never evicts them
+        self.WS_PING_INTERVAL: float = float(os.getenv("WS_PING_INTERVAL", "20"))
+        self.WS_PING_TIMEOUT: float = float(os.getenv("WS_PING_TIMEOUT", "20"))
+        self.IDLE_TIMEOUT: float = float(os.getenv("IDLE_TIMEOUT", "30"))
+        self.PC_IDLE_TIMEOUT: float = float(os.getenv("PC_IDLE_TIMEOUT", "0"))
+
+        # Session resume: a mobile whose socket dropped keeps its slot for
+        # RESUME_GRACE seconds, a reconnect with its token takes it over
+        # without the PC seeing a disconnect (0 disables)
+        self.RESUME_GRACE: float = float(os.getenv("RESUME_GRACE", "10"))
+
+        # Admission control per process: new upgrades are refused with 503 and
+        # Retry-After (ADMISSION_RETRY_AFTER seconds) past MAX_ROOMS rooms,
+        # MAX_CONNECTIONS sockets, MAX_RSS_MB of memory (0 disables each) or
+        # while the event loop lags more than LAG_LIMIT_MS. /ready reports it
+        self.MAX_ROOMS: int = int(os.getenv("MAX_ROOMS", "0"))
+        self.MAX_CONNECTIONS: int = int(os.getenv("MAX_CONNECTIONS", "0"))
+        self.MAX_RSS_MB: float = float(os.getenv("MAX_RSS_MB", "0"))
+        self.LAG_LIMIT_MS: float = float(os.getenv("LAG_LIMIT_MS", "100"))
+        self.LAG_INTERVAL_MS: float = float(os.getenv("LAG_INTERVAL_MS", "50"))
+        self.ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+
+        # Audit log of room lifecycle events, written in batches by a
+        # background thread to AUDIT_LOG (empty disables), rotated at
+        # AUDIT_MAX_BYTES. Events beyond AUDIT_QUEUE pending ones are dropped
+        self.AUDIT_LOG: str = os.getenv("AUDIT_LOG", os.path.join("logs", "audit.log"))
+        self.AUDIT_QUEUE: int = int(os.getenv("AUDIT_QUEUE", "10000"))
+        self.AUDIT_FLUSH_MS: float = float(os.getenv("AUDIT_FLUSH_MS", "200"))
+        self.AUDIT_MAX_BYTES: int = int(os.getenv("AUDIT_MAX_BYTES", str(10 * 1024 * 1024)))
+        self.AUDIT_BACKUPS: int = int(os.getenv("AUDIT_BACKUPS", "5"))
+
+        # Sampled tracing of the forwarding path (see src/core/tracing.py):
+        # TRACE_SAMPLE is the fraction of messages traced (0 disables), every
+        # message of the unique_ids in TRACE_ROOMS (comma separated) is traced.
+        # Chrome trace JSON in TRACE_FILE, rotated at TRACE_MAX_BYTES
+        self.TRACE_SAMPLE: float = float(os.getenv("TRACE_SAMPLE", "0"))
+        self.TRACE_ROOMS: list = [room.strip() for room in os.getenv("TRACE_ROOMS", "").split(",") if room.strip()]
+        self.TRACE_FILE: str = os.getenv("TRACE_FILE", os.path.join("logs", "trace.json"))
+        self.TRACE_QUEUE: int = int(os.getenv("TRACE_QUEUE", "10000"))
+        self.TRACE_MAX_BYTES: int = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+        # POST/DELETE /trace/{unique_id} need "Authorization: Bearer
+        # <TRACE_TOKEN>", empty turns them off (TRACE_ROOMS still works)
+        self.TRACE_TOKEN: str = os.getenv("TRACE_TOKEN", "")
+
+        # Flood protection: frames above MAX_FRAME_SIZE bytes are dropped before
+        # any parsing, mobile messages per second per device and per room
+        # (token buckets, rate 0 disables). Inputs over budget are coalesced
+        self.MAX_FRAME_SIZE: int = int(os.getenv("MAX_FRAME_SIZE", "16384"))
+        self.DEVICE_RATE: float = float(os.getenv("DEVICE_RATE", "300"))
+        self.DEVICE_BURST: float = float(os.getenv("DEVICE_BURST", "30"))
+        self.ROOM_RATE: float = float(os.getenv("ROOM_RATE", "1000"))
+        self.ROOM_BURST: float = float(os.getenv("ROOM_BURST", "100"))
+
+
+settings = Settings()
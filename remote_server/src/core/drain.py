@@ -0,0 +1,146 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from src.core.frames import ControllerFrame, decode_frame
+from src.core.registry import Peer, Registry
+
+# Session handoff between an old relay process and its replacement.
+#
+# On SIGTERM the old process drains: it refuses new handshakes, writes its
+# rooms and the last known controller state of every phone to
+# <DRAIN_SNAPSHOT>.<pid>, tells every client to reconnect after a random
+# delay and closes. Both processes listen on the same port (SO_REUSEPORT), so
+# the reconnects land on the new one, which picks up the snapshot files of
+# the last DRAIN_TTL seconds whenever it opens a room. The order in which the
+# two processes start and stop does not matter.
+#
+# Departures are not announced while draining, so the PC keeps the pads of
+# every phone in the snapshot. A phone that has not come back once its entry
+# expires gets the usual disconnect from the new process (on_expire).
+
+SNAPSHOT_VERSION = 1
+POLL_INTERVAL = 1.0
+
+ExpireHandler = Callable[[str, str, str], Awaitable[None]]
+
+
+class Handoff:
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        # restored[unique_id][device_id] = (expires_at, ControllerFrame or None, device_name)
+        self.restored: Dict[str, Dict[str, tuple]] = {}
+        self._loaded = set()
+        self._next_poll = 0.0
+        self.on_expire: Optional[ExpireHandler] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def save(self, registry: Registry, compact_state: Callable[[Peer], Optional[ControllerFrame]]) -> str:
+        rooms = []
+        for room in registry.rooms.values():
+            mobiles = []
+            for peer in room.mobiles.values():
+                # One bad state costs that phone its state, not the shutdown
+                try:
+                    frame = compact_state(peer)
+                except Exception as e:
+                    print(f"HANDOFF STATE SKIPPED {room.unique_id} {peer.device_id}: {type(e).__name__}: {e}")
+                    frame = None
+                mobiles.append({
+                    "device_id": peer.device_id,
+                    "device_name": peer.device_name,
+                    "frame_format": peer.frame_format,
+                    "state": frame.encode().hex() if frame else None
+                })
+            rooms.append({
+                "unique_id": room.unique_id,
+                "created_at": room.created_at,
+                "pc": {
+                    "device_id": room.pc.device_id,
+                    "device_name": room.pc.device_name,
+                    "frame_format": room.pc.frame_format
+                } if room.pc else None,
+                "mobiles": mobiles
+            })
+
+        path = f"{self.path}.{os.getpid()}"
+        temporary = path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump({"version": SNAPSHOT_VERSION, "written_at": time.time(), "rooms": rooms}, file)
+        os.replace(temporary, path)
+        return path
+
+    def poll(self):
+        # At most once per POLL_INTERVAL, cheap enough to call on every new room
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + POLL_INTERVAL
+
+        wall = time.time()
+        for path in glob.glob(glob.escape(self.path) + ".*"):
+            if path.endswith(".tmp") or path in self._loaded:
+                continue
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            age = wall - snapshot.get("written_at", 0)
+            if snapshot.get("version") != SNAPSHOT_VERSION or age > self.ttl:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            self._loaded.add(path)
+            expires_at = now + self.ttl - age
+            for room in snapshot["rooms"]:
+                for mobile in room["mobiles"]:
+                    frame = decode_frame(bytes.fromhex(mobile["state"])) if mobile["state"] else None
+                    self.restored.setdefault(room["unique_id"], {})[mobile["device_id"]] = (
+                        expires_at, frame, mobile.get("device_name", "Unknown Device")
+                    )
+            print(f"HANDOFF LOADED {path} ({len(snapshot['rooms'])} rooms)")
+
+    def take(self, unique_id: str, device_id: str) -> Optional[ControllerFrame]:
+        devices = self.restored.get(unique_id)
+        if not devices:
+            return None
+        entry = devices.pop(device_id, None)
+        if not devices:
+            self.restored.pop(unique_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def start(self, on_expire: ExpireHandler):
+        self.on_expire = on_expire
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            if not self.restored:
+                continue
+            now = time.monotonic()
+            for unique_id, devices in list(self.restored.items()):
+                for device_id, (expires_at, _, device_name) in list(devices.items()):
+                    if expires_at > now:
+                        continue
+                    del devices[device_id]
+                    try:
+                        await self.on_expire(unique_id, device_id, device_name)
+                    except Exception as e:
+                        print(f"Error expiring restored phone: {e}")
+                if not devices:
+                    self.restored.pop(unique_id, None)
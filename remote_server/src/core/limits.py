@@ -0,0 +1,115 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from src.core import metrics
+from src.core.audit import audit
+from src.core.config import settings
+from src.core.registry import Peer, Room
+
+# Flood protection for mobile -> PC traffic.
+#
+# Every mobile has a token bucket (DEVICE_RATE msg/s, DEVICE_BURST) and every
+# room one shared by all its mobiles (ROOM_RATE, ROOM_BURST), so one phone
+# cannot eat the budget of the others or the PC's loop. A controller_input
+# over budget is not dropped and the phone is not disconnected: it is held,
+# a newer input replaces the held one, and the newest is forwarded as soon as
+# both buckets have a token again. Other messages over budget are dropped.
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> float:
+        tokens = self.tokens + (now - self.updated) * self.rate
+        self.tokens = tokens if tokens < self.burst else self.burst
+        self.updated = now
+        return self.tokens
+
+    def wait_time(self) -> float:
+        # Seconds until one token is available
+        missing = 1.0 - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+
+ForwardInput = Callable[[Room, str, object], Awaitable[None]]
+
+
+def _device_bucket(peer: Peer) -> Optional[TokenBucket]:
+    if peer.bucket is None and settings.DEVICE_RATE > 0:
+        peer.bucket = TokenBucket(settings.DEVICE_RATE, settings.DEVICE_BURST)
+    return peer.bucket
+
+
+def _room_bucket(room: Room) -> Optional[TokenBucket]:
+    if room.bucket is None and settings.ROOM_RATE > 0:
+        room.bucket = TokenBucket(settings.ROOM_RATE, settings.ROOM_BURST)
+    return room.bucket
+
+
+def _take(room: Room, peer: Peer) -> Optional[metrics.Counter]:
+    # Takes one token from both buckets, or none when either is empty. Returns
+    # the counter of the bucket that said no, None when admitted
+    now = time.monotonic()
+    device = _device_bucket(peer)
+    if device is not None and device.refill(now) < 1.0:
+        return metrics.limiter_held_device
+    shared = _room_bucket(room)
+    if shared is not None and shared.refill(now) < 1.0:
+        return metrics.limiter_held_room
+    if device is not None:
+        device.tokens -= 1.0
+    if shared is not None:
+        shared.tokens -= 1.0
+    return None
+
+
+def admit_message(room: Room, peer: Peer) -> bool:
+    if _take(room, peer) is None:
+        return True
+    metrics.limiter_dropped.inc()
+    audit.record("limit_drop", room.unique_id, peer.device_id)
+    return False
+
+
+async def submit_input(room: Room, peer: Peer, data, forward: ForwardInput):
+    # While an input is held every newer one replaces it, so inputs of one
+    # device are never reordered
+    if peer.held is None:
+        refused = _take(room, peer)
+        if refused is None:
+            await forward(room, peer.device_id, data)
+            return
+        refused.inc()
+        audit.record("limit_hold", room.unique_id, peer.device_id,
+                     "device" if refused is metrics.limiter_held_device else "room")
+    else:
+        metrics.limiter_coalesced.inc()
+    peer.held = data
+    if peer.held_task is None:
+        peer.held_task = asyncio.create_task(_release_held(room, peer, forward))
+
+
+async def _release_held(room: Room, peer: Peer, forward: ForwardInput):
+    try:
+        while peer.held is not None:
+            wait = max(
+                peer.bucket.wait_time() if peer.bucket else 0.0,
+                room.bucket.wait_time() if room.bucket else 0.0
+            )
+            await asyncio.sleep(wait)
+            if peer.outbox is None or peer.outbox.closed:
+                break  # Peer left, its pending input goes with it
+            if _take(room, peer) is None:
+                data, peer.held = peer.held, None
+                metrics.limiter_released.inc()
+                await forward(room, peer.device_id, data)
+    finally:
+        peer.held = None
+        peer.held_task = None
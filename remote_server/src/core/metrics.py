@@ -0,0 +1,229 @@
+from bisect import bisect_left
+from typing import Dict, List
+
+# Relay metrics in Prometheus text format.
+#
+# Everything here is updated from the event loop of one worker only, so plain
+# integer attributes are enough: no locks, and observing a value allocates
+# nothing (bucket lookup is a bisect on a fixed tuple).
+
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+)
+
+MESSAGE_TYPES = ("controller_input", "ping", "binary", "other")
+
+
+class Histogram:
+    __slots__ = ("name", "help", "labels", "bounds", "counts", "sum", "count")
+
+    def __init__(self, name: str, help: str, labels: str = "", bounds=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, lines: List[str]):
+        prefix = self.labels + "," if self.labels else ""
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = "{" + self.labels + "}" if self.labels else ""
+        lines.append(f"{self.name}_sum{suffix} {self.sum}")
+        lines.append(f"{self.name}_count{suffix} {self.count}")
+
+
+class Counter:
+    __slots__ = ("name", "help", "labels", "value")
+
+    def __init__(self, name: str, help: str, labels: str = ""):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+        COUNTERS.append(self)
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+
+# Every Counter registers itself here and is rendered by /metrics, counters
+# sharing a name (different labels) must be created next to each other
+COUNTERS: List[Counter] = []
+
+
+class Traffic:
+    __slots__ = ("messages", "bytes")
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def add(self, size: int):
+        self.messages += 1
+        self.bytes += size
+
+
+# incoming[source][type], source is "pc" or "mobile"
+incoming: Dict[str, Dict[str, Traffic]] = {
+    source: {message_type: Traffic() for message_type in MESSAGE_TYPES}
+    for source in ("pc", "mobile")
+}
+
+# outgoing[target], target is "pc" or "mobile"
+outgoing: Dict[str, Traffic] = {"pc": Traffic(), "mobile": Traffic()}
+
+forward_latency_pc = Histogram(
+    "vpad_relay_forward_latency_seconds",
+    "Time from receiving a frame to finishing its send",
+    'target="pc"'
+)
+forward_latency_mobile = Histogram(
+    "vpad_relay_forward_latency_seconds",
+    "Time from receiving a frame to finishing its send",
+    'target="mobile"'
+)
+fanout_duration = Histogram(
+    "vpad_relay_fanout_duration_seconds",
+    "Time spent handing one PC frame to every mobile outbox"
+)
+
+loop_lag = Histogram(
+    "vpad_relay_loop_lag_seconds",
+    "How late the event loop ran a timer, sampled every LAG_INTERVAL_MS"
+)
+
+batch_size = Histogram(
+    "vpad_relay_batch_inputs",
+    "Inputs per batched PC frame",
+    bounds=(1, 2, 3, 4, 6, 8, 12, 16, 32)
+)
+
+idle_evictions = Counter("vpad_relay_idle_evictions_total", "Peers evicted by the idle reaper")
+
+redirects = Counter("vpad_relay_redirects_total", "Connections sent to the node owning their room")
+
+resumed = Counter("vpad_relay_resumed_total", "Mobiles that reattached to their parked slot")
+resume_expired = Counter("vpad_relay_resume_expired_total", "Parked mobiles that did not come back in time")
+
+admitted = Counter("vpad_relay_admitted_total", "Websocket upgrades let in by admission control")
+admission_rejected = {
+    reason: Counter("vpad_relay_admission_rejected_total", "Websocket upgrades refused by admission control",
+                    f'reason="{reason}"')
+    for reason in ("rooms", "connections", "memory", "lag")
+}
+
+oversize_frames = Counter("vpad_relay_oversize_frames_total", "Frames above MAX_FRAME_SIZE, dropped unparsed")
+invalid_inputs = Counter("vpad_relay_invalid_inputs_total", "Mobile frames that were not exactly one bin1 frame or JSON object")
+limiter_held_device = Counter(
+    "vpad_relay_limiter_held_total", "Inputs held back by a token bucket", 'scope="device"'
+)
+limiter_held_room = Counter(
+    "vpad_relay_limiter_held_total", "Inputs held back by a token bucket", 'scope="room"'
+)
+limiter_coalesced = Counter(
+    "vpad_relay_limiter_coalesced_total", "Held inputs replaced by a newer one and never forwarded"
+)
+limiter_released = Counter(
+    "vpad_relay_limiter_released_total", "Held inputs forwarded once the bucket refilled"
+)
+limiter_dropped = Counter(
+    "vpad_relay_limiter_dropped_total", "Non-input messages dropped over budget"
+)
+
+
+def message_type_key(message_type) -> str:
+    return message_type if message_type in MESSAGE_TYPES else "other"
+
+
+def render(registry, fanout_stats, mailbox_stats, audit_log=None, admission=None) -> str:
+    lines: List[str] = []
+
+    def gauge(name: str, help: str, value):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+
+    def counter(name: str, help: str, value):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+
+    gauge("vpad_relay_rooms", "Active rooms", len(registry.rooms))
+    gauge("vpad_relay_pc_connections", "Connected PCs", registry.pc_count)
+    gauge("vpad_relay_mobile_connections", "Connected mobiles", registry.mobile_count)
+    gauge("vpad_relay_messages_per_second", "Messages received in the last second", registry.message_rate())
+    if admission is not None:
+        gauge("vpad_relay_websocket_connections", "Open websocket connections", admission.connections)
+        gauge("vpad_relay_loop_lag_smoothed_seconds", "Event loop lag as used by admission control", admission.lag)
+        gauge("vpad_relay_resident_memory_bytes", "Resident set size of this process", admission.rss)
+        gauge("vpad_relay_ready", "1 while new connections are admitted", int(admission.refusal() is None))
+
+    lines.append("# HELP vpad_relay_messages_in_total Messages received, by sender and type")
+    lines.append("# TYPE vpad_relay_messages_in_total counter")
+    for source, by_type in incoming.items():
+        for message_type, traffic in by_type.items():
+            lines.append(f'vpad_relay_messages_in_total{{source="{source}",type="{message_type}"}} {traffic.messages}')
+    lines.append("# HELP vpad_relay_bytes_in_total Bytes received, by sender and type")
+    lines.append("# TYPE vpad_relay_bytes_in_total counter")
+    for source, by_type in incoming.items():
+        for message_type, traffic in by_type.items():
+            lines.append(f'vpad_relay_bytes_in_total{{source="{source}",type="{message_type}"}} {traffic.bytes}')
+
+    lines.append("# HELP vpad_relay_messages_out_total Messages sent, by receiver")
+    lines.append("# TYPE vpad_relay_messages_out_total counter")
+    for target, traffic in outgoing.items():
+        lines.append(f'vpad_relay_messages_out_total{{target="{target}"}} {traffic.messages}')
+    lines.append("# HELP vpad_relay_bytes_out_total Bytes sent, by receiver")
+    lines.append("# TYPE vpad_relay_bytes_out_total counter")
+    for target, traffic in outgoing.items():
+        lines.append(f'vpad_relay_bytes_out_total{{target="{target}"}} {traffic.bytes}')
+
+    counter("vpad_relay_fanout_dropped_total", "Frames dropped from full mobile outboxes", fanout_stats.dropped)
+    counter("vpad_relay_slow_consumer_disconnects_total", "Mobiles cut off for overflowing their outbox",
+            fanout_stats.slow_disconnects)
+    counter("vpad_relay_inputs_superseded_total", "controller_input replaced by a newer one before its send",
+            mailbox_stats.superseded)
+    if audit_log is not None and audit_log.enabled:
+        gauge("vpad_relay_audit_queue_depth", "Audit events waiting for the writer", len(audit_log.queue))
+        counter("vpad_relay_audit_events_written_total", "Audit events written", audit_log.written)
+        counter("vpad_relay_audit_bytes_written_total", "Audit log bytes written", audit_log.bytes_written)
+        counter("vpad_relay_audit_batches_total", "Audit log batch writes", audit_log.batches)
+        counter("vpad_relay_audit_dropped_total", "Audit events dropped on a full queue", audit_log.dropped)
+        counter("vpad_relay_audit_failed_total", "Audit events lost to write errors", audit_log.failed)
+        counter("vpad_relay_audit_errors_total", "Audit log write, open and rotate errors", audit_log.errors)
+    previous = None
+    for item in COUNTERS:
+        if item.name != previous:
+            lines.append(f"# HELP {item.name} {item.help}")
+            lines.append(f"# TYPE {item.name} counter")
+            previous = item.name
+        labels = "{" + item.labels + "}" if item.labels else ""
+        lines.append(f"{item.name}{labels} {item.value}")
+
+    lines.append(f"# HELP {forward_latency_pc.name} {forward_latency_pc.help}")
+    lines.append(f"# TYPE {forward_latency_pc.name} histogram")
+    forward_latency_pc.render(lines)
+    forward_latency_mobile.render(lines)
+    lines.append(f"# HELP {fanout_duration.name} {fanout_duration.help}")
+    lines.append(f"# TYPE {fanout_duration.name} histogram")
+    fanout_duration.render(lines)
+    lines.append(f"# HELP {loop_lag.name} {loop_lag.help}")
+    lines.append(f"# TYPE {loop_lag.name} histogram")
+    loop_lag.render(lines)
+    lines.append(f"# HELP {batch_size.name} {batch_size.help}")
+    lines.append(f"# TYPE {batch_size.name} histogram")
+    batch_size.render(lines)
+
+    return "\n".join(lines) + "\n"
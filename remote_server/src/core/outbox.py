@@ -0,0 +1,312 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from fastapi import WebSocket
+
+from src.core import metrics
+from src.core.config import settings
+from src.core.tracing import tracer
+
+# Frames are enqueued in the same loop step that received them (no await in
+# between for local peers), so the enqueue time doubles as the receive time of
+# the forward latency histograms.
+
+
+class FanoutStats:
+    __slots__ = ("sent", "dropped", "slow_disconnects")
+
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+
+
+fanout_stats = FanoutStats()
+
+
+class Outbox:
+    """Bounded outbound queue drained by its own writer task.
+
+    put() never blocks the caller: when the queue is full the oldest frame is
+    dropped, and a subscriber that keeps overflowing is disconnected.
+    """
+
+    def __init__(self, websocket: WebSocket, maxsize: Optional[int] = None):
+        self.websocket = websocket
+        self.maxsize = maxsize or settings.OUTBOX_SIZE
+        self.queue = deque()
+        self.dropped = 0
+        self.overflow_streak = 0
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, data) -> bool:
+        if self.closed:
+            return False
+        if len(self.queue) >= self.maxsize:
+            self.queue.popleft()
+            self.dropped += 1
+            fanout_stats.dropped += 1
+            self.overflow_streak += 1
+            if settings.SLOW_CONSUMER_DROPS and self.overflow_streak >= settings.SLOW_CONSUMER_DROPS:
+                self._disconnect_slow()
+                return False
+        self.queue.append((data, time.perf_counter()))
+        self._wakeup.set()
+        return True
+
+    def _disconnect_slow(self):
+        print("SLOW CONSUMER DISCONNECTED")
+        fanout_stats.slow_disconnects += 1
+        self.close()
+        asyncio.create_task(self._close_socket(1008))
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    async def _run(self):
+        websocket = self.websocket
+        queue = self.queue
+        traffic = metrics.outgoing["mobile"]
+        latency = metrics.forward_latency_mobile
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while queue:
+                    data, queued_at = queue.popleft()
+                    if isinstance(data, str):
+                        await websocket.send_text(data)
+                    else:
+                        await websocket.send_bytes(data)
+                    self.overflow_streak = 0
+                    latency.observe(time.perf_counter() - queued_at)
+                    traffic.add(len(data))
+                    fanout_stats.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # Socket is gone, the receive loop of this peer does the cleanup
+            self.closed = True
+            queue.clear()
+
+    def close(self):
+        self.closed = True
+        self.queue.clear()
+        self._task.cancel()
+
+
+def fanout(outboxes, data) -> int:
+    # Payload is encoded once by the caller, every subscriber gets the same object
+    started = time.perf_counter()
+    delivered = 0
+    for outbox in outboxes:
+        if outbox.put(data):
+            delivered += 1
+    metrics.fanout_duration.observe(time.perf_counter() - started)
+    return delivered
+
+
+class MailboxStats:
+    __slots__ = ("inputs", "superseded", "controls")
+
+    def __init__(self):
+        self.inputs = 0
+        self.superseded = 0
+        self.controls = 0
+
+
+mailbox_stats = MailboxStats()
+
+
+def _finish_traces(traces, started: int):
+    sent = time.perf_counter_ns()
+    for trace in traces:
+        trace.mark("queue", started)
+        trace.mark("pc_send", sent)
+        tracer.finish(trace)
+
+
+class PcMailbox:
+    """Outbound mailbox of a PC socket.
+
+    Control frames (connect, disconnect, anything that is not input) are sent
+    in order. controller_input keeps only the newest frame per device while a
+    send is in flight, older snapshots are superseded and never sent.
+
+    With a batch_window (seconds, PCs that asked for it in the handshake) the
+    writer waits that long after a wakeup and sends all pending inputs as one
+    frame: JSON inputs as an array of the input messages, binary inputs as
+    the tagged frames back to back.
+    """
+
+    def __init__(self, websocket: WebSocket, batch_window: Optional[float] = None):
+        self.websocket = websocket
+        self.batch_window = batch_window
+        self.controls = deque()
+        self.inputs = {}
+        self.superseded = 0
+        self.closed = False
+        self.traced = []
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def put_control(self, data):
+        if self.closed:
+            return
+        self.controls.append((data, time.perf_counter()))
+        mailbox_stats.controls += 1
+        self._wakeup.set()
+
+    def put_input(self, device_id: str, data):
+        if self.closed:
+            return
+        if device_id in self.inputs:
+            self.superseded += 1
+            mailbox_stats.superseded += 1
+        self.inputs[device_id] = (data, time.perf_counter())
+        mailbox_stats.inputs += 1
+        self._wakeup.set()
+
+    def discard_input(self, device_id: str):
+        self.inputs.pop(device_id, None)
+
+    def trace(self, trace):
+        # Finished with the next frame written to the socket, an input that
+        # gets superseded ends with the one that replaced it
+        if not self.closed:
+            self.traced.append(trace)
+
+    async def _send(self, item):
+        data, queued_at = item
+        traced = self.traced
+        if traced:
+            self.traced = []
+            started = time.perf_counter_ns()
+        if isinstance(data, str):
+            await self.websocket.send_text(data)
+        else:
+            await self.websocket.send_bytes(data)
+        metrics.forward_latency_pc.observe(time.perf_counter() - queued_at)
+        metrics.outgoing["pc"].add(len(data))
+        if traced:
+            _finish_traces(traced, started)
+
+    async def _send_batch(self):
+        traced = self.traced
+        if traced:
+            self.traced = []
+            started = time.perf_counter_ns()
+        texts, blobs, queued = [], [], []
+        for data, queued_at in self.inputs.values():
+            (texts if isinstance(data, str) else blobs).append(data)
+            queued.append(queued_at)
+        self.inputs.clear()
+        websocket = self.websocket
+        size = 0
+        if texts:
+            data = texts[0] if len(texts) == 1 else "[" + ",".join(texts) + "]"
+            await websocket.send_text(data)
+            size += len(data)
+        if blobs:
+            data = b"".join(blobs)
+            await websocket.send_bytes(data)
+            size += len(data)
+        now = time.perf_counter()
+        for queued_at in queued:
+            metrics.forward_latency_pc.observe(now - queued_at)
+        metrics.outgoing["pc"].messages += (1 if texts else 0) + (1 if blobs else 0)
+        metrics.outgoing["pc"].bytes += size
+        metrics.batch_size.observe(len(queued))
+        if traced:
+            _finish_traces(traced, started)
+
+    async def _run(self):
+        controls = self.controls
+        inputs = self.inputs
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                if self.batch_window is not None:
+                    while controls or inputs:
+                        if self.batch_window and inputs:
+                            await asyncio.sleep(self.batch_window)
+                        while controls:
+                            await self._send(controls.popleft())
+                        if inputs:
+                            await self._send_batch()
+                    continue
+                while controls or inputs:
+                    if controls:
+                        await self._send(controls.popleft())
+                        continue
+                    device_id = next(iter(inputs))
+                    await self._send(inputs.pop(device_id))
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            self.closed = True
+            controls.clear()
+            inputs.clear()
+            self.traced.clear()
+
+    def close(self):
+        self.closed = True
+        self.controls.clear()
+        self.inputs.clear()
+        self.traced.clear()
+        self._task.cancel()
+
+
+class MuxPort:
+    """PcMailbox view of one room on a multiplexed PC uplink.
+
+    Frames get the room's index on their way into the uplink's shared
+    mailbox: text as {"r":<index>,"m":<message>}, binary with the index byte
+    in front (see frames.room_tag). Pending inputs are kept per room and
+    device, so rooms never supersede each other's inputs.
+    """
+
+    __slots__ = ("mailbox", "index", "_text_prefix", "_byte_prefix", "_closed")
+
+    def __init__(self, mailbox: PcMailbox, index: int):
+        self.mailbox = mailbox
+        self.index = index
+        self._text_prefix = '{"r":%d,"m":' % index
+        self._byte_prefix = bytes((index,))
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed or self.mailbox.closed
+
+    def _wrap(self, data):
+        if isinstance(data, str):
+            return self._text_prefix + data + "}"
+        return self._byte_prefix + data
+
+    def put_control(self, data):
+        if not self._closed:
+            self.mailbox.put_control(self._wrap(data))
+
+    def put_input(self, device_id: str, data):
+        if not self._closed:
+            self.mailbox.put_input((self.index, device_id), self._wrap(data))
+
+    def discard_input(self, device_id: str):
+        self.mailbox.discard_input((self.index, device_id))
+
+    def trace(self, trace):
+        if not self._closed:
+            self.mailbox.trace(trace)
+
+    def close(self):
+        # Only this room, the uplink and its other rooms stay
+        self._closed = True
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+
+from src.core import metrics
+from src.core.audit import audit
+from src.core.config import settings
+from src.core.registry import Peer
+from src.core.timers import TimerWheel
+
+# Idle peer eviction.
+#
+# Half-open TCP connections are caught by the protocol pings of uvicorn
+# (WS_PING_INTERVAL / WS_PING_TIMEOUT), which end the receive loop like any
+# other disconnect. This catches peers whose socket is still up but that went
+# silent: the phone sends a ping every 5 seconds, so a mobile that stays quiet
+# for IDLE_TIMEOUT is gone. The desktop does not ping, PCs only expire if
+# PC_IDLE_TIMEOUT is set.
+#
+# Receiving a message only updates peer.last_seen. The wheel holds one entry
+# per peer and on expiry the entry is put back at last_seen + timeout when the
+# peer was active meanwhile, so a busy peer costs one reschedule per timeout.
+
+ExpireHandler = Callable[[Peer], Awaitable[None]]
+
+
+class Reaper:
+    def __init__(self, on_expire: ExpireHandler, resolution: float = 1.0):
+        self.on_expire = on_expire
+        self.wheel = TimerWheel(resolution)
+        self._task: Optional[asyncio.Task] = None
+
+    def timeout_for(self, peer: Peer) -> float:
+        return settings.PC_IDLE_TIMEOUT if peer.is_pc else settings.IDLE_TIMEOUT
+
+    def watch(self, peer: Peer):
+        timeout = self.timeout_for(peer)
+        if timeout > 0:
+            self.wheel.schedule(peer.last_seen + timeout, peer)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        resolution = self.wheel.resolution
+        while True:
+            await asyncio.sleep(resolution)
+            now = time.monotonic()
+            for peer in self.wheel.advance(now):
+                if peer.outbox is None or peer.outbox.closed:
+                    continue  # Already disconnected or replaced
+                deadline = peer.last_seen + self.timeout_for(peer)
+                if deadline > now:
+                    self.wheel.schedule(deadline, peer)
+                    continue
+                metrics.idle_evictions.inc()
+                audit.record("idle_evict", peer.unique_id, peer.device_id, peer.device_type)
+                print(f"IDLE {'PC' if peer.is_pc else 'MOBILE'} EVICTED")
+                try:
+                    await self.on_expire(peer)
+                except Exception as e:
+                    print(f"Error evicting peer: {e}")
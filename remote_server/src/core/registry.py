@@ -0,0 +1,176 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import WebSocket
+
+from src.core.frames import FORMAT_JSON
+
+
+class Peer:
+    __slots__ = (
+        "device_id", "device_name", "device_type", "websocket", "outbox", "frame_format",
+        "unique_id", "connected_at", "last_seen", "messages_in", "bytes_in",
+        "bucket", "held", "held_task", "last_input", "resume_token"
+    )
+
+    def __init__(self, unique_id: str, device_id: str, device_name: str, device_type: str,
+                 websocket: WebSocket, frame_format: str = FORMAT_JSON):
+        self.unique_id = unique_id
+        self.device_id = device_id
+        self.device_name = device_name
+        self.device_type = device_type
+        self.websocket = websocket
+        self.outbox = None  # Outbox for mobiles, PcMailbox for the PC
+        self.frame_format = frame_format
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+        self.messages_in = 0
+        self.bytes_in = 0
+        # Rate limiting state, see src/core/limits.py
+        self.bucket = None
+        self.held = None
+        self.held_task = None
+        # Newest controller state of a mobile: the raw input as received until
+        # a snapshot needs it, a ControllerFrame from then on
+        self.last_input = None
+        # Mobiles only, see src/core/resume.py
+        self.resume_token = None
+
+    @property
+    def is_pc(self) -> bool:
+        return self.device_type == "pc"
+
+
+class Room:
+    __slots__ = (
+        "unique_id", "pc", "mobiles", "remote_pc", "remote_nodes", "created_at", "last_activity",
+        "messages", "bytes", "bucket"
+    )
+
+    def __init__(self, unique_id: str):
+        self.unique_id = unique_id
+        self.pc: Optional[Peer] = None
+        self.mobiles: Dict[str, Peer] = {}
+        self.remote_pc = False  # PC connected on another node
+        self.remote_nodes = 0  # Other nodes subscribed to this room
+        self.created_at = time.time()
+        self.last_activity = time.monotonic()
+        self.messages = 0
+        self.bytes = 0
+        self.bucket = None  # Shared by the mobiles of the room
+
+    @property
+    def pc_format(self) -> str:
+        return self.pc.frame_format if self.pc else FORMAT_JSON
+
+    @property
+    def is_empty(self) -> bool:
+        return self.pc is None and not self.mobiles
+
+
+class Registry:
+    """All rooms of this process, with O(1) lookups and global counters."""
+
+    __slots__ = (
+        "rooms", "pc_count", "mobile_count", "messages", "bytes",
+        "messages_per_second", "_window", "_window_messages"
+    )
+
+    def __init__(self):
+        self.rooms: Dict[str, Room] = {}
+        self.pc_count = 0
+        self.mobile_count = 0
+        self.messages = 0
+        self.bytes = 0
+        self.messages_per_second = 0
+        self._window = 0
+        self._window_messages = 0
+
+    def get(self, unique_id: str) -> Optional[Room]:
+        return self.rooms.get(unique_id)
+
+    def open_room(self, unique_id: str) -> Tuple[Room, bool]:
+        room = self.rooms.get(unique_id)
+        if room is not None:
+            return room, False
+        room = self.rooms[unique_id] = Room(unique_id)
+        return room, True
+
+    def add_pc(self, room: Room, peer: Peer) -> Optional[Peer]:
+        # Returns the PC it replaces, its outbox is already closed
+        previous = room.pc
+        if previous is not None:
+            self._close(previous)
+        else:
+            self.pc_count += 1
+        room.pc = peer
+        return previous
+
+    def add_mobile(self, room: Room, peer: Peer) -> Optional[Peer]:
+        previous = room.mobiles.get(peer.device_id)
+        if previous is not None:
+            self._close(previous)
+        else:
+            self.mobile_count += 1
+        room.mobiles[peer.device_id] = peer
+        return previous
+
+    def remove(self, peer: Peer) -> Tuple[bool, bool]:
+        """Single cleanup point for a peer whose socket is done.
+
+        Returns (detached, room_closed): whether the peer was still the
+        registered one (and not replaced by a reconnect), and whether its room
+        became empty and was dropped.
+        """
+        self._close(peer)
+        room = self.rooms.get(peer.unique_id)
+        if room is None:
+            return False, False
+
+        detached = False
+        if peer.is_pc:
+            if room.pc is peer:
+                room.pc = None
+                self.pc_count -= 1
+                detached = True
+        elif room.mobiles.get(peer.device_id) is peer:
+            room.mobiles.pop(peer.device_id)
+            self.mobile_count -= 1
+            detached = True
+
+        if room.is_empty:
+            self.rooms.pop(peer.unique_id)
+            return detached, True
+        return detached, False
+
+    @staticmethod
+    def _close(peer: Peer):
+        if peer.outbox is not None:
+            peer.outbox.close()
+
+    def count_message(self, room: Room, peer: Peer, size: int):
+        now = time.monotonic()
+        peer.messages_in += 1
+        peer.bytes_in += size
+        peer.last_seen = now
+        room.messages += 1
+        room.bytes += size
+        room.last_activity = now
+        self.messages += 1
+        self.bytes += size
+
+        second = int(now)
+        if second != self._window:
+            # Messages of the last complete second
+            self.messages_per_second = self._window_messages if second == self._window + 1 else 0
+            self._window = second
+            self._window_messages = 0
+        self._window_messages += 1
+
+    def message_rate(self) -> int:
+        second = int(time.monotonic())
+        if second == self._window + 1:
+            return self._window_messages
+        if second == self._window:
+            return self.messages_per_second
+        return 0
@@ -0,0 +1,83 @@
+import asyncio
+import secrets
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from src.core.registry import Peer
+from src.core.timers import TimerWheel
+
+# Session resume for mobiles.
+#
+# Every mobile that gets a hello also gets a resume token. When its socket
+# drops without a close from the phone (flaky Wi-Fi, protocol ping timeout)
+# the peer is parked instead of removed: it keeps its slot in the room and the
+# PC is not told anything. A reconnect presenting the token within
+# RESUME_GRACE seconds takes the slot over, so the PC never sees the virtual
+# pad unplug and replug. Slots nobody came back for expire with the usual
+# disconnect.
+#
+# Tokens only live in the process that issued them. A phone landing on
+# another node does a full connect, and the node holding its parked slot
+# drops it silently when it sees that connect go by (see app.py).
+
+ExpireHandler = Callable[[Peer], Awaitable[None]]
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(16)
+
+
+class ResumeTable:
+    def __init__(self, grace: float, on_expire: ExpireHandler, resolution: float = 0.5):
+        self.grace = grace
+        self.on_expire = on_expire
+        self.wheel = TimerWheel(resolution)
+        # token -> (peer, deadline)
+        self.parked: Dict[str, Tuple[Peer, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def park(self, peer: Peer):
+        deadline = time.monotonic() + self.grace
+        self.parked[peer.resume_token] = (peer, deadline)
+        self.wheel.schedule(deadline, peer.resume_token)
+
+    def take(self, token: str, unique_id: str, device_id: str) -> Optional[Peer]:
+        entry = self.parked.get(token)
+        if entry is None:
+            return None
+        peer = entry[0]
+        if peer.unique_id != unique_id or peer.device_id != device_id:
+            return None
+        del self.parked[token]
+        return peer
+
+    def discard(self, peer: Peer) -> bool:
+        entry = self.parked.get(peer.resume_token)
+        if entry is None or entry[0] is not peer:
+            return False
+        del self.parked[peer.resume_token]
+        return True
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        resolution = self.wheel.resolution
+        while True:
+            await asyncio.sleep(resolution)
+            now = time.monotonic()
+            for token in self.wheel.advance(now):
+                entry = self.parked.get(token)
+                # Resumed meanwhile, or parked again with a later deadline
+                if entry is None or entry[1] > now:
+                    continue
+                del self.parked[token]
+                try:
+                    await self.on_expire(entry[0])
+                except Exception as e:
+                    print(f"Error expiring parked peer: {e}")
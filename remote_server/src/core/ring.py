@@ -0,0 +1,40 @@
+from bisect import bisect_right
+from hashlib import blake2b
+from typing import Iterable, List, Optional
+
+# Room affinity for relay clusters.
+#
+# Every node knows the same node list (RELAY_NODES) and maps a unique_id to
+# its owner on a consistent-hash ring, so the PC and the phones of a room all
+# end up on one node without any shared state. Each node is placed on the ring
+# VNODES times, adding or removing one of N nodes moves about 1/N of the rooms.
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    __slots__ = ("nodes", "points", "owners")
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 160):
+        self.nodes: List[str] = sorted(set(nodes))
+        ring = sorted(
+            (_hash(f"{node}#{index}"), node)
+            for node in self.nodes
+            for index in range(vnodes)
+        )
+        self.points = [point for point, _ in ring]
+        self.owners = [node for _, node in ring]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self.points:
+            return None
+        index = bisect_right(self.points, _hash(key))
+        return self.owners[index if index < len(self.points) else 0]
+
+
+def ws_url(node: str, path: str) -> str:
+    # Nodes are listed as "host:port" or with an explicit ws:// / wss:// scheme
+    base = node if "://" in node else f"ws://{node}"
+    return base.rstrip("/") + path
@@ -0,0 +1,112 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import List
+
+import uvicorn
+
+from src.core.bus import BusHub
+from src.core.config import settings
+
+spawn = multiprocessing.get_context("spawn")
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # Lets a second relay process bind the same port next to this one
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def default_bus_address() -> str:
+    if hasattr(socket, "AF_UNIX"):
+        return "unix:" + os.path.join(tempfile.gettempdir(), f"vpad-relay-{os.getpid()}.sock")
+    return "127.0.0.1:18080"
+
+
+def worker_config() -> uvicorn.Config:
+    return uvicorn.Config(
+        "src.core.app:app",
+        loop=settings.LOOP,
+        http=settings.HTTP,
+        ws_ping_interval=settings.WS_PING_INTERVAL or None,
+        ws_ping_timeout=settings.WS_PING_TIMEOUT or None,
+        access_log=settings.ACCESS_LOG
+    )
+
+
+def _run_worker(sockets: List[socket.socket], bus_address: str):
+    # Runs in a freshly spawned interpreter, settings are read from env here
+    os.environ["BUS_ADDRESS"] = bus_address
+    settings.BUS_ADDRESS = bus_address
+    uvicorn.Server(worker_config()).run(sockets=sockets)
+
+
+def _run_hub(address: str, ready: threading.Event):
+    async def main():
+        hub = BusHub()
+        task = asyncio.create_task(hub.serve(address))
+        await asyncio.sleep(0.1)
+        ready.set()
+        await task
+
+    asyncio.run(main())
+
+
+def run_workers():
+    sock = bind_socket(settings.HOST, settings.PORT)
+    # With BUS_ADDRESS set the workers join an external broker (several relay
+    # nodes), otherwise this host runs its own hub for its workers
+    own_hub = not settings.BUS_ADDRESS
+    bus_address = settings.BUS_ADDRESS or default_bus_address()
+    if own_hub:
+        if bus_address.startswith("unix:") and os.path.exists(bus_address[5:]):
+            os.unlink(bus_address[5:])
+        ready = threading.Event()
+        threading.Thread(target=_run_hub, args=(bus_address, ready), daemon=True).start()
+        ready.wait(5)
+        print(f"BUS HUB LISTENING {bus_address}")
+
+    should_exit = threading.Event()
+
+    def handle_exit(sig, frame):
+        should_exit.set()
+
+    signal.signal(signal.SIGINT, handle_exit)
+    signal.signal(signal.SIGTERM, handle_exit)
+
+    def start_worker():
+        process = spawn.Process(target=_run_worker, args=([sock], bus_address))
+        process.start()
+        return process
+
+    workers = [start_worker() for _ in range(settings.WORKERS)]
+    print(f"STARTED {settings.WORKERS} WORKERS ON {settings.HOST}:{settings.PORT} "
+          f"(loop={settings.LOOP}, http={settings.HTTP})")
+
+    while not should_exit.wait(0.5):
+        for index, process in enumerate(workers):
+            if not process.is_alive():
+                print(f"WORKER {process.pid} EXITED ({process.exitcode}), RESTARTING")
+                workers[index] = start_worker()
+
+    for process in workers:
+        process.terminate()
+    deadline = time.monotonic() + 10
+    for process in workers:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+    sock.close()
+    if own_hub and bus_address.startswith("unix:") and os.path.exists(bus_address[5:]):
+        os.unlink(bus_address[5:])
@@ -0,0 +1,58 @@
+import time
+from typing import Any, List, Optional
+
+
+class TimerWheel:
+    """Hashed timer wheel with a fixed tick.
+
+    schedule() and each tick are O(1) per entry, nothing is ever scanned. An
+    entry whose deadline lies beyond one turn of the wheel simply comes round
+    again and is put back until it is really due. There is no cancel: owners
+    check on expiry whether the entry still matters (lazy deletion).
+    """
+
+    __slots__ = ("resolution", "slots", "tick", "size")
+
+    def __init__(self, resolution: float = 1.0, size: int = 64, now: Optional[float] = None):
+        self.resolution = resolution
+        self.slots: List[list] = [[] for _ in range(size)]
+        self.tick = int((time.monotonic() if now is None else now) / resolution)
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def schedule(self, deadline: float, item: Any):
+        tick = int(deadline / self.resolution)
+        if tick <= self.tick:
+            tick = self.tick + 1
+        self.slots[tick % len(self.slots)].append((deadline, item))
+        self.size += 1
+
+    def advance(self, now: float) -> List[Any]:
+        # Returns every item whose deadline is <= now
+        due = []
+        resolution = self.resolution
+        target = int(now / resolution)
+        slots = self.slots
+        count = len(slots)
+        tick = self.tick
+        while tick < target:
+            tick += 1
+            index = tick % count
+            entries = slots[index]
+            if not entries:
+                continue
+            slots[index] = []
+            kept = 0
+            for entry in entries:
+                if entry[0] <= now:
+                    due.append(entry[1])
+                else:
+                    # Not due yet (more than one turn away): put it back
+                    again = int(entry[0] / resolution)
+                    slots[(again if again > tick else tick + 1) % count].append(entry)
+                    kept += 1
+            self.size -= len(entries) - kept
+        self.tick = tick
+        return due
@@ -0,0 +1,147 @@
+import json
+import os
+import random
+import time
+import zlib
+from typing import List, Optional, Tuple
+
+from src.core.audit import AuditLog, _log_path
+from src.core.config import settings
+
+# Sampled per-message tracing of the forwarding path. A traced message gets
+# a timestamp at the end of every stage it goes through in the relay:
+#
+#   parse    size check, accounting and message type (from the moment the
+#            frame came out of the socket reader)
+#   forward  rate limiter and the hand-off to the PC mailbox, the backplane
+#            or the mobile outboxes (fan-out)
+#   queue    waiting in the PC mailbox behind the sends before it
+#   pc_send  the write to the PC socket
+#
+# TRACE_SAMPLE of all messages are traced, every message of the rooms in
+# TRACE_ROOMS (or switched on with POST /trace/{unique_id}, which needs
+# TRACE_TOKEN). When neither is set the forwarding path only checks
+# tracer.active.
+#
+# Traces go to TRACE_FILE in the Chrome trace event format (open it in
+# ui.perfetto.dev or chrome://tracing): one track per device, a slice per
+# message with its stages nested inside. They are written by the same kind
+# of batching thread as the audit log, the file is a JSON array that is
+# never closed so that it can be appended to and rotated at any time.
+
+# Perf counter to unix time, Chrome traces from several workers line up
+_EPOCH_NS = time.time_ns() - time.perf_counter_ns()
+
+
+class Trace:
+    __slots__ = ("unique_id", "device_id", "kind", "size", "note", "marks")
+
+    def __init__(self, unique_id: str, device_id: str):
+        self.unique_id = unique_id
+        self.device_id = device_id
+        self.kind = "message"
+        self.size = 0
+        self.note = ""
+        # (stage, perf_counter_ns at its end), the first one is the start
+        self.marks: List[Tuple[str, int]] = [("", time.perf_counter_ns())]
+
+    def mark(self, stage: str, at: Optional[int] = None):
+        self.marks.append((stage, at or time.perf_counter_ns()))
+
+
+class TraceLog(AuditLog):
+    def add(self, trace: Trace):
+        queue = self.queue
+        if len(queue) < self.maxsize:
+            queue.append(trace)
+            if len(queue) == self._wake_at:
+                self._wakeup.set()
+        else:
+            self.dropped += 1
+
+    def _open(self):
+        super()._open()
+        if self._size == 0:
+            self._file.write(b"[\n")
+            self._size = 2
+        self._empty = self._size <= 2
+        self._named = set()
+
+    def _format(self, trace: Trace) -> str:
+        pid = os.getpid()
+        tid = zlib.crc32(f"{trace.unique_id}/{trace.device_id}".encode()) & 0x7fffffff
+        events = []
+        if tid not in self._named:
+            self._named.add(tid)
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": f"{trace.unique_id} {trace.device_id}"}})
+        marks = trace.marks
+        started = marks[0][1]
+        events.append({
+            "name": trace.kind, "cat": "message", "ph": "X", "pid": pid, "tid": tid,
+            "ts": (_EPOCH_NS + started) / 1000, "dur": (marks[-1][1] - started) / 1000,
+            "args": {"unique_id": trace.unique_id, "device_id": trace.device_id,
+                     "bytes": trace.size, "note": trace.note}
+        })
+        for (_, begin), (stage, end) in zip(marks, marks[1:]):
+            events.append({
+                "name": stage, "cat": "stage", "ph": "X", "pid": pid, "tid": tid,
+                "ts": (_EPOCH_NS + begin) / 1000, "dur": (end - begin) / 1000
+            })
+        text = ",\n".join(json.dumps(event, separators=(",", ":")) for event in events)
+        if self._empty:
+            self._empty = False
+            return text
+        return "," + text
+
+
+class Tracer:
+    def __init__(self, log: TraceLog, sample: float, rooms):
+        self.log = log
+        self.sample = sample
+        self.rooms = set(rooms)
+        self.traced = 0
+        self.active = False
+        self._update()
+
+    def _update(self):
+        self.active = bool(self.log.enabled and (self.sample > 0 or self.rooms))
+
+    def enable(self, unique_id: str):
+        self.rooms.add(unique_id)
+        self._update()
+        self.start()
+
+    def disable(self, unique_id: str):
+        self.rooms.discard(unique_id)
+        self._update()
+
+    def begin(self, unique_id: str, device_id: str) -> Optional[Trace]:
+        # Only called while active
+        if unique_id in self.rooms or (self.sample > 0 and random.random() < self.sample):
+            return Trace(unique_id, device_id)
+        return None
+
+    def finish(self, trace: Trace):
+        self.traced += 1
+        self.log.add(trace)
+
+    def start(self):
+        if self.active:
+            self.log.start()
+
+    def stop(self):
+        self.log.stop()
+
+
+tracer = Tracer(
+    TraceLog(
+        _log_path(settings.TRACE_FILE),
+        maxsize=settings.TRACE_QUEUE,
+        flush_interval=settings.AUDIT_FLUSH_MS / 1000,
+        max_bytes=settings.TRACE_MAX_BYTES,
+        backups=settings.AUDIT_BACKUPS
+    ),
+    settings.TRACE_SAMPLE,
+    settings.TRACE_ROOMS
+)
@@ -0,0 +1,44 @@
+import os
+import time
+
+from src.core.audit import AuditLog
+
+
+def _wait(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_rotate_error_keeps_writer_alive(tmp_path, monkeypatch):
+    path = str(tmp_path / "audit.log")
+    log = AuditLog(path, flush_interval=0.01, max_bytes=1, backups=2)
+    log.start()
+    try:
+        real_replace = os.replace
+
+        def broken_replace(source, target):
+            raise PermissionError(13, "Permission denied", target)
+
+        monkeypatch.setattr(os, "replace", broken_replace)
+        log.record("connect", "room", "phone")
+        assert _wait(lambda: log.errors == 1)
+        assert log._thread.is_alive()
+
+        # The file was closed before the rotation gave up, the next batch
+        # opens it again
+        log.record("disconnect", "room", "phone")
+        assert _wait(lambda: log.errors == 2)
+        assert log.written == 2 and log.failed == 0
+        assert log._thread.is_alive()
+
+        monkeypatch.setattr(os, "replace", real_replace)
+        log.record("connect", "room", "phone")
+        assert _wait(lambda: os.path.exists(path + ".1"))
+    finally:
+        log.stop()
+
+    with open(path + ".1") as file:
+        events = [line.split("\t")[1] for line in file.read().splitlines()]
+    assert events == ["connect", "disconnect", "connect"]
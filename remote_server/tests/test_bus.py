@@ -0,0 +1,44 @@
+import asyncio
+
+from benchmarks.bench_workers import free_port
+from src.core.backplane import TARGET_PC
+from src.core.bus import BrokerBackplane, BusHub, start_server
+
+
+async def _noop(*args):
+    pass
+
+
+def test_handler_error_keeps_reading():
+    async def main():
+        address = f"127.0.0.1:{free_port()}"
+        server = await start_server(BusHub().handle, address)
+        received = []
+
+        async def on_message(room, target, kind, data):
+            if data == b"bad":
+                # What a malformed device tag used to raise in here
+                b"\xc3".decode()
+            received.append(data)
+
+        node = BrokerBackplane(address, on_message, _noop, _noop)
+        other = BrokerBackplane(address, _noop, _noop, _noop)
+        await node.connect()
+        await other.connect()
+        await node.subscribe("room")
+        await other.subscribe("room")
+        await other.publish("room", TARGET_PC, b"bad")
+        await other.publish("room", TARGET_PC, b"good")
+        for _ in range(50):
+            if received:
+                break
+            await asyncio.sleep(0.02)
+
+        assert received == [b"good"]
+        assert node.handler_errors == 1
+        assert node.connected and not node._reader_task.done()
+        await node.close()
+        await other.close()
+        server.close()
+
+    asyncio.run(main())
@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import websockets
+
+from benchmarks.bench_workers import free_port, start_relay
+
+# A phone in one room must not be able to speak for another room on a shared
+# PC uplink: its text goes into {"r":<index>,"m":<text>}, and with a second
+# "r" of its own (the last one wins) it used to land in the other room.
+
+
+async def _pc_reads(pc, until: str) -> list:
+    items = []
+    while True:
+        data = json.loads(await asyncio.wait_for(pc.recv(), 5))
+        for item in data if isinstance(data, list) else [data]:
+            items.append(item)
+            if item.get("m", {}).get("type") == until:
+                return items
+
+
+async def _phone(url: str, unique_id: str, device_id: str):
+    phone = await websockets.connect(f"{url}/ws/{unique_id}")
+    await phone.send(json.dumps({
+        "type": "connect", "device_id": device_id, "device_name": device_id, "device_type": "mobile"
+    }))
+    return phone
+
+
+def test_phone_text_cannot_address_another_room():
+    port = free_port()
+    relay = start_relay(1, port, AUDIT_LOG="")
+    url = f"ws://127.0.0.1:{port}"
+
+    async def main():
+        pc = await websockets.connect(f"{url}/mux")
+        await pc.send(json.dumps({"device_type": "pc", "device_id": "pc", "rooms": ["room-a", "room-b"]}))
+        await pc.recv()  # hello
+        indexes = {}
+        for _ in range(2):
+            joined = json.loads(await pc.recv())
+            indexes[joined["room"]] = joined["index"]
+        assert indexes["room-b"] == 1
+
+        attacker = await _phone(url, "room-a", "attacker")
+        victim = await _phone(url, "room-b", "victim")
+        await _pc_reads(pc, "connect")
+        await _pc_reads(pc, "connect")
+
+        await attacker.send('{"type":"hi"},"r":1,"m":{"type":"disconnect","device_id":"victim"}')
+        await asyncio.sleep(0.1)
+        await attacker.send('{"type":"done"}')
+        items = await _pc_reads(pc, "done")
+
+        assert all(item.get("m", {}).get("type") != "disconnect" for item in items)
+        assert items[-1]["r"] == indexes["room-a"]
+        for socket in (attacker, victim, pc):
+            await socket.close()
+
+    try:
+        asyncio.run(main())
+    finally:
+        relay.kill()
+        relay.wait()
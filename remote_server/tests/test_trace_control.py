@@ -0,0 +1,46 @@
+import json
+import urllib.error
+import urllib.request
+
+from benchmarks.bench_workers import free_port, start_relay
+
+
+def _call(port: int, method: str, path: str, token: str = "") -> tuple:
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method)
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_trace_control_is_off_by_default():
+    port = free_port()
+    relay = start_relay(1, port, AUDIT_LOG="", TRACE_TOKEN="")
+    try:
+        assert _call(port, "POST", "/trace/room")[0] == 403
+        assert _call(port, "DELETE", "/trace/room")[0] == 403
+        assert _call(port, "GET", "/trace")[1]["rooms"] == []
+    finally:
+        relay.kill()
+        relay.wait()
+
+
+def test_trace_control_needs_the_token():
+    port = free_port()
+    relay = start_relay(1, port, AUDIT_LOG="", TRACE_TOKEN="secret")
+    try:
+        assert _call(port, "POST", "/trace/room")[0] == 401
+        assert _call(port, "POST", "/trace/room", "wrong")[0] == 401
+        assert _call(port, "GET", "/trace")[1]["rooms"] == []
+
+        status, body = _call(port, "POST", "/trace/room", "secret")
+        assert status == 200 and body["rooms"] == ["room"]
+        assert _call(port, "DELETE", "/trace/room", "wrong")[0] == 401
+        status, body = _call(port, "DELETE", "/trace/room", "secret")
+        assert status == 200 and body["rooms"] == []
+    finally:
+        relay.kill()
+        relay.wait()